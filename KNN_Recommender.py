@@ -8,72 +8,495 @@ no haya visto, pero sí han sido valoradas por sus vecinos.
 
 Funciones principales:
 - generar_recomendaciones: retorna DataFrame con recomendaciones y datos de soporte.
+- generar_recomendaciones_batch: lo mismo para muchos usuarios objetivo a la vez.
+- recomendar_bloque: núcleo con arrays de NumPy para un bloque de usuarios objetivo.
+- predecir_top_n: rating estimado (promedio ponderado por similitud) de las N mejores películas.
 """
+import heapq
+
+import numpy as np
 import pandas as pd
+from almacen_ratings import AlmacenRatings
+from formato_binario import RatingsBinarios
+from formulas import obtener_metrica
+from instrumentacion import INSTRUMENTACION_NULA
+from Knn import preparar_matriz, seleccionar_top_k
+from ratings_compactos import RatingsCompactos
+from ratings_dispersos import RatingsDispersos
+from similitud_matriz import distancias_bloque, estadisticos_matriz
+
+COLUMNAS_BATCH = ['usuario_objetivo', 'usuario_vecino', 'pelicula', 'rating_vecino', 'veces_recomendada']
+
+def vecinos_bloque(valores, mascara, indices, k, metrica, estadisticos=None, min_comunes=None):
+    """
+    Obtiene los K vecinos de un bloque de usuarios objetivo con un único cálculo matricial.
+
+    :param estadisticos: similitud_matriz.estadisticos_matriz(valores, mascara), si ya están calculados
+    :param min_comunes: mínimo de películas co-calificadas, como en KNNCalcularDistancia
+
+    Retorna:
+    (vecinos, distancias) arrays (len(indices) x k') con posiciones de usuario y distancias
+    """
+    distancias = distancias_bloque(valores, mascara, indices, metrica, estadisticos, min_comunes)
+    return vecinos_desde_distancias(distancias, indices, k)
+
+def vecinos_desde_distancias(distancias, indices, k):
+    """
+    Selecciona los K vecinos de cada fila de una matriz de distancias ya calculada.
+
+    Parámetros:
+    distancias -- array (len(indices) x usuarios), p. ej. filas de MatrizSimilitudUsuarios
+    indices -- posiciones de los usuarios objetivo (se excluyen de su propia fila)
+    k -- número de vecinos
+
+    Retorna:
+    (vecinos, distancias) como vecinos_bloque
+    """
+    otros = np.arange(distancias.shape[1])
+    vecinos = []
+    for fila, indice in zip(distancias, indices):
+        candidatos = np.delete(otros, indice)
+        vecinos.append(candidatos[seleccionar_top_k(fila[candidatos], k)])
+    vecinos = np.array(vecinos, dtype=np.intp).reshape(len(indices), -1)
+    return vecinos, np.take_along_axis(distancias, vecinos, axis=1)
+
+def _posiciones_usuarios(df_ratings, usuarios):
+    """Posición de cada usuario en las columnas de df_ratings"""
+    if isinstance(df_ratings, (RatingsDispersos, RatingsCompactos, RatingsBinarios)):
+        return np.array([df_ratings.posicion_usuario(u) for u in usuarios], dtype=np.intp)
+    return np.array([df_ratings.columns.get_loc(u) for u in usuarios], dtype=np.intp)
+
+def recomendar_bloque(valores, mascara, indices, k, metrica, umbral, vecinos=None, estadisticos=None,
+                      min_comunes=None):
+    """
+    Genera las recomendaciones de un bloque de usuarios objetivo sobre arrays.
+
+    Parámetros:
+    valores -- array (peliculas x usuarios) de ratings
+    mascara -- array booleano de ratings válidos
+    indices -- posiciones de los usuarios objetivo
+    k -- número de vecinos
+    metrica -- nombre de la métrica
+    umbral -- rating mínimo del vecino
+    vecinos -- array (len(indices) x k') de vecinos ya calculados (opcional;
+               por defecto vecinos_bloque)
+    estadisticos -- estadisticos_matriz(valores, mascara) para vecinos_bloque (opcional;
+                    conviene pasarlo si se procesan varios bloques de la misma matriz)
+    min_comunes -- mínimo de películas co-calificadas de cada vecino (opcional)
+
+    Retorna:
+    Diccionario de arrays en formato largo: objetivo, vecino, pelicula (posiciones),
+    rating_vecino y veces_recomendada; ordenado por objetivo, veces_recomendada y
+    rating_vecino descendentes, película y posición del vecino.
+    """
+    indices = np.asarray(indices, dtype=np.intp)
+    if vecinos is None:
+        vecinos, _ = vecinos_bloque(valores, mascara, indices, k, metrica, estadisticos, min_comunes)
+
+    # Solo las columnas de los vecinos: array (peliculas x objetivos x vecinos)
+    valores_vecinos = valores[:, vecinos]
+    gustadas = mascara[:, vecinos] & (valores_vecinos >= umbral)
+    no_vistas = ~mascara[:, indices]
+
+    # Conteo por película de cuántos vecinos de cada objetivo la recomiendan
+    veces = np.count_nonzero(gustadas, axis=2) * no_vistas
+
+    # Filas detalladas (pelicula, objetivo, posición del vecino) gustadas y no vistas
+    candidatas = gustadas & no_vistas[:, :, None]
+    pelicula, fila, rango = np.nonzero(candidatas)
+    vecino = vecinos[fila, rango]
+    rating = valores_vecinos[pelicula, fila, rango].astype(float)
+    conteo = veces[pelicula, fila]
+
+    # Empates como en puntuar_candidatos: por película y luego por posición del vecino
+    orden = np.lexsort((vecino, pelicula, -rating, -conteo, fila))
+    return {
+        'objetivo': indices[fila[orden]],
+        'vecino': vecino[orden],
+        'pelicula': pelicula[orden],
+        'rating_vecino': rating[orden],
+        'veces_recomendada': conteo[orden],
+    }
+
+def recomendar_bloque_disperso(ratings, indices, k, metrica, umbral, min_comunes=None):
+    """
+    recomendar_bloque sobre RatingsDispersos sin armar la matriz densa completa.
+
+    Las distancias salen de la versión por pares de la métrica y solo se
+    densifican las columnas de los objetivos del bloque y de sus vecinos.
+
+    Parámetros:
+    ratings -- RatingsDispersos
+    indices -- posiciones de los usuarios objetivo
+    k, metrica, umbral, min_comunes -- como en recomendar_bloque
+
+    Retorna:
+    El diccionario de arrays de recomendar_bloque, con posiciones de ratings
+    """
+    indices = np.asarray(indices, dtype=np.intp)
+    distancias = np.array([ratings.distancias_a_todos(i, metrica, min_comunes) for i in indices])
+    return _recomendar_con_distancias(ratings, distancias.reshape(len(indices), -1), indices, k, metrica, umbral)
+
+def recomendar_bloque_compacto(ratings, indices, k, metrica, umbral, min_comunes=None, tamano_columnas=4096):
+    """
+    recomendar_bloque sobre RatingsCompactos sin decodificar la matriz completa.
+
+    Las distancias del bloque se calculan con distancias_bloque sobre tramos de
+    tamano_columnas usuarios, decodificando cada tramo de códigos uint8 justo
+    antes de usarlo; después solo se decodifican las columnas de los objetivos
+    y de sus vecinos.
+
+    Parámetros:
+    ratings -- RatingsCompactos
+    indices -- posiciones de los usuarios objetivo
+    k, metrica, umbral, min_comunes -- como en recomendar_bloque
+    tamano_columnas -- usuarios decodificados a la vez
+
+    Retorna:
+    El diccionario de arrays de recomendar_bloque, con posiciones de ratings
+    """
+    indices = np.asarray(indices, dtype=np.intp)
+    codigos_objetivo = ratings.codigos[:, indices]
+    locales = np.arange(len(indices))
+    n_usuarios = ratings.codigos.shape[1]
+
+    distancias = np.empty((len(indices), n_usuarios))
+    for inicio in range(0, n_usuarios, tamano_columnas):
+        # Los objetivos van delante del tramo para comparar contra sus columnas
+        tramo = np.concatenate([codigos_objetivo, ratings.codigos[:, inicio:inicio + tamano_columnas]], axis=1)
+        distancias[:, inicio:inicio + tamano_columnas] = distancias_bloque(
+            tramo / ratings.escala, tramo != 0, locales, metrica, min_comunes=min_comunes,
+        )[:, len(indices):]
+    return _recomendar_con_distancias(ratings, distancias, indices, k, metrica, umbral)
+
+def _recomendar_con_distancias(ratings, distancias, indices, k, metrica, umbral):
+    """
+    recomendar_bloque densificando solo las columnas de los objetivos y sus vecinos.
+
+    ratings debe ofrecer columnas(posiciones) con NaN en faltantes
+    (RatingsDispersos, RatingsCompactos).
+    """
+    vecinos, _ = vecinos_desde_distancias(distancias, indices, k)
+
+    # Columnas ordenadas: las posiciones locales respetan el orden de las globales
+    columnas, locales = np.unique(np.concatenate([indices, vecinos.ravel()]), return_inverse=True)
+    valores = ratings.columnas(columnas)
+    bloque = recomendar_bloque(
+        valores, ~np.isnan(valores), locales[:len(indices)], k, metrica, umbral,
+        vecinos=locales[len(indices):].reshape(vecinos.shape),
+    )
+    bloque['objetivo'] = columnas[bloque['objetivo']]
+    bloque['vecino'] = columnas[bloque['vecino']]
+    return bloque
 
 class RecomendadorKNN:
-    def __init__(self, knn_calculador, umbral_rating=4.0):
+    def __init__(self, knn_calculador, umbral_rating=4.0, instrumentacion=None):
         """
         Inicializa el recomendador.
         :param knn_calculador: instancia de KNNCalcularDistancia
         :param umbral_rating: valor mínimo para considerar que un vecino "ha gustado" la película
+        :param instrumentacion: instancia de instrumentacion.Instrumentacion (por defecto la del calculador)
         """
         self.knn = knn_calculador
         self.umbral = umbral_rating
+        if instrumentacion is None:
+            instrumentacion = getattr(knn_calculador, 'instr', INSTRUMENTACION_NULA)
+        self.instr = instrumentacion
+
+    @staticmethod
+    def _matriz_vecinos(df_ratings, usuario_objetivo, vecinos):
+        """
+        Ratings de los vecinos como matriz densa y máscara de películas vistas por el objetivo.
+
+        Con RatingsDispersos solo se incluyen las películas calificadas por algún vecino.
+
+        Retorna:
+        (peliculas, ratings_vecinos (peliculas x vecinos) con NaN, vistas (peliculas,))
+        """
+        if isinstance(df_ratings, RatingsDispersos):
+            filas = [df_ratings.ratings_usuario(df_ratings.posicion_usuario(v)) for v in vecinos]
+            posiciones = np.unique(np.concatenate([p for p, _ in filas])) if filas else np.array([], dtype=np.int64)
+            ratings_vecinos = np.full((len(posiciones), len(vecinos)), np.nan)
+            for columna, (peliculas, valores) in enumerate(filas):
+                ratings_vecinos[np.searchsorted(posiciones, peliculas), columna] = valores
+            vistas_objetivo, _ = df_ratings.ratings_usuario(df_ratings.posicion_usuario(usuario_objetivo))
+            return df_ratings.peliculas[posiciones], ratings_vecinos, np.isin(posiciones, vistas_objetivo)
+
+        if isinstance(df_ratings, RatingsCompactos):
+            posicion_objetivo = df_ratings.posicion_usuario(usuario_objetivo)
+            ratings_vecinos = df_ratings.columnas([df_ratings.posicion_usuario(v) for v in vecinos])
+            return df_ratings.peliculas, ratings_vecinos, df_ratings.codigos[:, posicion_objetivo] != 0
+
+        if isinstance(df_ratings, RatingsBinarios):
+            # Solo se decodifican las columnas de los vecinos desde el archivo mapeado
+            ratings_vecinos = df_ratings.columnas([df_ratings.posicion_usuario(v) for v in vecinos])
+            vistas = df_ratings.mascara(df_ratings.posicion_usuario(usuario_objetivo))
+            return df_ratings.peliculas, ratings_vecinos, vistas
+
+        if isinstance(df_ratings, AlmacenRatings):
+            columnas = [df_ratings[v].to_numpy() for v in vecinos]
+            ratings_vecinos = np.column_stack(columnas) if columnas else np.empty((df_ratings.shape[0], 0))
+            return df_ratings.index, ratings_vecinos, df_ratings[usuario_objetivo].notna().to_numpy()
+
+        if usuario_objetivo not in df_ratings.columns:
+            raise ValueError(f"La columna '{usuario_objetivo}' no existe en el DataFrame")
+        ratings_vecinos = df_ratings[vecinos].to_numpy(dtype=float)
+        return df_ratings.index, ratings_vecinos, df_ratings[usuario_objetivo].notna().to_numpy()
+
+    def puntuar_candidatos(self, df_ratings, usuario_objetivo, vecinos, distancias=None,
+                           top_n=None, detalle=False):
+        """
+        Agrega en una sola pasada las películas gustadas por los vecinos y no vistas por el objetivo.
+
+        :param df_ratings: DataFrame de ratings (peliculas x usuarios), RatingsDispersos o RatingsCompactos
+        :param usuario_objetivo: nombre del usuario objetivo
+        :param vecinos: lista de usuarios vecinos
+        :param distancias: distancias de cada vecino (para el puntaje ponderado; NaN pesa 0)
+        :param top_n: si se indica, solo se conservan las top_n películas por puntaje_ponderado
+        :param detalle: si es True devuelve una fila por (vecino, película) con las columnas
+                        usuario_vecino, pelicula, rating_vecino, veces_recomendada
+        :return: DataFrame por película con veces_recomendada, rating_promedio y puntaje_ponderado
+                 (sum de rating * 1 / (1 + distancia) sobre los vecinos que la recomiendan)
+        """
+        with self.instr.span('recomendador.matriz_vecinos'):
+            peliculas, ratings_vecinos, vistas = self._matriz_vecinos(df_ratings, usuario_objetivo, vecinos)
+        pesos = np.ones(len(vecinos)) if distancias is None else 1.0 / (1.0 + np.asarray(distancias, dtype=float))
+        pesos = np.nan_to_num(pesos, nan=0.0)
+
+        # Matriz gustada-y-no-vista (NaN >= umbral es False)
+        candidatas = (ratings_vecinos >= self.umbral) & ~vistas[:, None]
+        ratings_candidatas = np.where(candidatas, ratings_vecinos, 0.0)
+
+        veces = candidatas.sum(axis=1)
+        puntaje = ratings_candidatas @ pesos
+        filas = np.flatnonzero(veces > 0)
+        if self.instr.activa:
+            self.instr.contar('candidatas_generadas', int(veces.sum()))
+            self.instr.contar('peliculas_candidatas', len(filas))
+        if top_n is not None:
+            filas = filas[seleccionar_top_k(-puntaje[filas], top_n)]
+
+        if detalle:
+            fila, columna = np.nonzero(candidatas[filas])
+            # Los empates quedan por película y posición del vecino, como en recomendar_bloque
+            # (el orden de los vecinos empatados en distancia depende del redondeo)
+            orden = np.lexsort((_posiciones_usuarios(df_ratings, vecinos)[columna], fila))
+            fila, columna = fila[orden], columna[orden]
+            df_recomendaciones = pd.DataFrame({
+                'usuario_vecino': pd.Index(vecinos, dtype=object)[columna],
+                'pelicula': peliculas[filas[fila]],
+                'rating_vecino': ratings_vecinos[filas[fila], columna],
+                'veces_recomendada': veces[filas[fila]],
+            })
+            return df_recomendaciones.sort_values(
+                by=['veces_recomendada', 'rating_vecino'], ascending=False, kind='stable'
+            )
+
+        df_puntajes = pd.DataFrame({
+            'pelicula': peliculas[filas],
+            'veces_recomendada': veces[filas],
+            'rating_promedio': ratings_candidatas[filas].sum(axis=1) / veces[filas],
+            'puntaje_ponderado': puntaje[filas],
+        })
+        if top_n is not None:
+            return df_puntajes.reset_index(drop=True)
+        return df_puntajes.sort_values(by='puntaje_ponderado', ascending=False, kind='stable')
 
     def generar_recomendaciones(self, df_ratings, usuario_objetivo, k=5):
         """
         Genera recomendaciones de películas para un usuario.
 
+        df_ratings puede ser un DataFrame (peliculas x usuarios), un RatingsDispersos o un RatingsCompactos.
+
         Pseudocódigo:
         1. Obtener los K vecinos más cercanos al usuario objetivo usando self.knn.get_knn.
-        2. Inicializar lista de recomendaciones vacía.
-        3. Para cada vecino en la lista de vecinos:
-           a. Identificar películas calificadas por el vecino con rating >= umbral.
-           b. Filtrar aquellas películas que el usuario objetivo NO haya visto (NaN en df_ratings).
-           c. Para cada película candidata:
-              - Registrar: usuario_vecino, película, rating_vecino.
-        4. Construir un DataFrame con todas las recomendaciones encontradas.
-        5. Opcional: ordenar o agregar métricas adicionales (por ejemplo, contar cuántos vecinos recomiendan cada película).
-        6. Devolver el DataFrame final.
+        2. Armar la matriz de ratings de los vecinos (peliculas x vecinos).
+        3. En una sola operación booleana marcar las películas con rating >= umbral
+           que el usuario objetivo NO haya visto.
+        4. Contar por película cuántos vecinos la recomiendan (veces_recomendada).
+        5. Registrar una fila por cada (vecino, película) candidata:
+           usuario_vecino, película, rating_vecino, veces_recomendada.
+        6. Devolver el DataFrame ordenado por veces_recomendada y rating_vecino.
         """
-        # 1. Obtener vecinos más cercanos
-        df_vecinos = self.knn.get_knn(df_ratings, usuario_objetivo, k)
-        vecinos = df_vecinos.index.tolist()
-
-        # 2. & 3. Explorar cada vecino y sus películas favoritas
-        recomendaciones = []
-        serie_objetivo = df_ratings[usuario_objetivo]
-        for vecino in vecinos:
-            serie_vecino = df_ratings[vecino]
-            # a. películas con rating >= umbral
-            peliculas_gustadas = serie_vecino[serie_vecino >= self.umbral].index
-            # b. filtrar las que objetivo no vio
-            peliculas_candidatas = [p for p in peliculas_gustadas if pd.isna(serie_objetivo[p])]
-            # c. registrar cada recomendación
-            for pelicula in peliculas_candidatas:
-                recomendaciones.append({
-                    'usuario_vecino': vecino,
-                    'pelicula': pelicula,
-                    'rating_vecino': serie_vecino[pelicula]
-                })
-
-        # 4. Construir DataFrame
-        df_recomendaciones = pd.DataFrame(recomendaciones)
-
-        # 5. (Opcional) Agregar conteo de recomendaciones por película
-        if not df_recomendaciones.empty:
-            conteo = df_recomendaciones.groupby('pelicula').size().rename('veces_recomendada')
-            df_recomendaciones = df_recomendaciones.merge(
-                conteo, left_on='pelicula', right_index=True
+        with self.instr.span('recomendador.vecinos'):
+            df_vecinos = self.knn.get_knn(df_ratings, usuario_objetivo, k)
+        with self.instr.span('recomendador.candidatas'):
+            return self.puntuar_candidatos(
+                df_ratings, usuario_objetivo, df_vecinos.index.tolist(),
+                df_vecinos['Distancia'].to_numpy(), detalle=True,
             )
 
-        # 6. Devolver resultados ordenados por veces_recomendada y rating_vecino
-        if 'veces_recomendada' in df_recomendaciones:
-            return df_recomendaciones.sort_values(
-                by=['veces_recomendada', 'rating_vecino'], ascending=False
-            )
-        return df_recomendaciones
+    def predecir_top_n(self, df_ratings, usuario_objetivo, k=5, n=10, tamano_lote=None):
+        """
+        Estima el rating del usuario objetivo para sus películas no vistas y devuelve las N mejores.
+
+        La predicción es el promedio de los ratings de los vecinos ponderado por
+        1 / (1 + distancia). La selección sigue el algoritmo de umbral: cada vecino
+        aporta su lista de películas (no vistas por el objetivo) ordenada por rating
+        descendente, las listas se recorren en paralelo de a tamano_lote posiciones
+        y cada película nueva se puntúa con los ratings de todos los vecinos. Como
+        un promedio ponderado nunca supera el mayor de sus ratings, ninguna película
+        sin leer puede pasar del mayor rating siguiente de las listas (empates por
+        posición incluidos); el recorrido termina cuando ese umbral no supera al peor
+        puntaje del top-N (montículo de tamaño N). Así el número de películas
+        puntuadas depende de N y no del tamaño del catálogo.
+
+        :param df_ratings: DataFrame de ratings (peliculas x usuarios), RatingsDispersos o RatingsCompactos
+        :param usuario_objetivo: nombre del usuario
+        :param k: número de vecinos
+        :param n: número de películas a devolver (0 devuelve un DataFrame vacío)
+        :param tamano_lote: posiciones de cada lista leídas por vuelta (por defecto n)
+        :return: DataFrame con pelicula, rating_predicho y vecinos_con_rating, ordenado por
+                 rating_predicho descendente y luego por posición de la película; en
+                 attrs['peliculas_puntuadas'] queda cuántas películas se evaluaron
+        """
+        if n < 0:
+            raise ValueError("n no puede ser negativo")
+
+        df_vecinos = self.knn.get_knn(df_ratings, usuario_objetivo, k)
+        pesos = np.nan_to_num(1.0 / (1.0 + df_vecinos['Distancia'].to_numpy(dtype=float)), nan=0.0)
+        peliculas, ratings_vecinos, vistas = self._matriz_vecinos(
+            df_ratings, usuario_objetivo, df_vecinos.index.tolist()
+        )
+        validos = ~np.isnan(ratings_vecinos) & (pesos > 0)
+
+        # Lista de cada vecino: películas no vistas por rating descendente y posición
+        listas = []
+        for columna in range(ratings_vecinos.shape[1]):
+            filas = np.flatnonzero(validos[:, columna] & ~vistas)
+            ratings = ratings_vecinos[filas, columna]
+            orden = np.lexsort((filas, -ratings))
+            listas.append((filas[orden], ratings[orden]))
+
+        tamano_lote = tamano_lote or max(n, 1)
+        puntuada = np.zeros(len(peliculas), dtype=bool)
+        mejores = []  # montículo de (predicción, -posición, posición, soporte)
+        profundidad = 0
+        while n > 0:
+            lote = np.unique(np.concatenate(
+                [filas[profundidad:profundidad + tamano_lote] for filas, _ in listas] or [np.array([], dtype=np.intp)]
+            ))
+            lote = lote[~puntuada[lote]]
+            puntuada[lote] = True
+            if len(lote):
+                pesos_lote = np.where(validos[lote], pesos, 0.0)
+                predicciones = (np.nan_to_num(ratings_vecinos[lote]) * pesos_lote).sum(axis=1) / pesos_lote.sum(axis=1)
+                # Evita que el redondeo deje una predicción por encima de su mayor rating
+                cotas = np.where(validos[lote], ratings_vecinos[lote], -np.inf).max(axis=1)
+                predicciones = np.minimum(predicciones, cotas)
+                soportes = validos[lote].sum(axis=1)
+                for pelicula, prediccion, soporte in zip(lote, predicciones, soportes):
+                    elemento = (prediccion, -pelicula, pelicula, soporte)
+                    if len(mejores) < n:
+                        heapq.heappush(mejores, elemento)
+                    elif elemento > mejores[0]:
+                        heapq.heapreplace(mejores, elemento)
+
+            profundidad += tamano_lote
+            # Umbral como (rating, -posición) de la siguiente entrada de cada lista: con
+            # las listas ordenadas así, ninguna película sin leer lo supera ni en empate
+            siguientes = [
+                (ratings[profundidad], -filas[profundidad]) for filas, ratings in listas if profundidad < len(ratings)
+            ]
+            if not siguientes:
+                break
+            if len(mejores) >= n and max(siguientes) <= mejores[0][:2]:
+                break
+
+        mejores = sorted(mejores, reverse=True)
+        df_predicciones = pd.DataFrame({
+            'pelicula': peliculas[[m[2] for m in mejores]],
+            'rating_predicho': np.array([m[0] for m in mejores], dtype=float),
+            'vecinos_con_rating': np.array([m[3] for m in mejores], dtype=np.int64),
+        })
+        df_predicciones.attrs['peliculas_puntuadas'] = int(puntuada.sum())
+        return df_predicciones
+
+    def generar_recomendaciones_batch(self, df_ratings, usuarios, k=5, tamano_bloque=256, como_arrays=False):
+        """
+        Genera recomendaciones para muchos usuarios objetivo a la vez.
+
+        Los vecinos de cada bloque de usuarios se calculan con una sola operación
+        matricial y las películas candidatas y veces_recomendada con productos
+        booleanos, en lugar de recorrer vecino por vecino. Se respeta el
+        min_comunes del calculador, así que el resultado coincide con
+        generar_recomendaciones usuario por usuario.
+
+        :param df_ratings: DataFrame de ratings (peliculas x usuarios), RatingsDispersos
+                           (por bloques con recomendar_bloque_disperso), RatingsCompactos
+                           (por bloques con recomendar_bloque_compacto), AlmacenRatings o
+                           RatingsBinarios (sin copiar el archivo mapeado)
+        :param usuarios: lista de usuarios objetivo
+        :param k: número de vecinos
+        :param tamano_bloque: usuarios objetivo por bloque
+        :param como_arrays: si es True devuelve el diccionario de arrays de recomendar_bloque
+        :return: DataFrame largo con columnas COLUMNAS_BATCH
+        """
+        if isinstance(df_ratings, (RatingsDispersos, RatingsCompactos, RatingsBinarios)):
+            usuarios_df, peliculas_df = df_ratings.usuarios, df_ratings.peliculas
+        else:
+            usuarios_df, peliculas_df = df_ratings.columns, df_ratings.index
+
+        for usuario in usuarios:
+            if usuario not in usuarios_df:
+                raise ValueError(f"La columna '{usuario}' no existe en el DataFrame")
+
+        if getattr(self.knn, 'metrica', None) is None:
+            # Función de distancia sin versión matricial: un usuario a la vez
+            partes = [
+                self.generar_recomendaciones(df_ratings, usuario, k).assign(usuario_objetivo=usuario)
+                for usuario in usuarios
+            ]
+            partes = [p for p in partes if not p.empty]
+            if not partes:
+                return pd.DataFrame(columns=COLUMNAS_BATCH)
+            return pd.concat(partes, ignore_index=True)[COLUMNAS_BATCH]
+
+        indices = np.array([usuarios_df.get_loc(u) for u in usuarios], dtype=np.intp)
+        min_comunes = getattr(self.knn, 'min_comunes', None)
+        if isinstance(df_ratings, RatingsDispersos) and obtener_metrica(self.knn.metrica).por_pares is not None:
+            bloques = [
+                recomendar_bloque_disperso(
+                    df_ratings, indices[i:i + tamano_bloque], k, self.knn.metrica, self.umbral, min_comunes,
+                )
+                for i in range(0, len(indices), tamano_bloque)
+            ]
+        elif isinstance(df_ratings, RatingsCompactos):
+            bloques = [
+                recomendar_bloque_compacto(
+                    df_ratings, indices[i:i + tamano_bloque], k, self.knn.metrica, self.umbral, min_comunes,
+                )
+                for i in range(0, len(indices), tamano_bloque)
+            ]
+        else:
+            if isinstance(df_ratings, RatingsDispersos):
+                valores, mascara = preparar_matriz(df_ratings.a_dataframe())
+            elif isinstance(df_ratings, AlmacenRatings):
+                valores, mascara = df_ratings.como_matriz()
+            else:
+                valores, mascara = preparar_matriz(df_ratings)
+            estadisticos = estadisticos_matriz(valores, mascara)
+            bloques = [
+                recomendar_bloque(
+                    valores, mascara, indices[i:i + tamano_bloque], k, self.knn.metrica, self.umbral,
+                    estadisticos=estadisticos, min_comunes=min_comunes,
+                )
+                for i in range(0, len(indices), tamano_bloque)
+            ]
+        resultado = {
+            clave: np.concatenate([b[clave] for b in bloques]) if bloques else np.array([], dtype=np.intp)
+            for clave in ['objetivo', 'vecino', 'pelicula', 'rating_vecino', 'veces_recomendada']
+        }
+        if como_arrays:
+            return resultado
+
+        return pd.DataFrame({
+            'usuario_objetivo': usuarios_df[resultado['objetivo']],
+            'usuario_vecino': usuarios_df[resultado['vecino']],
+            'pelicula': peliculas_df[resultado['pelicula']],
+            'rating_vecino': resultado['rating_vecino'],
+            'veces_recomendada': resultado['veces_recomendada'],
+        })
 
 # Ejemplo de uso (no ejecutar al import):
 # from knn import KNNCalcularDistancia
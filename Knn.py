@@ -1,53 +1,420 @@
 import pandas as pd
+import numpy as np
 import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from almacen_ratings import AlmacenRatings
+from formato_binario import RatingsBinarios
+from formulas import buscar_metrica, obtener_metrica
+from indice_bitset import IndiceBitset
+from indice_invertido import IndiceInvertido
+from instrumentacion import INSTRUMENTACION_NULA
+from ratings_compactos import RatingsCompactos
+from ratings_dispersos import RatingsDispersos
+
+def preparar_matriz(df):
+    """
+    Convierte el DataFrame de ratings (peliculas x usuarios) en un array float
+    contiguo y su máscara de ratings válidos.
+
+    Con RatingsBinarios devuelve el array mapeado tal cual (uint8 o float32,
+    0 en faltantes): los kernels solo leen valores donde la máscara es True.
+
+    Retorna:
+    (valores, mascara)
+    """
+    if isinstance(df, RatingsBinarios):
+        return df.como_arrays()
+    valores = np.ascontiguousarray(df.to_numpy(dtype=float))
+    mascara = ~np.isnan(valores)
+    return valores, mascara
+
+def seleccionar_top_k(distancias, k):
+    """
+    Obtiene las posiciones de las k menores distancias sin ordenar todo el array.
+
+    Las distancias NaN quedan al final (igual que sort_values) y los empates se
+    resuelven por posición, de modo que el resultado es determinista.
+
+    Parámetros:
+    distancias -- array de distancias
+    k -- número de posiciones a retornar (int)
+
+    Retorna:
+    Array de posiciones ordenadas por distancia
+    """
+    distancias = np.asarray(distancias, dtype=float)
+    n = len(distancias)
+    k = min(k, n)
+    if k <= 0:
+        return np.array([], dtype=np.intp)
+
+    claves = np.where(np.isnan(distancias), np.inf, distancias)
+    if k < n:
+        # El k-ésimo valor delimita el conjunto; entre empates con él se
+        # toman las primeras posiciones para no depender de argpartition.
+        limite = claves[np.argpartition(claves, k - 1)[k - 1]]
+        menores = np.flatnonzero(claves < limite)
+        empatados = np.flatnonzero(claves == limite)[:k - len(menores)]
+        seleccion = np.concatenate([menores, empatados])
+    else:
+        seleccion = np.arange(n)
+
+    return seleccion[np.lexsort((seleccion, claves[seleccion]))]
+
+def _columnas(valores, mascara, posiciones):
+    """
+    (valores, mascara) de algunas columnas, en orden C como la matriz completa.
+
+    valores[:, posiciones] devuelve un array en orden Fortran y NumPy suma el
+    eje 0 de esos arrays por pares en lugar de fila a fila: las distancias de
+    un subconjunto diferirían en el último bit de las del cálculo completo y
+    podrían cambiar el orden entre empates.
+    """
+    return np.ascontiguousarray(valores[:, posiciones]), np.ascontiguousarray(mascara[:, posiciones])
 
 class KNNCalcularDistancia:
-    def __init__(self, distance_function):
+    def __init__(self, distance_function=None, metrica=None, instrumentacion=None, min_comunes=None,
+                 almacen=None, n_hilos=None, indice_invertido=None):
         """
         Inicializa el calculador de KNN con una función de distancia.
-        
+
         Parámetros:
         distance_function -- función de distancia a utilizar (euclidean, manhattan, pearson, cosine)
+        metrica -- nombre de una métrica registrada en formulas.METRICAS (alternativa a distance_function)
+        instrumentacion -- instancia de instrumentacion.Instrumentacion (opcional, apagada por defecto)
+        min_comunes -- mínimo de películas co-calificadas para calcular la distancia (opcional);
+                       los usuarios con menos soporte se descartan antes del cálculo y quedan en NaN
+        almacen -- almacen_vecinos.AlmacenVecinos precalculado (opcional); get_knn responde
+                   desde él y calcula en vivo solo los usuarios que no están guardados
+        n_hilos -- si es mayor que 1, get_knn reparte los usuarios en bloques entre hilos
+                   (los kernels de NumPy liberan el GIL) y combina los top-k parciales;
+                   el resultado es idéntico al cálculo en un solo hilo; el pool se crea
+                   en la primera consulta y se libera con cerrar() (o usando el
+                   calculador en un bloque `with`)
+        indice_invertido -- IndiceInvertido de los datos (o True para construirlo desde ellos
+                            una vez y reutilizarlo mientras la máscara no cambie); solo se
+                            evalúan los usuarios que comparten alguna película con el
+                            objetivo y el resto queda en NaN, igual que sin el índice
+
+        Si la función corresponde a una métrica registrada con versión vectorizada,
+        get_knn usa automáticamente el cálculo uno-contra-todos.
         """
-        self.distance_function = distance_function
-    
+        if distance_function is None and metrica is None:
+            raise ValueError("Se requiere distance_function o metrica")
+
+        info = obtener_metrica(metrica) if metrica is not None else buscar_metrica(distance_function)
+        self.distance_function = distance_function if distance_function is not None else info.escalar
+        self.metrica = info.nombre if info is not None else None
+        self.distance_batch = info.vectorizada if info is not None else None
+        self.distance_pairs = info.por_pares if info is not None else None
+        self.instr = instrumentacion if instrumentacion is not None else INSTRUMENTACION_NULA
+        self.min_comunes = min_comunes
+        self.almacen = almacen
+        self.n_hilos = n_hilos
+        self.indice_invertido = indice_invertido
+        self._ejecutor = None
+        self._cerrojo_ejecutor = threading.Lock()
+        self._cerrojo_indices = threading.Lock()
+        self._mascara_indices = None
+        self._indices = {}
+
+    def cerrar(self):
+        """Detiene el pool de hilos de get_knn, si se creó (una consulta posterior lo vuelve a crear)"""
+        with self._cerrojo_ejecutor:
+            ejecutor, self._ejecutor = self._ejecutor, None
+        if ejecutor is not None:
+            ejecutor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
     def calculate_distances(self, df, target_column):
         """
         Calcula las distancias entre la columna objetivo y todas las demás columnas.
-        
+
         Parámetros:
-        df -- DataFrame de pandas
+        df -- DataFrame de pandas o RatingsDispersos
         target_column -- nombre de la columna objetivo (string)
-        
+
         Retorna:
         Serie de pandas con las distancias ordenadas
         """
+        if isinstance(df, RatingsDispersos):
+            return self._calculate_distances_disperso(df, target_column)
+        if isinstance(df, (RatingsCompactos, AlmacenRatings, RatingsBinarios)):
+            df = df.a_dataframe()
+
         if target_column not in df.columns:
             raise ValueError(f"La columna '{target_column}' no existe en el DataFrame")
-            
+
         distances = {}
         target_series = df[target_column]
-        
-        for column in df.columns:
-            if column == target_column:
-                continue
-                
-            distance = self.distance_function(target_series.values, df[column].values)
-            distances[column] = distance
-        
-        return pd.Series(distances).sort_values()
-    
+        columnas = df.columns
+        if self._poda_activa():
+            con_soporte = self._con_soporte(df.notna().to_numpy(), df.columns.get_loc(target_column))
+            columnas = columnas[con_soporte]
+
+        with self.instr.span('knn.distancias_por_columna'):
+            for column in columnas:
+                if column == target_column:
+                    continue
+
+                distance = self.distance_function(target_series.values, df[column].values)
+                distances[column] = distance
+        self.instr.contar('evaluaciones_distancia', len(distances))
+
+        with self.instr.span('knn.ordenar'):
+            # Los usuarios podados quedan en NaN, en el orden de las columnas
+            distances = pd.Series(distances, dtype=float).reindex(df.columns.drop(target_column))
+            return distances.sort_values()
+
+    def _calculate_distances_disperso(self, ratings, target_column):
+        """Versión de calculate_distances sobre RatingsDispersos usando pares co-calificados"""
+        indice_objetivo = ratings.posicion_usuario(target_column)
+        distances = {}
+        indices = range(len(ratings.usuarios))
+        if self._poda_activa():
+            # La vista por película ya es un índice invertido
+            comunes = np.bincount(ratings.pares_con_objetivo(indice_objetivo)[0], minlength=len(ratings.usuarios))
+            indices = np.flatnonzero(comunes >= max(self.min_comunes or 1, 1))
+
+        with self.instr.span('knn.distancias_por_columna'):
+            for indice in indices:
+                column = ratings.usuarios[indice]
+                if indice == indice_objetivo:
+                    continue
+
+                # Las funciones escalares ignoran los faltantes, así que basta con
+                # pasarles solo los ratings emparejados
+                a, b = ratings.pares_comunes(indice_objetivo, indice)
+                distances[column] = self.distance_function(a, b)
+        self.instr.contar('evaluaciones_distancia', len(distances))
+
+        with self.instr.span('knn.ordenar'):
+            distances = pd.Series(distances, dtype=float).reindex(ratings.usuarios.drop(target_column))
+            return distances.sort_values()
+
+    def _poda_activa(self):
+        return self.min_comunes is not None or self.indice_invertido is not None
+
+    def _indice_de_mascara(self, clase, mascara):
+        """
+        Índice (IndiceInvertido o IndiceBitset) de la máscara, construido una sola vez.
+
+        Se guarda junto con una copia de la máscara y se reconstruye solo si
+        cambia (por ejemplo si el DataFrame se modificó en el lugar): comparar
+        la máscara es mucho más barato que recorrerla para armar el índice.
+        """
+        with self._cerrojo_indices:
+            if self._mascara_indices is None or not np.array_equal(self._mascara_indices, mascara):
+                self._mascara_indices = np.array(mascara, dtype=bool)
+                self._indices = {}
+            if clase not in self._indices:
+                self._indices[clase] = clase.desde_mascara(mascara)
+            return self._indices[clase]
+
+    def _indice_invertido(self, mascara):
+        """IndiceInvertido a usar con estos datos"""
+        if isinstance(self.indice_invertido, IndiceInvertido):
+            if self.indice_invertido.n_usuarios != mascara.shape[1]:
+                raise ValueError("El índice invertido no corresponde a los datos")
+            return self.indice_invertido
+        return self._indice_de_mascara(IndiceInvertido, mascara)
+
+    def _con_soporte(self, mascara, indice_objetivo, indice_bitset=None):
+        """
+        Máscara de usuarios que se evalúan (None si no se poda).
+
+        Con indice_invertido son los usuarios que comparten al menos
+        max(min_comunes, 1) películas con el objetivo; si no, con min_comunes se
+        cuenta el soporte con el bitset.
+        """
+        if not self._poda_activa():
+            return None
+        with self.instr.span('knn.soporte'):
+            if self.indice_invertido is not None:
+                candidatos, _ = self._indice_invertido(mascara).candidatos(indice_objetivo, self.min_comunes or 1)
+                con_soporte = np.zeros(mascara.shape[1], dtype=bool)
+                con_soporte[candidatos] = True
+            else:
+                if indice_bitset is None:
+                    indice_bitset = self._indice_de_mascara(IndiceBitset, mascara)
+                con_soporte = indice_bitset.comunes(indice_objetivo) >= self.min_comunes
+        self.instr.contar('usuarios_podados', int((~con_soporte).sum()))
+        return con_soporte
+
+    def _contar_evaluaciones(self, n_usuarios, indice_objetivo, evaluados=None):
+        """Cuenta las distancias calculadas a otros usuarios (evaluados: posiciones, None si todos)"""
+        if evaluados is None:
+            self.instr.contar('evaluaciones_distancia', n_usuarios - 1)
+        else:
+            self.instr.contar('evaluaciones_distancia', int(np.count_nonzero(evaluados != indice_objetivo)))
+
+    def distancias_a_todos(self, valores, mascara, indice_objetivo, indice_bitset=None):
+        """
+        Calcula en una sola llamada la distancia del usuario objetivo a todos los usuarios.
+
+        Con min_comunes o indice_invertido solo se evalúan los usuarios
+        candidatos; el resto queda en NaN sin pasar por el kernel.
+
+        Parámetros:
+        valores -- array (peliculas x usuarios) de ratings
+        mascara -- array booleano de ratings válidos
+        indice_objetivo -- posición de la columna objetivo (int)
+        indice_bitset -- IndiceBitset de la máscara, si ya está construido (opcional)
+
+        Retorna:
+        Array de distancias (usuarios,); la posición del objetivo incluida
+        """
+        if self.distance_batch is None:
+            raise ValueError("La función de distancia no tiene versión vectorizada")
+        if not self._poda_activa():
+            self._contar_evaluaciones(valores.shape[1], indice_objetivo)
+            return self.distance_batch(
+                valores, valores[:, indice_objetivo], mascara, mascara[:, indice_objetivo]
+            )
+
+        candidatos = np.flatnonzero(self._con_soporte(mascara, indice_objetivo, indice_bitset))
+        self._contar_evaluaciones(valores.shape[1], indice_objetivo, candidatos)
+        distancias = np.full(valores.shape[1], np.nan)
+        valores_candidatos, mascara_candidatos = _columnas(valores, mascara, candidatos)
+        distancias[candidatos] = self.distance_batch(
+            valores_candidatos, valores[:, indice_objetivo], mascara_candidatos, mascara[:, indice_objetivo]
+        )
+        return distancias
+
     def get_knn(self, df, target_column, k=5):
         """
         Obtiene los K vecinos más cercanos para la columna objetivo.
-        
+
         Parámetros:
-        df -- DataFrame de pandas
+        df -- DataFrame de pandas, RatingsDispersos, RatingsCompactos, AlmacenRatings o RatingsBinarios
         target_column -- nombre de la columna objetivo (string)
         k -- número de vecinos a retornar (int)
-        
+
         Retorna:
         DataFrame con los k vecinos más cercanos y sus distancias
         """
-        distances = self.calculate_distances(df, target_column)
-        return distances.head(k).to_frame(name='Distancia')
\ No newline at end of file
+        if self.almacen is not None and self.metrica is not None:
+            guardados = self.almacen.vecinos(self.metrica, target_column, k, self.min_comunes)
+            self.instr.contar('consultas_almacen' if guardados is not None else 'fallos_almacen')
+            if guardados is not None:
+                return guardados
+
+        if isinstance(df, RatingsDispersos):
+            if self.distance_pairs is None:
+                distances = self.calculate_distances(df, target_column)
+                return distances.head(k).to_frame(name='Distancia')
+            indice_objetivo = df.posicion_usuario(target_column)
+            with self.instr.span('knn.distancias'):
+                distancias = df.distancias_a_todos(indice_objetivo, self.metrica, self.min_comunes)
+            if self.instr.activa:
+                usuarios_pares = df.pares_con_objetivo(indice_objetivo)[0]
+                evaluados = None
+                if self.min_comunes is not None:
+                    comunes = np.bincount(usuarios_pares, minlength=len(df.usuarios))
+                    evaluados = np.flatnonzero(comunes >= self.min_comunes)
+                self._contar_evaluaciones(len(df.usuarios), indice_objetivo, evaluados)
+                self.instr.contar('pares_cocalificados', int((usuarios_pares != indice_objetivo).sum()))
+            return self._top_k(distancias, df.usuarios, indice_objetivo, k)
+
+        if isinstance(df, RatingsCompactos) and self.distance_batch is not None:
+            indice_objetivo = df.posicion_usuario(target_column)
+            candidatos = None
+            if self.indice_invertido is not None:
+                indice = self.indice_invertido if isinstance(self.indice_invertido, IndiceInvertido) else df.indice_invertido
+                candidatos, _ = indice.candidatos(indice_objetivo, self.min_comunes or 1)
+            elif self.min_comunes is not None:
+                candidatos = df.indice_bitset.con_soporte(indice_objetivo, self.min_comunes)
+            with self.instr.span('knn.distancias'):
+                distancias = df.distancias_a_todos(indice_objetivo, self.metrica, candidatos=candidatos)
+            self._contar_evaluaciones(len(df.usuarios), indice_objetivo, candidatos)
+            return self._top_k(distancias, df.usuarios, indice_objetivo, k)
+
+        if isinstance(df, AlmacenRatings):
+            df = df.a_dataframe()
+
+        if self.distance_batch is None:
+            distances = self.calculate_distances(df, target_column)
+            return distances.head(k).to_frame(name='Distancia')
+
+        if target_column not in df.columns:
+            raise ValueError(f"La columna '{target_column}' no existe en el DataFrame")
+
+        with self.instr.span('knn.preparar_matriz'):
+            valores, mascara = preparar_matriz(df)
+        indice_objetivo = df.columns.get_loc(target_column)
+        if self.n_hilos is not None and self.n_hilos > 1:
+            with self.instr.span('knn.distancias'):
+                seleccion, distancias = self._knn_en_hilos(valores, mascara, indice_objetivo, k)
+            return pd.DataFrame({'Distancia': distancias}, index=df.columns[seleccion])
+
+        with self.instr.span('knn.distancias'):
+            distancias = self.distancias_a_todos(valores, mascara, indice_objetivo)
+        if self.instr.activa:
+            comunes = (mascara & mascara[:, [indice_objetivo]]).sum() - mascara[:, indice_objetivo].sum()
+            self.instr.contar('pares_cocalificados', int(comunes))
+        return self._top_k(distancias, df.columns, indice_objetivo, k)
+
+    def _knn_bloque(self, valores, mascara, indice_objetivo, inicio, fin, con_soporte, k):
+        """Top-k local de los usuarios inicio:fin (sin el objetivo), como (posiciones, distancias)"""
+        objetivo, mascara_objetivo = valores[:, indice_objetivo], mascara[:, indice_objetivo]
+        if con_soporte is None:
+            distancias = self.distance_batch(
+                valores[:, inicio:fin], objetivo, mascara[:, inicio:fin], mascara_objetivo
+            )
+        else:
+            evaluar = inicio + np.flatnonzero(con_soporte[inicio:fin])
+            distancias = np.full(fin - inicio, np.nan)
+            valores_evaluar, mascara_evaluar = _columnas(valores, mascara, evaluar)
+            distancias[evaluar - inicio] = self.distance_batch(
+                valores_evaluar, objetivo, mascara_evaluar, mascara_objetivo
+            )
+
+        posiciones = np.arange(inicio, fin)
+        otros = posiciones != indice_objetivo
+        posiciones, distancias = posiciones[otros], distancias[otros]
+        seleccion = seleccionar_top_k(distancias, k)
+        return posiciones[seleccion], distancias[seleccion]
+
+    def _knn_en_hilos(self, valores, mascara, indice_objetivo, k):
+        """
+        Vecinos calculados por bloques de usuarios en self.n_hilos hilos.
+
+        El top-k global está contenido en la unión de los top-k de cada bloque.
+        Los candidatos se reordenan por posición antes de la selección final, así
+        que los empates se resuelven igual que en _top_k.
+        """
+        with self._cerrojo_ejecutor:
+            if self._ejecutor is None:
+                self._ejecutor = ThreadPoolExecutor(max_workers=self.n_hilos, thread_name_prefix='knn')
+            ejecutor = self._ejecutor
+        con_soporte = self._con_soporte(mascara, indice_objetivo)
+        self._contar_evaluaciones(
+            valores.shape[1], indice_objetivo, None if con_soporte is None else np.flatnonzero(con_soporte)
+        )
+
+        limites = np.linspace(0, valores.shape[1], self.n_hilos + 1).astype(int)
+        parciales = list(ejecutor.map(
+            lambda rango: self._knn_bloque(valores, mascara, indice_objetivo, *rango, con_soporte, k),
+            zip(limites[:-1], limites[1:]),
+        ))
+
+        with self.instr.span('knn.top_k'):
+            posiciones = np.concatenate([p for p, _ in parciales])
+            distancias = np.concatenate([d for _, d in parciales])
+            orden = np.argsort(posiciones)
+            posiciones, distancias = posiciones[orden], distancias[orden]
+            seleccion = seleccionar_top_k(distancias, k)
+        return posiciones[seleccion], distancias[seleccion]
+
+    def _top_k(self, distancias, usuarios, indice_objetivo, k):
+        """Arma el DataFrame de los k vecinos excluyendo al propio objetivo"""
+        with self.instr.span('knn.top_k'):
+            otros = np.delete(np.arange(len(usuarios)), indice_objetivo)
+            seleccion = otros[seleccionar_top_k(distancias[otros], k)]
+        return pd.DataFrame({'Distancia': distancias[seleccion]}, index=usuarios[seleccion])
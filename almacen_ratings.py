@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: almacen_ratings.py
+
+Almacén de ratings mutable con actualizaciones incrementales.
+
+Junto a la matriz (peliculas x usuarios, NaN en faltantes) se mantienen:
+- agregados por usuario: conteo, suma y suma de cuadrados (de ahí media y norma),
+- estadísticos suficientes de los pares de usuarios seguidos (por ejemplo los
+  vecinos guardados en una caché): n, sa, sb, saa, sbb, sab sobre las
+  películas que calificaron ambos.
+
+Cada cambio de un rating ajusta los agregados del usuario en O(1) y los
+estadísticos de cada par seguido que lo involucra en O(1), de modo que las
+distancias Euclidiana, Pearson y Coseno de esos pares se obtienen sin
+recorrer las columnas. Manhattan (y cualquier función no registrada) se
+calcula sobre las dos columnas.
+
+Con ratings no enteros las sumas acumuladas pueden alejarse del recálculo
+completo en el orden del redondeo de punto flotante.
+
+Los suscriptores (suscribir) reciben (almacen, usuario) después de cada
+cambio; CacheVecinos.escuchar los usa para invalidar entradas.
+
+Clases principales:
+- AlmacenRatings: agregar_rating, eliminar_rating, reemplazar_usuario y distancia.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+from formulas import _pearson_desde_sumas, buscar_metrica, obtener_metrica
+
+# Columnas de los estadísticos de un par (a = usuario de menor posición)
+N, SA, SB, SAA, SBB, SAB = range(6)
+
+class AlmacenRatings:
+    def __init__(self, df_ratings=None):
+        """
+        :param df_ratings: DataFrame inicial (peliculas x usuarios) con NaN en faltantes (opcional)
+        """
+        self._usuarios = []
+        self._peliculas = []
+        self._pos_usuario = {}
+        self._pos_pelicula = {}
+        self._valores = np.full((8, 8), np.nan, order='F')
+        self._conteo = np.zeros(8, dtype=np.int64)
+        self._suma = np.zeros(8)
+        self._suma_cuadrados = np.zeros(8)
+        self._pares = {}
+        self._seguimientos = {}
+        self._pares_de = {}
+        self._suscriptores = []
+
+        if df_ratings is not None:
+            self._asegurar_capacidad(len(df_ratings.index), len(df_ratings.columns))
+            self._peliculas = list(df_ratings.index)
+            self._pos_pelicula = {p: j for j, p in enumerate(self._peliculas)}
+            self._usuarios = list(df_ratings.columns)
+            self._pos_usuario = {u: i for i, u in enumerate(self._usuarios)}
+            valores = df_ratings.to_numpy(dtype=float)
+            n_peliculas, n_usuarios = valores.shape
+            self._valores[:n_peliculas, :n_usuarios] = valores
+            mascara = ~np.isnan(valores)
+            x = np.where(mascara, valores, 0.0)
+            self._conteo[:n_usuarios] = mascara.sum(axis=0)
+            self._suma[:n_usuarios] = x.sum(axis=0)
+            self._suma_cuadrados[:n_usuarios] = (x ** 2).sum(axis=0)
+
+    # -- estructura -----------------------------------------------------------
+
+    def _asegurar_capacidad(self, n_peliculas, n_usuarios):
+        """Duplica la capacidad de la matriz y de los agregados cuando hace falta"""
+        cap_peliculas, cap_usuarios = self._valores.shape
+        if n_peliculas <= cap_peliculas and n_usuarios <= cap_usuarios:
+            return
+        nueva_peliculas = max(cap_peliculas, 1)
+        while nueva_peliculas < n_peliculas:
+            nueva_peliculas *= 2
+        nueva_usuarios = max(cap_usuarios, 1)
+        while nueva_usuarios < n_usuarios:
+            nueva_usuarios *= 2
+
+        valores = np.full((nueva_peliculas, nueva_usuarios), np.nan, order='F')
+        valores[:cap_peliculas, :cap_usuarios] = self._valores
+        self._valores = valores
+        for nombre in ('_conteo', '_suma', '_suma_cuadrados'):
+            anterior = getattr(self, nombre)
+            nuevo = np.zeros(nueva_usuarios, dtype=anterior.dtype)
+            nuevo[:len(anterior)] = anterior
+            setattr(self, nombre, nuevo)
+
+    def _posicion_usuario(self, usuario, crear=False):
+        if usuario not in self._pos_usuario:
+            if not crear:
+                raise ValueError(f"La columna '{usuario}' no existe en el DataFrame")
+            self._asegurar_capacidad(len(self._peliculas), len(self._usuarios) + 1)
+            self._pos_usuario[usuario] = len(self._usuarios)
+            self._usuarios.append(usuario)
+        return self._pos_usuario[usuario]
+
+    def _posicion_pelicula(self, pelicula, crear=False):
+        if pelicula not in self._pos_pelicula:
+            if not crear:
+                raise ValueError(f"La película '{pelicula}' no existe")
+            self._asegurar_capacidad(len(self._peliculas) + 1, len(self._usuarios))
+            self._pos_pelicula[pelicula] = len(self._peliculas)
+            self._peliculas.append(pelicula)
+        return self._pos_pelicula[pelicula]
+
+    # -- vista tipo DataFrame -------------------------------------------------
+
+    @property
+    def columns(self):
+        """Usuarios, como df.columns"""
+        return pd.Index(self._usuarios)
+
+    @property
+    def index(self):
+        """Películas, como df.index"""
+        return pd.Index(self._peliculas)
+
+    @property
+    def shape(self):
+        return len(self._peliculas), len(self._usuarios)
+
+    def _columna(self, i):
+        return self._valores[:len(self._peliculas), i]
+
+    def __getitem__(self, usuario):
+        """Ratings de un usuario como Serie indexada por película (como df[usuario])"""
+        return pd.Series(self._columna(self._posicion_usuario(usuario)).copy(), index=self.index, name=usuario)
+
+    def matriz_usuarios(self, usuarios):
+        """Ratings de varios usuarios como array (peliculas x usuarios) con NaN en faltantes"""
+        return self._valores[:len(self._peliculas), [self._posicion_usuario(u) for u in usuarios]]
+
+    def como_matriz(self):
+        """(valores, mascara) de la matriz actual sin copiarla, con NaN en faltantes"""
+        n_peliculas, n_usuarios = self.shape
+        valores = self._valores[:n_peliculas, :n_usuarios]
+        return valores, ~np.isnan(valores)
+
+    def a_dataframe(self):
+        """Copia de la matriz actual como DataFrame (peliculas x usuarios)"""
+        n_peliculas, n_usuarios = self.shape
+        return pd.DataFrame(self._valores[:n_peliculas, :n_usuarios].copy(), index=self.index, columns=self.columns)
+
+    # -- agregados ------------------------------------------------------------
+
+    def agregados(self, usuario):
+        """Conteo, suma, suma de cuadrados, media y norma de los ratings del usuario"""
+        i = self._posicion_usuario(usuario)
+        conteo, suma, suma_cuadrados = int(self._conteo[i]), float(self._suma[i]), float(self._suma_cuadrados[i])
+        return {
+            'conteo': conteo,
+            'suma': suma,
+            'suma_cuadrados': suma_cuadrados,
+            'media': suma / conteo if conteo else float('nan'),
+            'norma': math.sqrt(suma_cuadrados),
+        }
+
+    # -- pares seguidos ---------------------------------------------------------
+
+    @staticmethod
+    def _clave(i, j):
+        return (i, j) if i < j else (j, i)
+
+    def _estadisticos_par(self, a, b):
+        """Estadísticos suficientes de un par recorriendo sus columnas"""
+        x, y = self._columna(a), self._columna(b)
+        comunes = ~np.isnan(x) & ~np.isnan(y)
+        x, y = x[comunes], y[comunes]
+        return np.array([len(x), x.sum(), y.sum(), x @ x, y @ y, x @ y])
+
+    def seguir_pares(self, usuario, otros):
+        """
+        Empieza a mantener los estadísticos de los pares (usuario, otro).
+
+        Cada llamada suma una referencia por par; liberar_pares las descuenta.
+        """
+        i = self._posicion_usuario(usuario)
+        for otro in otros:
+            j = self._posicion_usuario(otro)
+            if i == j:
+                continue
+            clave = self._clave(i, j)
+            if clave not in self._pares:
+                self._pares[clave] = self._estadisticos_par(*clave)
+                self._pares_de.setdefault(i, set()).add(j)
+                self._pares_de.setdefault(j, set()).add(i)
+            self._seguimientos[clave] = self._seguimientos.get(clave, 0) + 1
+
+    def liberar_pares(self, usuario, otros):
+        """Descuenta una referencia de cada par y deja de mantener los que quedan en cero"""
+        i = self._pos_usuario.get(usuario)
+        for otro in otros:
+            j = self._pos_usuario.get(otro)
+            if i is None or j is None or i == j:
+                continue
+            clave = self._clave(i, j)
+            if clave not in self._seguimientos:
+                continue
+            self._seguimientos[clave] -= 1
+            if self._seguimientos[clave] == 0:
+                del self._seguimientos[clave], self._pares[clave]
+                self._pares_de[i].discard(j)
+                self._pares_de[j].discard(i)
+
+    @property
+    def pares_seguidos(self):
+        return len(self._pares)
+
+    def distancia(self, usuario_a, usuario_b, metrica):
+        """
+        Distancia entre dos usuarios con la misma semántica NaN que formulas.py.
+
+        Para Euclidiana, Pearson y Coseno de un par seguido usa los estadísticos
+        mantenidos (O(1)); en otro caso aplica la función a las dos columnas.
+
+        :param metrica: nombre de la métrica o función de distancia escalar
+        """
+        if isinstance(metrica, str):
+            info = obtener_metrica(metrica)
+            funcion = info.escalar
+        else:
+            info = buscar_metrica(metrica)
+            funcion = metrica
+        i, j = self._posicion_usuario(usuario_a), self._posicion_usuario(usuario_b)
+        clave = self._clave(i, j)
+        nombre = info.nombre if info is not None else None
+
+        if clave not in self._pares or nombre not in ('euclidean', 'pearson', 'cosine'):
+            return funcion(self._columna(i), self._columna(j))
+
+        n, sa, sb, saa, sbb, sab = self._pares[clave]
+        if nombre == 'euclidean':
+            return float('nan') if n == 0 else math.sqrt(max(saa + sbb - 2 * sab, 0.0))
+        if nombre == 'cosine':
+            if n == 0 or saa == 0 or sbb == 0:
+                return float('nan')
+            return 1 - sab / (math.sqrt(saa) * math.sqrt(sbb))
+        # La misma fórmula que las versiones vectorizada, por pares y por bloques
+        return float(_pearson_desde_sumas(n, sa, sb, saa, sbb, sab))
+
+    # -- actualizaciones ------------------------------------------------------
+
+    def suscribir(self, funcion):
+        """Registra funcion(almacen, usuario), llamada después de cada cambio de un usuario"""
+        self._suscriptores.append(funcion)
+
+    def _notificar(self, usuario):
+        for funcion in self._suscriptores:
+            funcion(self, usuario)
+
+    def _asignar(self, i, j, valor):
+        """Cambia la celda (pelicula j, usuario i) a valor (NaN = borrar) ajustando agregados y pares"""
+        anterior = self._valores[j, i]
+        if np.isnan(anterior) and np.isnan(valor):
+            return
+
+        # Se descuenta la contribución anterior y se suma la nueva
+        for x, signo in ((anterior, -1), (valor, 1)):
+            if np.isnan(x):
+                continue
+            self._conteo[i] += signo
+            self._suma[i] += signo * x
+            self._suma_cuadrados[i] += signo * x * x
+            for otro in self._pares_de.get(i, ()):
+                y = self._valores[j, otro]
+                if np.isnan(y):
+                    continue
+                a, b = (x, y) if i < otro else (y, x)
+                self._pares[self._clave(i, otro)] += signo * np.array([1, a, b, a * a, b * b, a * b])
+
+        self._valores[j, i] = valor
+
+    def agregar_rating(self, usuario, pelicula, rating):
+        """Agrega o cambia un rating; crea el usuario o la película si no existen"""
+        if rating is None or math.isnan(rating):
+            raise ValueError("El rating debe ser un número")
+        i = self._posicion_usuario(usuario, crear=True)
+        j = self._posicion_pelicula(pelicula, crear=True)
+        self._asignar(i, j, float(rating))
+        self._notificar(usuario)
+
+    def eliminar_rating(self, usuario, pelicula):
+        """Elimina un rating existente"""
+        i = self._posicion_usuario(usuario)
+        j = self._posicion_pelicula(pelicula)
+        if np.isnan(self._valores[j, i]):
+            raise ValueError(f"El usuario '{usuario}' no tiene rating para '{pelicula}'")
+        self._asignar(i, j, np.nan)
+        self._notificar(usuario)
+
+    def reemplazar_usuario(self, usuario, ratings):
+        """
+        Reemplaza todos los ratings de un usuario (lo crea si no existe).
+
+        Solo se tocan las películas que cambian, y se notifica una vez.
+
+        :param ratings: dict o Serie pelicula -> rating (NaN se ignora)
+        """
+        ratings = pd.Series(ratings, dtype=float).dropna()
+        i = self._posicion_usuario(usuario, crear=True)
+        nuevas = {self._posicion_pelicula(p, crear=True): r for p, r in ratings.items()}
+
+        for j in np.flatnonzero(~np.isnan(self._columna(i))):
+            if j not in nuevas:
+                self._asignar(i, j, np.nan)
+        for j, rating in nuevas.items():
+            if self._valores[j, i] != rating:
+                self._asignar(i, j, rating)
+        self._notificar(usuario)
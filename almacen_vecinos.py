@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: almacen_vecinos.py
+
+Precálculo fuera de línea de los K vecinos de todos los usuarios y almacén
+persistente para servirlos sin recalcular.
+
+Un almacén es un directorio con:
+- metadatos.json: versión, k, tamaño de bloque, min_comunes y métricas.
+- usuarios.npy: etiquetas de usuarios con su tipo (la posición es el id de vecino).
+- <metrica>_ids.npy: ids de vecinos int32 (usuarios x k), -1 donde hay menos de k.
+- <metrica>_distancias.npy: distancias float32 (usuarios x k), NaN como en get_knn.
+- <metrica>_progreso.npy: un bool por bloque de usuarios ya escrito.
+
+Los .npy se escriben por bloques a través de np.lib.format.open_memmap y el
+progreso de un bloque se marca solo después de volcar sus filas, de modo que
+si el trabajo se interrumpe se retoma desde el primer bloque pendiente.
+
+Las distancias se guardan en float32: los vecinos servidos desde el almacén
+coinciden con get_knn en vivo salvo el redondeo de las distancias (y el orden
+entre distancias que solo difieren por debajo de esa precisión).
+
+Uso:
+    python almacen_vecinos.py --datos Movie_Ratings.csv --salida vecinos/ --k 50
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from formato_binario import _etiquetas, cargar_ratings
+from Knn import preparar_matriz, seleccionar_top_k
+from ratings_compactos import RatingsCompactos
+from similitud_matriz import distancias_bloque, estadisticos_matriz
+
+VERSION_ALMACEN = 1
+METRICAS_ALMACEN = ('euclidean', 'manhattan', 'pearson', 'cosine')
+
+def _rutas(directorio, metrica):
+    return (
+        os.path.join(directorio, f'{metrica}_ids.npy'),
+        os.path.join(directorio, f'{metrica}_distancias.npy'),
+        os.path.join(directorio, f'{metrica}_progreso.npy'),
+    )
+
+def _abrir_arrays(directorio, metrica, n_usuarios, k, n_bloques):
+    """Abre (o crea) los memmaps de ids, distancias y progreso de una métrica"""
+    ruta_ids, ruta_distancias, ruta_progreso = _rutas(directorio, metrica)
+    if not os.path.exists(ruta_progreso):
+        ids = np.lib.format.open_memmap(ruta_ids, mode='w+', dtype=np.int32, shape=(n_usuarios, k))
+        distancias = np.lib.format.open_memmap(ruta_distancias, mode='w+', dtype=np.float32, shape=(n_usuarios, k))
+        ids.flush()
+        distancias.flush()
+        progreso = np.lib.format.open_memmap(ruta_progreso, mode='w+', dtype=bool, shape=(n_bloques,))
+        progreso.flush()
+        return ids, distancias, progreso
+    return (
+        np.load(ruta_ids, mmap_mode='r+'),
+        np.load(ruta_distancias, mmap_mode='r+'),
+        np.load(ruta_progreso, mmap_mode='r+'),
+    )
+
+def _preparar_datos(datos):
+    """(valores, mascara, usuarios) desde una ruta, un DataFrame, un RatingsBinarios o un RatingsCompactos"""
+    if isinstance(datos, str):
+        datos = cargar_ratings(datos, mapeado=True)
+    if isinstance(datos, RatingsCompactos):
+        valores, mascara = datos.como_matriz()
+        return valores, mascara, datos.usuarios
+    valores, mascara = preparar_matriz(datos)
+    return valores, mascara, datos.columns
+
+def precalcular_vecinos(datos, directorio, metricas=METRICAS_ALMACEN, k=50, tamano_bloque=256,
+                        min_comunes=None, progreso=None):
+    """
+    Calcula y guarda los k vecinos de todos los usuarios para cada métrica.
+
+    Si el directorio ya tiene un almacén con la misma configuración, solo se
+    calculan los bloques pendientes.
+
+    :param datos: ruta (CSV o directorio binario), DataFrame (peliculas x usuarios) o RatingsCompactos
+    :param directorio: directorio del almacén (se crea si no existe)
+    :param metricas: métricas a precalcular
+    :param k: vecinos por usuario
+    :param tamano_bloque: usuarios por bloque (unidad de progreso)
+    :param min_comunes: mínimo de películas co-calificadas, como en KNNCalcularDistancia
+    :param progreso: función opcional progreso(metrica, bloques_hechos, bloques_totales)
+    :return: AlmacenVecinos abierto sobre el directorio
+    """
+    valores, mascara, usuarios = _preparar_datos(datos)
+    n_usuarios = len(usuarios)
+    n_bloques = -(-n_usuarios // tamano_bloque)
+    metricas = list(metricas)
+
+    os.makedirs(directorio, exist_ok=True)
+    ruta_metadatos = os.path.join(directorio, 'metadatos.json')
+    configuracion = {
+        'version': VERSION_ALMACEN, 'usuarios': n_usuarios, 'k': k,
+        'tamano_bloque': tamano_bloque, 'min_comunes': min_comunes,
+    }
+    if os.path.exists(ruta_metadatos):
+        with open(ruta_metadatos, encoding='utf-8') as archivo:
+            metadatos = json.load(archivo)
+        anteriores = np.load(os.path.join(directorio, 'usuarios.npy'))
+        if ({c: metadatos.get(c) for c in configuracion} != configuracion
+                or not np.array_equal(anteriores, _etiquetas(usuarios))):
+            raise ValueError(f"El almacén en '{directorio}' tiene otra configuración o usuarios")
+        metadatos['metricas'] = list(dict.fromkeys(metadatos['metricas'] + metricas))
+    else:
+        np.save(os.path.join(directorio, 'usuarios.npy'), _etiquetas(usuarios))
+        metadatos = dict(configuracion, metricas=metricas)
+    with open(ruta_metadatos, 'w', encoding='utf-8') as archivo:
+        json.dump(metadatos, archivo)
+
+    todos = np.arange(n_usuarios)
+    estadisticos = estadisticos_matriz(valores, mascara)
+    for metrica in metricas:
+        ids, distancias, hechos = _abrir_arrays(directorio, metrica, n_usuarios, k, n_bloques)
+        for bloque in np.flatnonzero(~hechos):
+            indices = todos[bloque * tamano_bloque:(bloque + 1) * tamano_bloque]
+            matriz = distancias_bloque(valores, mascara, indices, metrica, estadisticos, min_comunes)
+
+            ids[indices] = -1
+            distancias[indices] = np.nan
+            for fila, i in enumerate(indices):
+                otros = np.delete(todos, i)
+                seleccion = otros[seleccionar_top_k(matriz[fila, otros], k)]
+                ids[i, :len(seleccion)] = seleccion
+                distancias[i, :len(seleccion)] = matriz[fila, seleccion]
+
+            ids.flush()
+            distancias.flush()
+            hechos[bloque] = True
+            hechos.flush()
+            if progreso is not None:
+                progreso(metrica, int(hechos.sum()), n_bloques)
+        del ids, distancias, hechos
+
+    return AlmacenVecinos(directorio)
+
+class AlmacenVecinos:
+    def __init__(self, directorio):
+        """
+        Abre un almacén generado por precalcular_vecinos (mapeado en memoria, solo lectura).
+
+        :param directorio: directorio del almacén
+        """
+        with open(os.path.join(directorio, 'metadatos.json'), encoding='utf-8') as archivo:
+            metadatos = json.load(archivo)
+        if metadatos.get('version') != VERSION_ALMACEN:
+            raise ValueError(f"Versión de almacén no soportada: {metadatos.get('version')}")
+
+        self.directorio = directorio
+        self.k = metadatos['k']
+        self.tamano_bloque = metadatos['tamano_bloque']
+        self.min_comunes = metadatos['min_comunes']
+        self.usuarios = pd.Index(np.load(os.path.join(directorio, 'usuarios.npy')))
+        self._arrays = {}
+        for metrica in metadatos['metricas']:
+            ruta_ids, ruta_distancias, ruta_progreso = _rutas(directorio, metrica)
+            if not os.path.exists(ruta_progreso):
+                # Métrica pedida en un trabajo interrumpido antes de empezarla
+                continue
+            self._arrays[metrica] = (
+                np.load(ruta_ids, mmap_mode='r'),
+                np.load(ruta_distancias, mmap_mode='r'),
+                np.load(ruta_progreso),
+            )
+
+    @property
+    def metricas(self):
+        return list(self._arrays)
+
+    def vecinos(self, metrica, usuario, k=5, min_comunes=None):
+        """
+        Vecinos guardados de un usuario con el mismo formato que KNNCalcularDistancia.get_knn.
+
+        :return: DataFrame con la columna 'Distancia', o None si el almacén no puede
+                 responder (métrica, usuario o bloque ausentes, k mayor que el guardado
+                 o min_comunes distinto)
+        """
+        if metrica not in self._arrays or k > self.k or min_comunes != self.min_comunes:
+            return None
+        if usuario not in self.usuarios:
+            return None
+        posicion = self.usuarios.get_loc(usuario)
+        ids, distancias, hechos = self._arrays[metrica]
+        if not hechos[posicion // self.tamano_bloque]:
+            return None
+
+        fila_ids = ids[posicion, :k]
+        validos = fila_ids >= 0
+        return pd.DataFrame(
+            {'Distancia': distancias[posicion, :k][validos].astype(float)},
+            index=self.usuarios[fila_ids[validos]],
+        )
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Precálculo de vecinos KNN para todas las métricas")
+    parser.add_argument('--datos', required=True, help="CSV o directorio binario de ratings")
+    parser.add_argument('--salida', required=True, help="directorio del almacén")
+    parser.add_argument('--metricas', nargs='+', default=list(METRICAS_ALMACEN), choices=METRICAS_ALMACEN)
+    parser.add_argument('--k', type=int, default=50)
+    parser.add_argument('--tamano-bloque', type=int, default=256)
+    parser.add_argument('--min-comunes', type=int, default=None)
+    args = parser.parse_args(argumentos)
+
+    inicio = time.perf_counter()
+    def reportar(metrica, hechos, total):
+        print(f"{metrica}: bloque {hechos}/{total} ({time.perf_counter() - inicio:.1f} s)")
+
+    precalcular_vecinos(args.datos, args.salida, args.metricas, args.k, args.tamano_bloque,
+                        args.min_comunes, reportar)
+    print(f"Almacén escrito en {args.salida}")
+    return 0
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: benchmark.py
+
+Benchmarks reproducibles de las etapas del recomendador sobre datos sintéticos.
+
+Genera una matriz de ratings sintética con semilla fija y mide por separado:
+- carga: lectura del CSV y del formato binario,
+- distancias_<metrica>: distancia de un usuario a todos con cada métrica,
+- get_knn: KNNCalcularDistancia.get_knn,
+- agregacion: RecomendadorKNN.puntuar_candidatos sobre los vecinos ya calculados.
+
+Para cada etapa reporta latencias p50/p99, operaciones por segundo y el pico
+de memoria (tracemalloc), en JSON. Si se indica una línea base, falla (código
+de salida 1) cuando alguna etapa es más lenta que la base más la tolerancia.
+
+Uso:
+    python benchmark.py --usuarios 2000 --peliculas 1000 --densidad 0.05 --salida resultado.json
+    python benchmark.py ... --base resultado_base.json --tolerancia 0.25
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+DISTRIBUCIONES = ('uniforme', 'normal', 'sesgada')
+
+def generar_ratings_sinteticos(n_usuarios, n_peliculas, densidad=0.05, distribucion='uniforme', semilla=0):
+    """
+    Genera un DataFrame de ratings (peliculas x usuarios) de 1 a 5 con NaN en faltantes.
+
+    :param densidad: fracción de celdas con rating
+    :param distribucion: 'uniforme', 'normal' (centrada en 3) o 'sesgada' (más ratings altos)
+    :param semilla: semilla del generador
+    """
+    if distribucion not in DISTRIBUCIONES:
+        raise ValueError(f"Distribución no válida. Opciones: {list(DISTRIBUCIONES)}")
+
+    rng = np.random.default_rng(semilla)
+    forma = (n_peliculas, n_usuarios)
+    if distribucion == 'uniforme':
+        ratings = rng.integers(1, 6, forma).astype(float)
+    elif distribucion == 'normal':
+        ratings = np.clip(np.round(rng.normal(3.0, 1.0, forma)), 1, 5)
+    else:
+        ratings = rng.choice([1.0, 2.0, 3.0, 4.0, 5.0], size=forma, p=[0.05, 0.1, 0.2, 0.35, 0.3])
+    ratings[rng.random(forma) >= densidad] = np.nan
+
+    return pd.DataFrame(
+        ratings,
+        index=[f"pelicula_{i}" for i in range(n_peliculas)],
+        columns=[f"usuario_{i}" for i in range(n_usuarios)],
+    )
+
+def medir(funcion, argumentos, repeticiones=1):
+    """
+    Ejecuta funcion(*a) para cada a en argumentos (repeticiones veces) y resume latencias y memoria.
+
+    El pico de memoria se mide aparte, con una llamada extra bajo tracemalloc,
+    para que el rastreo no infle las latencias.
+
+    :return: diccionario con n, p50_ms, p99_ms, ops_por_segundo y pico_memoria_mb
+    """
+    latencias = []
+    for _ in range(repeticiones):
+        for argumento in argumentos:
+            inicio = time.perf_counter()
+            funcion(*argumento)
+            latencias.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    try:
+        funcion(*argumentos[0])
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencias = np.array(latencias)
+    return {
+        'n': int(len(latencias)),
+        'p50_ms': float(np.percentile(latencias, 50) * 1000),
+        'p99_ms': float(np.percentile(latencias, 99) * 1000),
+        'ops_por_segundo': float(len(latencias) / latencias.sum()) if latencias.sum() > 0 else float('inf'),
+        'pico_memoria_mb': pico / 2 ** 20,
+    }
+
+def ejecutar_benchmark(n_usuarios=1000, n_peliculas=500, densidad=0.05, distribucion='uniforme',
+                       semilla=0, n_consultas=20, k=10, repeticiones=1,
+                       metricas=('euclidean', 'manhattan', 'pearson', 'cosine')):
+    """
+    Ejecuta todas las etapas y devuelve el resultado como diccionario serializable en JSON.
+    """
+    from formato_binario import cargar_ratings, guardar_binario
+    from formulas import obtener_metrica
+    from Knn import KNNCalcularDistancia, preparar_matriz
+    from KNN_Recommender import RecomendadorKNN
+
+    df = generar_ratings_sinteticos(n_usuarios, n_peliculas, densidad, distribucion, semilla)
+    rng = np.random.default_rng(semilla)
+    consultas = list(rng.choice(df.columns, size=min(n_consultas, n_usuarios), replace=False))
+    etapas = {}
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_csv = os.path.join(directorio, 'ratings.csv')
+        ruta_binaria = os.path.join(directorio, 'ratings_bin')
+        df.to_csv(ruta_csv)
+        guardar_binario(df, ruta_binaria)
+        etapas['carga_csv'] = medir(cargar_ratings, [(ruta_csv,)], repeticiones)
+        etapas['carga_binaria'] = medir(
+            lambda ruta: cargar_ratings(ruta, mapeado=True).como_arrays(), [(ruta_binaria,)], repeticiones
+        )
+
+    valores, mascara = preparar_matriz(df)
+    posiciones = [df.columns.get_loc(u) for u in consultas]
+    for nombre in metricas:
+        kernel = obtener_metrica(nombre).vectorizada
+        etapas[f'distancias_{nombre}'] = medir(
+            lambda i: kernel(valores, valores[:, i], mascara, mascara[:, i]),
+            [(i,) for i in posiciones], repeticiones,
+        )
+
+    knn = KNNCalcularDistancia(metrica=metricas[0])
+    etapas['get_knn'] = medir(lambda u: knn.get_knn(df, u, k), [(u,) for u in consultas], repeticiones)
+
+    recomendador = RecomendadorKNN(knn)
+    vecindarios = [(u, knn.get_knn(df, u, k)) for u in consultas]
+    etapas['agregacion'] = medir(
+        lambda u, v: recomendador.puntuar_candidatos(df, u, v.index.tolist(), v['Distancia'].to_numpy()),
+        vecindarios, repeticiones,
+    )
+
+    return {
+        'configuracion': {
+            'usuarios': n_usuarios, 'peliculas': n_peliculas, 'densidad': densidad,
+            'distribucion': distribucion, 'semilla': semilla, 'consultas': len(consultas),
+            'k': k, 'repeticiones': repeticiones, 'metricas': list(metricas),
+        },
+        'etapas': etapas,
+    }
+
+def comparar_con_base(resultado, base, tolerancia=0.25):
+    """
+    Compara el p50 de cada etapa contra la línea base.
+
+    :return: lista de mensajes de regresión (vacía si no hay regresiones)
+    """
+    if base.get('configuracion') != resultado['configuracion']:
+        return ["La configuración no coincide con la de la línea base"]
+
+    regresiones = []
+    for etapa, medida in resultado['etapas'].items():
+        referencia = base['etapas'].get(etapa)
+        if referencia is None:
+            continue
+        limite = referencia['p50_ms'] * (1 + tolerancia)
+        if medida['p50_ms'] > limite:
+            regresiones.append(
+                f"{etapa}: p50 {medida['p50_ms']:.3f} ms > {limite:.3f} ms "
+                f"(base {referencia['p50_ms']:.3f} ms + {tolerancia:.0%})"
+            )
+    return regresiones
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Benchmark de las etapas del recomendador KNN")
+    parser.add_argument('--usuarios', type=int, default=1000)
+    parser.add_argument('--peliculas', type=int, default=500)
+    parser.add_argument('--densidad', type=float, default=0.05)
+    parser.add_argument('--distribucion', choices=DISTRIBUCIONES, default='uniforme')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--consultas', type=int, default=20, help="usuarios objetivo medidos por etapa")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--repeticiones', type=int, default=1)
+    parser.add_argument('--salida', help="archivo JSON de resultados (por defecto stdout)")
+    parser.add_argument('--base', help="archivo JSON de una ejecución anterior para comparar")
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="aumento relativo de p50 permitido")
+    args = parser.parse_args(argumentos)
+
+    resultado = ejecutar_benchmark(
+        args.usuarios, args.peliculas, args.densidad, args.distribucion, args.semilla,
+        args.consultas, args.k, args.repeticiones,
+    )
+
+    texto = json.dumps(resultado, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            archivo.write(texto)
+    else:
+        print(texto)
+
+    if args.base:
+        with open(args.base, encoding='utf-8') as archivo:
+            regresiones = comparar_con_base(resultado, json.load(archivo), args.tolerancia)
+        if regresiones:
+            print("REGRESIÓN DE RENDIMIENTO:", file=sys.stderr)
+            for mensaje in regresiones:
+                print(f"  {mensaje}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
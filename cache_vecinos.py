@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: cache_vecinos.py
+
+Caché LRU de vecindarios y recomendaciones, con invalidación selectiva
+cuando cambian los ratings de un usuario.
+
+Las entradas se indexan por (tipo, usuario objetivo, métrica, k, umbral). Junto
+a cada entrada se guarda qué vecinos la produjeron y la distancia del k-ésimo
+vecino. Cuando cambian los ratings de un usuario `u`, solo se descartan las
+entradas que pueden haber cambiado:
+- las del propio `u` como objetivo,
+- las que tienen a `u` entre sus vecinos,
+- las que tendrían a `u` como nuevo vecino (su nueva distancia al objetivo es
+  menor o igual que la del k-ésimo vecino guardado). Esas distancias se
+  calculan juntas, con una llamada al kernel vectorizado de la métrica por
+  todos los objetivos cacheados.
+
+La caché asume un único conjunto de ratings: los cambios deben avisarse con
+notificar_cambio (o con actualizar_ratings de los envoltorios). Con un
+AlmacenRatings, escuchar() hace ese aviso automático y además pide al almacén
+que mantenga los estadísticos de los pares (objetivo, vecino) guardados: si
+cambia un vecino y su nueva distancia (O(1)) sigue por debajo de la del
+k-ésimo, la entrada de vecinos se actualiza en lugar de descartarse.
+
+Clases principales:
+- CacheVecinos: almacenamiento LRU con contadores de aciertos, fallos y desalojos.
+- KNNConCache: envoltorio de KNNCalcularDistancia.get_knn.
+- RecomendadorConCache: envoltorio de RecomendadorKNN.generar_recomendaciones.
+"""
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from almacen_ratings import AlmacenRatings
+from formulas import buscar_metrica
+
+class CacheVecinos:
+    def __init__(self, capacidad=1024):
+        """
+        :param capacidad: número máximo de entradas antes de desalojar la menos usada
+        """
+        self.capacidad = capacidad
+        self._entradas = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.invalidaciones = 0
+        self.actualizaciones = 0
+        self._almacen = None
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obtener(self, clave):
+        """Devuelve el valor guardado (y lo marca como usado) o None si no está"""
+        if clave not in self._entradas:
+            self.fallos += 1
+            return None
+        self._entradas.move_to_end(clave)
+        self.aciertos += 1
+        return self._entradas[clave][0]
+
+    def guardar(self, clave, valor, vecinos, distancia_limite, distance_function):
+        """
+        Guarda una entrada junto con los datos necesarios para invalidarla.
+
+        :param vecinos: usuarios vecinos que produjeron el valor
+        :param distancia_limite: distancia del k-ésimo vecino (NaN si hay menos de k o es indefinida)
+        :param distance_function: función escalar para recalcular distancias al objetivo
+        """
+        if clave in self._entradas:
+            self._descartar(clave)
+        self._entradas[clave] = (valor, set(vecinos), distancia_limite, distance_function)
+        if self._almacen is not None:
+            self._almacen.seguir_pares(clave[1], vecinos)
+        while len(self._entradas) > self.capacidad:
+            self._descartar(next(iter(self._entradas)))
+            self.desalojos += 1
+
+    def _descartar(self, clave):
+        _, vecinos, _, _ = self._entradas.pop(clave)
+        if self._almacen is not None:
+            self._almacen.liberar_pares(clave[1], vecinos)
+
+    def escuchar(self, almacen):
+        """
+        Se suscribe a los cambios de un AlmacenRatings y le pide seguir los pares cacheados.
+
+        :param almacen: instancia de AlmacenRatings
+        """
+        self._almacen = almacen
+        for clave, (_, vecinos, _, _) in self._entradas.items():
+            almacen.seguir_pares(clave[1], vecinos)
+        almacen.suscribir(self.notificar_cambio)
+
+    def notificar_cambio(self, df_ratings, usuario):
+        """
+        Descarta las entradas afectadas porque cambiaron los ratings de `usuario`.
+
+        :param df_ratings: DataFrame ya actualizado (peliculas x usuarios) o AlmacenRatings
+        :param usuario: usuario cuyos ratings cambiaron
+        :return: número de entradas descartadas
+        """
+        descartar = []
+        pendientes = []
+        for clave, (valor, vecinos, limite, distance_function) in self._entradas.items():
+            objetivo = clave[1]
+            if objetivo == usuario:
+                descartar.append(clave)
+                continue
+            if usuario in vecinos:
+                if not (clave[0] == 'knn' and self._actualizar_vecino(df_ratings, clave, usuario)):
+                    descartar.append(clave)
+                continue
+            if usuario not in df_ratings.columns:
+                # Usuario eliminado: solo afectaba a las entradas donde era vecino
+                continue
+            if math.isnan(limite):
+                descartar.append(clave)
+                continue
+            pendientes.append((clave, objetivo, limite, distance_function))
+
+        # Distancia del usuario a todos los objetivos pendientes, una llamada por función
+        objetivos_por_funcion = {}
+        for _, objetivo, _, distance_function in pendientes:
+            objetivos_por_funcion.setdefault(distance_function, {})[objetivo] = None
+        nuevas = {}
+        for distance_function, objetivos in objetivos_por_funcion.items():
+            distancias = _distancias_a_objetivos(df_ratings, usuario, list(objetivos), distance_function)
+            nuevas.update(((distance_function, o), d) for o, d in zip(objetivos, distancias))
+        for clave, objetivo, limite, distance_function in pendientes:
+            nueva = nuevas[(distance_function, objetivo)]
+            if not math.isnan(nueva) and nueva <= limite:
+                descartar.append(clave)
+
+        for clave in descartar:
+            self._descartar(clave)
+        self.invalidaciones += len(descartar)
+        return len(descartar)
+
+    def _actualizar_vecino(self, almacen, clave, usuario):
+        """
+        Actualiza en el lugar la distancia de un vecino que cambió, si el vecindario sigue igual.
+
+        Solo con AlmacenRatings (distancia O(1) del par seguido). El conjunto de
+        vecinos no cambia si la nueva distancia es menor que la del k-ésimo
+        guardado, porque el resto de usuarios estaba a esa distancia o más.
+
+        :return: True si la entrada se actualizó, False si hay que descartarla
+        """
+        if not isinstance(almacen, AlmacenRatings) or usuario not in almacen.columns:
+            return False
+        valor, vecinos, limite, distance_function = self._entradas[clave]
+        nueva = almacen.distancia(clave[1], usuario, distance_function)
+        if math.isnan(nueva) or math.isnan(limite) or nueva >= limite:
+            return False
+
+        valor.loc[usuario, 'Distancia'] = nueva
+        # Mismo orden que get_knn: distancia y, en empates, posición del usuario
+        posiciones = almacen.columns.get_indexer(valor.index)
+        valor = valor.iloc[np.lexsort((posiciones, valor['Distancia'].to_numpy()))]
+        self._entradas[clave] = (valor, vecinos, _limite(valor, clave[3]), distance_function)
+        self.actualizaciones += 1
+        return True
+
+    def limpiar(self):
+        """Vacía la caché sin reiniciar los contadores"""
+        for clave in list(self._entradas):
+            self._descartar(clave)
+
+    def estadisticas(self):
+        """Contadores de uso de la caché"""
+        return {
+            'entradas': len(self._entradas),
+            'capacidad': self.capacidad,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'desalojos': self.desalojos,
+            'invalidaciones': self.invalidaciones,
+            'actualizaciones': self.actualizaciones,
+        }
+
+def _distancias_a_objetivos(df_ratings, usuario, objetivos, distance_function):
+    """
+    Distancias de `usuario` a varios objetivos con una sola llamada al kernel vectorizado.
+
+    Las métricas registradas son simétricas, así que el kernel con los
+    objetivos como matriz da distance_function(objetivo, usuario). Una función
+    no registrada se aplica objetivo por objetivo.
+    """
+    if isinstance(df_ratings, AlmacenRatings):
+        matriz = df_ratings.matriz_usuarios(objetivos)
+        columna = df_ratings.matriz_usuarios([usuario])[:, 0]
+    else:
+        matriz = df_ratings[objetivos].to_numpy(dtype=float)
+        columna = df_ratings[usuario].to_numpy(dtype=float)
+    info = buscar_metrica(distance_function)
+    if info is None or info.vectorizada is None:
+        return [distance_function(matriz[:, j], columna) for j in range(matriz.shape[1])]
+    return info.vectorizada(matriz, columna)
+
+def _limite(df_vecinos, k):
+    """Distancia del k-ésimo vecino, o NaN si hay menos de k"""
+    if len(df_vecinos) < k:
+        return float('nan')
+    return float(df_vecinos['Distancia'].iloc[k - 1])
+
+def _id_metrica(knn):
+    """Nombre de la métrica registrada, o la propia función si no está registrada"""
+    return knn.metrica if knn.metrica is not None else knn.distance_function
+
+class KNNConCache:
+    def __init__(self, knn_calculador, cache=None):
+        """
+        Envuelve un KNNCalcularDistancia agregando la caché delante de get_knn.
+        :param knn_calculador: instancia de KNNCalcularDistancia
+        :param cache: instancia de CacheVecinos (por defecto una nueva)
+        """
+        self.knn = knn_calculador
+        self.cache = cache if cache is not None else CacheVecinos()
+
+    def __getattr__(self, nombre):
+        # metrica, distance_function, calculate_distances... se delegan al calculador
+        return getattr(self.knn, nombre)
+
+    def get_knn(self, df, target_column, k=5):
+        clave = ('knn', target_column, _id_metrica(self.knn), k, None)
+        resultado = self.cache.obtener(clave)
+        if resultado is None:
+            resultado = self.knn.get_knn(df, target_column, k)
+            self.cache.guardar(clave, resultado, resultado.index, _limite(resultado, k),
+                               self.knn.distance_function)
+        return resultado.copy()
+
+    def actualizar_ratings(self, df, usuario, ratings):
+        """Reemplaza la columna de un usuario en df y descarta las entradas afectadas"""
+        df[usuario] = ratings
+        return self.cache.notificar_cambio(df, usuario)
+
+class RecomendadorConCache:
+    def __init__(self, recomendador, cache=None):
+        """
+        Envuelve un RecomendadorKNN agregando la caché delante de generar_recomendaciones.
+
+        Los vecinos se buscan a través de un KNNConCache con la misma caché, para
+        que los calculados en un fallo se reutilicen; el recomendador recibido no
+        se modifica.
+        :param recomendador: instancia de RecomendadorKNN
+        :param cache: instancia de CacheVecinos (puede compartirse con KNNConCache)
+        """
+        self.recomendador = recomendador
+        self.cache = cache if cache is not None else CacheVecinos()
+        if isinstance(recomendador.knn, KNNConCache):
+            self.knn = recomendador.knn
+        else:
+            self.knn = KNNConCache(recomendador.knn, self.cache)
+
+    def __getattr__(self, nombre):
+        return getattr(self.recomendador, nombre)
+
+    def generar_recomendaciones(self, df_ratings, usuario_objetivo, k=5):
+        clave = ('recomendaciones', usuario_objetivo, _id_metrica(self.knn), k, self.recomendador.umbral)
+        resultado = self.cache.obtener(clave)
+        if resultado is None:
+            # Mismos pasos que RecomendadorKNN.generar_recomendaciones, con una sola búsqueda de vecinos
+            df_vecinos = self.knn.get_knn(df_ratings, usuario_objetivo, k)
+            resultado = self.recomendador.puntuar_candidatos(
+                df_ratings, usuario_objetivo, df_vecinos.index.tolist(),
+                df_vecinos['Distancia'].to_numpy(), detalle=True,
+            )
+            self.cache.guardar(clave, resultado, df_vecinos.index, _limite(df_vecinos, k),
+                               self.knn.distance_function)
+        return resultado.copy()
+
+    def actualizar_ratings(self, df, usuario, ratings):
+        """Reemplaza la columna de un usuario en df y descarta las entradas afectadas"""
+        df[usuario] = ratings
+        return self.cache.notificar_cambio(df, usuario)
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: evaluacion.py
+
+Evaluación fuera de línea de configuraciones del recomendador KNN
+(métrica, k y umbral_rating) sobre una partición de prueba con semilla.
+
+- dividir_holdout separa al azar una fracción de los ratings de cada usuario
+  (cada usuario conserva al menos uno para entrenar).
+- Para cada usuario de prueba se predicen sus ratings ocultos como el
+  promedio de los ratings de sus k vecinos ponderado por 1 / (1 + distancia)
+  (igual que RecomendadorKNN.predecir_top_n) -> RMSE y MAE.
+- Sus N primeras recomendaciones, con el orden de generar_recomendaciones,
+  se comparan con los ratings ocultos >= umbral -> precision@N, recall@N y
+  cobertura del catálogo.
+
+Las distancias de cada bloque de usuarios de prueba se calculan una sola vez
+por métrica con vecinos_bloque (estadísticos suficientes, los mismos vecinos
+que generar_recomendaciones_batch) junto con sus max(ks) vecinos; los k
+menores son prefijos de esa lista y el umbral
+solo afecta a las candidatas, así que toda la grilla de k y umbrales
+reutiliza el mismo cálculo. Los pares (métrica, bloque) se reparten entre
+procesos que leen la matriz de entrenamiento desde memoria compartida.
+
+Uso:
+    python evaluacion.py --datos Movie_Ratings.csv --k 5 10 20 --umbral 3.5 4 --salida grilla.csv
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import numpy as np
+import pandas as pd
+from formato_binario import RatingsBinarios
+from Knn import preparar_matriz
+from KNN_Recommender import vecinos_bloque
+from procesamiento_paralelo import _adjuntar, _compartir
+from similitud_matriz import estadisticos_matriz
+
+METRICAS_EVALUACION = ('euclidean', 'manhattan', 'pearson', 'cosine')
+COLUMNAS_EVALUACION = [
+    'metrica', 'k', 'umbral', 'rmse', 'mae', 'cobertura_prediccion',
+    'precision', 'recall', 'cobertura', 'usuarios_evaluados',
+]
+
+_CAMPOS_SUMA = ('error_cuadratico', 'error_absoluto', 'predichos', 'pares', 'precision', 'recall', 'evaluados')
+
+# Estado de cada proceso trabajador (se llena en _inicializar_evaluacion)
+_MEMORIA = {}
+
+def dividir_holdout(df_ratings, fraccion=0.2, semilla=0):
+    """
+    Separa al azar una fracción de los ratings de cada usuario como prueba.
+
+    :param df_ratings: DataFrame de ratings (peliculas x usuarios) con NaN en faltantes o RatingsBinarios
+    :param fraccion: probabilidad de que un rating pase a prueba
+    :param semilla: semilla del generador
+    :return: (df_entrenamiento con NaN en los ratings de prueba,
+              DataFrame de prueba con columnas usuario, pelicula, rating);
+             con RatingsBinarios el entrenamiento es otro RatingsBinarios sobre los
+             mismos ratings mapeados y solo cambia el mapa de validez
+    """
+    valores, mascara = preparar_matriz(df_ratings)
+    peliculas, usuarios = np.nonzero(mascara)
+    azar = np.random.default_rng(semilla).random(len(usuarios))
+    en_prueba = azar < fraccion
+
+    # El rating con menor número al azar de cada usuario siempre queda en entrenamiento
+    orden = np.lexsort((azar, usuarios))
+    primeros = orden[np.r_[True, usuarios[orden][1:] != usuarios[orden][:-1]]] if len(orden) else orden
+    en_prueba[primeros] = False
+
+    df_prueba = pd.DataFrame({
+        'usuario': df_ratings.columns[usuarios[en_prueba]],
+        'pelicula': df_ratings.index[peliculas[en_prueba]],
+        'rating': valores[peliculas[en_prueba], usuarios[en_prueba]].astype(float),
+    })
+    if isinstance(df_ratings, RatingsBinarios):
+        validez = mascara.copy()
+        validez[peliculas[en_prueba], usuarios[en_prueba]] = False
+        entrenamiento = RatingsBinarios(valores, np.packbits(validez, axis=0), df_ratings.usuarios, df_ratings.peliculas)
+        return entrenamiento, df_prueba
+
+    entrenamiento = valores.copy()
+    entrenamiento[peliculas[en_prueba], usuarios[en_prueba]] = np.nan
+    return pd.DataFrame(entrenamiento, index=df_ratings.index, columns=df_ratings.columns), df_prueba
+
+def _inicializar_evaluacion(descriptores, prueba, ks, umbrales, n_recomendaciones):
+    """
+    Conecta el proceso a la matriz de entrenamiento compartida y guarda la configuración.
+
+    descriptores tiene 'valores', 'mascara' y los estadísticos 'm', 'x', 'x2'.
+    """
+    bloques, arrays = [], {}
+    for nombre, descriptor in descriptores.items():
+        bloque, arrays[nombre] = _adjuntar(descriptor)
+        bloques.append(bloque)
+    _MEMORIA.update(
+        bloques=bloques, valores=arrays['valores'], mascara=arrays['mascara'],
+        estadisticos=(arrays['m'], arrays['x'], arrays['x2']),
+    )
+    _configurar(prueba, ks, umbrales, n_recomendaciones)
+
+def _configurar(prueba, ks, umbrales, n_recomendaciones):
+    usuarios, peliculas, ratings = prueba
+    _MEMORIA.update(
+        usuarios_prueba=usuarios, peliculas_prueba=peliculas, ratings_prueba=ratings,
+        ks=ks, umbrales=umbrales, n_recomendaciones=n_recomendaciones,
+    )
+
+def _recomendadas(valores, mascara, indice, vecinos, umbral, n):
+    """Las n primeras películas con el orden de generar_recomendaciones (veces y rating de mayor a menor)"""
+    ratings = valores[:, vecinos]
+    candidatas = mascara[:, vecinos] & (ratings >= umbral) & ~mascara[:, [indice]]
+    veces = candidatas.sum(axis=1)
+    mejor = np.where(candidatas, ratings, -np.inf).max(axis=1, initial=-np.inf)
+    filas = np.flatnonzero(veces > 0)
+    return filas[np.lexsort((filas, -mejor[filas], -veces[filas]))][:n]
+
+def _evaluar_fragmento(tarea):
+    """
+    Evalúa todas las (k, umbral) de un bloque de usuarios de prueba para una métrica.
+
+    :return: (metrica, {(k, umbral): sumas parciales})
+    """
+    metrica, indices = tarea
+    valores, mascara = _MEMORIA['valores'], _MEMORIA['mascara']
+    ks, umbrales, n = _MEMORIA['ks'], _MEMORIA['umbrales'], _MEMORIA['n_recomendaciones']
+    usuarios_prueba = _MEMORIA['usuarios_prueba']
+
+    vecinos, distancias = vecinos_bloque(valores, mascara, indices, max(ks), metrica, _MEMORIA['estadisticos'])
+    pesos = np.nan_to_num(1.0 / (1.0 + distancias), nan=0.0)
+
+    # Pares de prueba de los usuarios del bloque (la prueba viene ordenada por usuario)
+    inicios = np.searchsorted(usuarios_prueba, indices, side='left')
+    fines = np.searchsorted(usuarios_prueba, indices, side='right')
+    filas_par = np.repeat(np.arange(len(indices)), fines - inicios)
+    pares = np.concatenate([np.arange(i, f) for i, f in zip(inicios, fines)])
+    peliculas_par = _MEMORIA['peliculas_prueba'][pares]
+    ratings_par = _MEMORIA['ratings_prueba'][pares]
+
+    resultados = {}
+    for k in ks:
+        vecinos_par = vecinos[filas_par, :k]
+        validos = mascara[peliculas_par[:, None], vecinos_par]
+        pesos_par = np.where(validos, pesos[filas_par, :k], 0.0)
+        suma_pesos = pesos_par.sum(axis=1)
+        ponderado = (np.where(validos, valores[peliculas_par[:, None], vecinos_par], 0.0) * pesos_par).sum(axis=1)
+        predichos = suma_pesos > 0
+        errores = ponderado[predichos] / suma_pesos[predichos] - ratings_par[predichos]
+
+        for umbral in umbrales:
+            recomendadas = np.zeros(valores.shape[0], dtype=bool)
+            suma_precision = suma_recall = 0.0
+            evaluados = 0
+            for fila, indice in enumerate(indices):
+                relevantes = peliculas_par[(filas_par == fila) & (ratings_par >= umbral)]
+                top = _recomendadas(valores, mascara, indice, vecinos[fila, :k], umbral, n)
+                recomendadas[top] = True
+                if len(relevantes) == 0:
+                    continue
+                aciertos = np.isin(top, relevantes).sum()
+                suma_precision += aciertos / n
+                suma_recall += aciertos / len(relevantes)
+                evaluados += 1
+
+            resultados[(k, umbral)] = {
+                'error_cuadratico': float((errores ** 2).sum()),
+                'error_absoluto': float(np.abs(errores).sum()),
+                'predichos': int(predichos.sum()),
+                'pares': len(pares),
+                'precision': suma_precision,
+                'recall': suma_recall,
+                'evaluados': evaluados,
+                'recomendadas': recomendadas,
+            }
+    return metrica, resultados
+
+def evaluar_configuraciones(df_ratings, metricas=METRICAS_EVALUACION, ks=(5, 10, 20), umbrales=(4.0,),
+                            n_recomendaciones=10, fraccion_prueba=0.2, semilla=0,
+                            n_procesos=None, tamano_bloque=256):
+    """
+    Evalúa la grilla métricas x ks x umbrales sobre una partición holdout.
+
+    :param df_ratings: DataFrame de ratings (peliculas x usuarios) o RatingsBinarios
+    :param n_recomendaciones: N de precision@N y recall@N
+    :param fraccion_prueba: fracción de ratings ocultos (ver dividir_holdout)
+    :param semilla: semilla de la partición
+    :param n_procesos: procesos del pool (1 = en el proceso actual; por defecto os.cpu_count())
+    :param tamano_bloque: usuarios de prueba por tarea
+    :return: DataFrame ordenado con una fila por configuración y columnas COLUMNAS_EVALUACION
+    """
+    df_entrenamiento, df_prueba = dividir_holdout(df_ratings, fraccion_prueba, semilla)
+    # Los ratings mapeados se comparten en su tipo compacto; los estadísticos
+    # float64 de distancias_bloque se calculan una sola vez y también se comparten
+    valores, mascara = preparar_matriz(df_entrenamiento)
+
+    usuarios = df_ratings.columns.get_indexer(df_prueba['usuario'])
+    orden = np.argsort(usuarios, kind='stable')
+    prueba = (
+        usuarios[orden],
+        df_ratings.index.get_indexer(df_prueba['pelicula'])[orden],
+        df_prueba['rating'].to_numpy(dtype=float)[orden],
+    )
+    ks = sorted(set(ks))
+    umbrales = sorted(set(umbrales))
+    usuarios_prueba = np.unique(prueba[0])
+    tareas = [
+        (metrica, usuarios_prueba[i:i + tamano_bloque])
+        for metrica, i in product(metricas, range(0, len(usuarios_prueba), tamano_bloque))
+    ]
+
+    n_procesos = n_procesos or os.cpu_count() or 1
+    estadisticos = estadisticos_matriz(valores, mascara)
+    if n_procesos == 1:
+        _MEMORIA.update(valores=valores, mascara=mascara, estadisticos=estadisticos)
+        _configurar(prueba, ks, umbrales, n_recomendaciones)
+        parciales = list(map(_evaluar_fragmento, tareas))
+    else:
+        arrays = dict(zip(('m', 'x', 'x2'), estadisticos), valores=valores, mascara=mascara)
+        bloques, descriptores = [], {}
+        try:
+            for nombre, array in arrays.items():
+                bloque, descriptores[nombre] = _compartir(array)
+                bloques.append(bloque)
+            del arrays, estadisticos
+            with ProcessPoolExecutor(
+                max_workers=n_procesos, initializer=_inicializar_evaluacion,
+                initargs=(descriptores, prueba, ks, umbrales, n_recomendaciones),
+            ) as ejecutor:
+                parciales = list(ejecutor.map(_evaluar_fragmento, tareas))
+        finally:
+            for bloque in bloques:
+                bloque.close()
+                bloque.unlink()
+
+    totales = {}
+    for metrica, resultados in parciales:
+        for (k, umbral), parcial in resultados.items():
+            clave = (metrica, k, umbral)
+            if clave not in totales:
+                totales[clave] = dict(parcial, recomendadas=parcial['recomendadas'].copy())
+                continue
+            total = totales[clave]
+            for campo in _CAMPOS_SUMA:
+                total[campo] += parcial[campo]
+            total['recomendadas'] |= parcial['recomendadas']
+
+    filas = []
+    for (metrica, k, umbral), total in totales.items():
+        predichos, evaluados = total['predichos'], total['evaluados']
+        filas.append({
+            'metrica': metrica,
+            'k': k,
+            'umbral': umbral,
+            'rmse': np.sqrt(total['error_cuadratico'] / predichos) if predichos else np.nan,
+            'mae': total['error_absoluto'] / predichos if predichos else np.nan,
+            'cobertura_prediccion': predichos / total['pares'] if total['pares'] else np.nan,
+            'precision': total['precision'] / evaluados if evaluados else np.nan,
+            'recall': total['recall'] / evaluados if evaluados else np.nan,
+            'cobertura': total['recomendadas'].mean(),
+            'usuarios_evaluados': evaluados,
+        })
+    return pd.DataFrame(filas, columns=COLUMNAS_EVALUACION).sort_values(
+        ['metrica', 'k', 'umbral'], kind='stable'
+    ).reset_index(drop=True)
+
+def main(argumentos=None):
+    from formato_binario import cargar_ratings
+
+    parser = argparse.ArgumentParser(description="Evaluación de configuraciones del recomendador KNN")
+    parser.add_argument('--datos', default='Pelis_short.csv', help="CSV o directorio binario de ratings")
+    parser.add_argument('--metricas', nargs='+', default=list(METRICAS_EVALUACION), choices=METRICAS_EVALUACION)
+    parser.add_argument('--k', nargs='+', type=int, default=[5, 10, 20])
+    parser.add_argument('--umbral', nargs='+', type=float, default=[4.0])
+    parser.add_argument('--n', type=int, default=10, help="N de precision@N y recall@N")
+    parser.add_argument('--fraccion-prueba', type=float, default=0.2)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--procesos', type=int, default=None)
+    parser.add_argument('--salida', help="archivo CSV de resultados (por defecto stdout)")
+    args = parser.parse_args(argumentos)
+
+    resultado = evaluar_configuraciones(
+        cargar_ratings(args.datos, mapeado=True), args.metricas, args.k, args.umbral, args.n,
+        args.fraccion_prueba, args.semilla, args.procesos,
+    )
+    if args.salida:
+        resultado.to_csv(args.salida, index=False)
+    else:
+        print(resultado.to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: factorizacion_als.py
+
+Modelo de factores latentes entrenado con mínimos cuadrados alternados (ALS).
+
+Cada rating observado se aproxima como media + u_usuario · v_pelicula. En cada
+iteración se fijan los factores de películas y se resuelve, para cada
+usuario, el sistema regularizado sobre solo sus películas calificadas:
+
+    (V_I^T V_I + regularizacion * n_I * I) u = V_I^T (r_I - media)
+
+y luego lo mismo para las películas con los usuarios fijos. Los sistemas de
+un bloque de entidades se arman juntos (np.add.reduceat sobre los productos
+externos, por tramos de memoria acotada) y se resuelven con un np.linalg.solve por lotes; los bloques se
+reparten entre hilos, ya que LAPACK libera el GIL.
+
+Una vez ajustado, puntuar a un usuario es un producto matriz-vector más una
+selección parcial de las N mejores películas no vistas.
+
+Clases principales:
+- RecomendadorALS: ajustar, guardar/cargar y generar_recomendaciones con el
+  mismo esquema de columnas que RecomendadorKNN.generar_recomendaciones.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from formato_binario import _etiquetas
+from Knn import seleccionar_top_k
+from ratings_compactos import RatingsCompactos
+from ratings_dispersos import RatingsDispersos, _rangos
+
+# Memoria máxima de los productos externos temporales al armar las matrices de Gram
+MAX_BYTES_PRODUCTOS = 64 * 2 ** 20
+
+def _resolver_bloque(indptr, indices, residuos, fijos, entidades, regularizacion):
+    """
+    Factores de un bloque de entidades (usuarios o películas) con los otros fijos.
+
+    Las entidades con más ratings que factores arman su matriz de Gram con un
+    producto V_I^T V_I propio; las demás se agrupan en tramos cuyos productos
+    externos temporales no superan MAX_BYTES_PRODUCTOS y se suman con
+    np.add.reduceat. Así la memoria es O(len(entidades) x factores^2) aunque el
+    bloque tenga muchos ratings.
+
+    :param indptr: punteros CSR de la vista por entidad
+    :param indices: posiciones de la otra dimensión, concatenadas por entidad
+    :param residuos: ratings menos la media, en el mismo orden que indices
+    :param fijos: factores de la otra dimensión (n x factores)
+    :param entidades: posiciones de las entidades del bloque (todas con al menos un rating)
+    :return: array (len(entidades) x factores)
+    """
+    n_factores = fijos.shape[1]
+    largos = indptr[entidades + 1] - indptr[entidades]
+    productos = np.empty((len(entidades), n_factores, n_factores))
+    lados = np.empty((len(entidades), n_factores))
+
+    for j in np.flatnonzero(largos > n_factores):
+        posiciones = slice(indptr[entidades[j]], indptr[entidades[j] + 1])
+        f = fijos[indices[posiciones]]
+        productos[j] = f.T @ f
+        lados[j] = f.T @ residuos[posiciones]
+
+    cortas = np.flatnonzero(largos <= n_factores)
+    max_pares = max(MAX_BYTES_PRODUCTOS // (8 * n_factores * n_factores), n_factores)
+    cortes = np.searchsorted(np.cumsum(largos[cortas]), np.arange(max_pares, largos[cortas].sum(), max_pares))
+    for tramo in np.split(cortas, cortes):
+        if len(tramo) == 0:
+            continue
+        posiciones, largos_tramo = _rangos(indptr, entidades[tramo])
+        f = fijos[indices[posiciones]]
+        segmentos = np.concatenate([[0], np.cumsum(largos_tramo)[:-1]])
+        productos[tramo] = np.add.reduceat(f[:, :, None] * f[:, None, :], segmentos, axis=0)
+        lados[tramo] = np.add.reduceat(f * residuos[posiciones][:, None], segmentos, axis=0)
+
+    productos += (regularizacion * largos)[:, None, None] * np.eye(n_factores)
+    return np.linalg.solve(productos, lados[:, :, None])[:, :, 0]
+
+class RecomendadorALS:
+    def __init__(self, n_factores=20, regularizacion=0.1, iteraciones=10, umbral_rating=4.0,
+                 n_hilos=None, tamano_bloque=256, semilla=0):
+        """
+        Inicializa el modelo de factores.
+        :param n_factores: dimensión de los embeddings
+        :param regularizacion: lambda (se multiplica por el número de ratings de cada entidad)
+        :param iteraciones: pasadas completas usuarios + películas
+        :param umbral_rating: rating predicho mínimo para recomendar una película
+        :param n_hilos: hilos para resolver los bloques (por defecto los de ThreadPoolExecutor)
+        :param tamano_bloque: entidades por sistema por lotes
+        :param semilla: semilla de la inicialización
+        """
+        self.n_factores = n_factores
+        self.regularizacion = regularizacion
+        self.iteraciones = iteraciones
+        self.umbral = umbral_rating
+        self.n_hilos = n_hilos
+        self.tamano_bloque = tamano_bloque
+        self.semilla = semilla
+        self.usuarios = None
+        self.peliculas = None
+        self.media = None
+        self.factores_usuarios = None
+        self.factores_peliculas = None
+        self.historial_rmse = []
+
+    def _resolver(self, ejecutor, indptr, indices, residuos, fijos, n_entidades):
+        """Resuelve todas las entidades por bloques en el pool de hilos"""
+        factores = np.zeros((n_entidades, self.n_factores))
+        con_ratings = np.flatnonzero(np.diff(indptr) > 0)
+        bloques = [con_ratings[i:i + self.tamano_bloque] for i in range(0, len(con_ratings), self.tamano_bloque)]
+        resultados = ejecutor.map(
+            lambda entidades: _resolver_bloque(indptr, indices, residuos, fijos, entidades, self.regularizacion),
+            bloques,
+        )
+        for entidades, resultado in zip(bloques, resultados):
+            factores[entidades] = resultado
+        return factores
+
+    def ajustar(self, df_ratings):
+        """
+        Entrena los factores de usuarios y películas sobre los ratings observados.
+
+        :param df_ratings: DataFrame de ratings (peliculas x usuarios), RatingsDispersos o RatingsCompactos
+        """
+        if isinstance(df_ratings, RatingsCompactos):
+            df_ratings = df_ratings.a_dataframe()
+        if not isinstance(df_ratings, RatingsDispersos):
+            df_ratings = RatingsDispersos.desde_dataframe(df_ratings)
+        ratings = df_ratings
+        n_peliculas, n_usuarios = len(ratings.peliculas), len(ratings.usuarios)
+        if ratings.nnz == 0:
+            raise ValueError("No hay ratings para ajustar el modelo")
+
+        self.usuarios = pd.Index(ratings.usuarios)
+        self.peliculas = pd.Index(ratings.peliculas)
+        self.media = float(ratings.datos_por_usuario.mean())
+        residuos_usuario = ratings.datos_por_usuario - self.media
+        residuos_pelicula = ratings.datos_por_pelicula - self.media
+
+        rng = np.random.default_rng(self.semilla)
+        self.factores_usuarios = rng.normal(0.0, 0.1, (n_usuarios, self.n_factores))
+        self.factores_peliculas = rng.normal(0.0, 0.1, (n_peliculas, self.n_factores))
+        usuario_de_rating = np.repeat(np.arange(n_usuarios), np.diff(ratings.indptr_usuarios))
+
+        self.historial_rmse = []
+        with ThreadPoolExecutor(max_workers=self.n_hilos) as ejecutor:
+            for _ in range(self.iteraciones):
+                self.factores_usuarios = self._resolver(
+                    ejecutor, ratings.indptr_usuarios, ratings.peliculas_de_usuario,
+                    residuos_usuario, self.factores_peliculas, n_usuarios,
+                )
+                self.factores_peliculas = self._resolver(
+                    ejecutor, ratings.indptr_peliculas, ratings.usuarios_de_pelicula,
+                    residuos_pelicula, self.factores_usuarios, n_peliculas,
+                )
+                estimados = np.einsum(
+                    'ij,ij->i', self.factores_usuarios[usuario_de_rating],
+                    self.factores_peliculas[ratings.peliculas_de_usuario],
+                )
+                self.historial_rmse.append(float(np.sqrt(np.mean((residuos_usuario - estimados) ** 2))))
+        return self
+
+    def guardar(self, ruta):
+        """Guarda los factores en un archivo .npz"""
+        np.savez(
+            ruta,
+            factores_usuarios=self.factores_usuarios,
+            factores_peliculas=self.factores_peliculas,
+            usuarios=_etiquetas(self.usuarios),
+            peliculas=_etiquetas(self.peliculas),
+            media=self.media,
+            regularizacion=self.regularizacion,
+            umbral=self.umbral,
+        )
+
+    @classmethod
+    def cargar(cls, ruta):
+        """Carga factores guardados con guardar()"""
+        with np.load(ruta) as datos:
+            recomendador = cls(
+                datos['factores_usuarios'].shape[1], float(datos['regularizacion']),
+                umbral_rating=float(datos['umbral']),
+            )
+            recomendador.factores_usuarios = datos['factores_usuarios']
+            recomendador.factores_peliculas = datos['factores_peliculas']
+            recomendador.usuarios = pd.Index(datos['usuarios'])
+            recomendador.peliculas = pd.Index(datos['peliculas'])
+            recomendador.media = float(datos['media'])
+        return recomendador
+
+    def predecir(self, usuario):
+        """Rating predicho del usuario para todas las películas (array alineado con self.peliculas)"""
+        if self.factores_usuarios is None:
+            raise ValueError("El recomendador no está ajustado; llamar primero a ajustar()")
+        if usuario not in self.usuarios:
+            raise ValueError(f"La columna '{usuario}' no existe en el DataFrame")
+        return self.media + self.factores_peliculas @ self.factores_usuarios[self.usuarios.get_loc(usuario)]
+
+    def generar_recomendaciones(self, df_ratings, usuario_objetivo, n=10):
+        """
+        Recomienda las n películas no vistas con mayor rating predicho (>= umbral).
+
+        Para mantener el esquema de RecomendadorKNN, `usuario_vecino` es el
+        propio usuario objetivo, `rating_vecino` el rating predicho y
+        `veces_recomendada` vale 1.
+
+        :param df_ratings: ratings actuales (DataFrame, RatingsDispersos o RatingsCompactos),
+                           usados para saber qué películas ya vio el usuario
+        :param usuario_objetivo: nombre del usuario
+        :param n: número máximo de películas (ocupa el lugar de k en RecomendadorKNN)
+        :return: DataFrame con usuario_vecino, pelicula, rating_vecino, veces_recomendada
+        """
+        predicciones = self.predecir(usuario_objetivo)
+
+        if isinstance(df_ratings, (RatingsDispersos, RatingsCompactos)):
+            serie_objetivo = df_ratings.serie_usuario(usuario_objetivo)
+        elif usuario_objetivo in df_ratings.columns:
+            serie_objetivo = df_ratings[usuario_objetivo]
+        else:
+            raise ValueError(f"La columna '{usuario_objetivo}' no existe en el DataFrame")
+        vistas = serie_objetivo.reindex(self.peliculas).notna().to_numpy()
+
+        candidatas = np.flatnonzero(~vistas & (predicciones >= self.umbral))
+        candidatas = candidatas[seleccionar_top_k(-predicciones[candidatas], n)]
+        return pd.DataFrame({
+            'usuario_vecino': usuario_objetivo,
+            'pelicula': self.peliculas[candidatas],
+            'rating_vecino': predicciones[candidatas],
+            'veces_recomendada': np.ones(len(candidatas), dtype=np.int64),
+        })
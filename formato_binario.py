@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: formato_binario.py
+
+Formato binario columnar para matrices de ratings y carga por mapeo en memoria.
+
+Un conjunto de ratings se guarda como un directorio con archivos .npy:
+- ratings.npy: ratings (peliculas x usuarios) en uint8 si todos son enteros
+  entre 0 y 255, o float32 en otro caso; los faltantes se guardan como 0.
+- validez.npy: mapa de bits de ratings válidos, empaquetado por película
+  (np.packbits sobre el eje 0).
+- usuarios.npy / peliculas.npy: tablas de etiquetas (las numéricas conservan su tipo).
+- metadatos.json: versión del formato y forma de la matriz.
+
+Los .npy numéricos se abren con np.load(mmap_mode='r'), así que varios
+procesos comparten las mismas páginas del sistema operativo y la carga no
+depende del tamaño del archivo.
+
+Funciones principales:
+- convertir_csv_a_binario: CSV ancho (como Pelis_short.csv) -> directorio binario.
+- guardar_binario: DataFrame -> directorio binario.
+- cargar_binario: directorio binario -> RatingsBinarios (mapeado en memoria).
+- cargar_ratings: carga un CSV o un directorio binario como DataFrame, o con
+  mapeado=True el directorio como RatingsBinarios sin densificarlo.
+
+RatingsBinarios expone columns/index y __getitem__ como un DataFrame, y
+Knn.preparar_matriz devuelve su array mapeado tal cual (con la máscara
+desempaquetada una sola vez), de modo que KNNCalcularDistancia,
+recomendar_bloque y generar_recomendaciones_batch reciben las páginas
+mapeadas sin que la carga copie el archivo. Los kernels sí crean temporales
+float64: los uno-contra-todos por consulta y distancias_bloque una vez por
+matriz (similitud_matriz.estadisticos_matriz).
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+VERSION_FORMATO = 1
+
+def _etiquetas(indice):
+    """
+    Etiquetas de un Index como array que np.save guarda sin pickle.
+
+    Las numéricas conservan su tipo (para que al cargar los ids enteros sigan
+    siendo enteros); el resto se guarda como texto.
+    """
+    etiquetas = pd.Index(indice).to_numpy()
+    if etiquetas.dtype.kind in 'biuf':
+        return etiquetas
+    return etiquetas.astype(str)
+
+class RatingsBinarios:
+    def __init__(self, valores, validez, usuarios, peliculas):
+        """
+        Vista sobre un conjunto de ratings binario.
+
+        :param valores: array (peliculas x usuarios) uint8 o float32, 0 en faltantes
+        :param validez: mapa de bits empaquetado (ceil(peliculas / 8) x usuarios)
+        :param usuarios: etiquetas de usuarios
+        :param peliculas: etiquetas de películas
+        """
+        self.valores = valores
+        self.validez = validez
+        self.usuarios = pd.Index(usuarios)
+        self.peliculas = pd.Index(peliculas)
+        self._mascara = None
+
+    @property
+    def shape(self):
+        return self.valores.shape
+
+    @property
+    def columns(self):
+        """Usuarios, como df.columns"""
+        return self.usuarios
+
+    @property
+    def index(self):
+        """Películas, como df.index"""
+        return self.peliculas
+
+    def posicion_usuario(self, usuario):
+        """Índice del usuario; ValueError si no existe"""
+        if usuario not in self.usuarios:
+            raise ValueError(f"La columna '{usuario}' no existe en el DataFrame")
+        return self.usuarios.get_loc(usuario)
+
+    def mascara(self, columnas=slice(None)):
+        """Desempaqueta el mapa de bits (de todas o de algunas columnas) como array booleano"""
+        if self._mascara is not None:
+            return self._mascara[:, columnas]
+        bits = np.unpackbits(self.validez[:, columnas], axis=0, count=self.valores.shape[0])
+        return bits.astype(bool)
+
+    def como_arrays(self):
+        """
+        (valores, mascara) para los cálculos matriciales sin copiar los ratings.
+
+        valores es el array mapeado (uint8 o float32, 0 en faltantes); la máscara
+        se desempaqueta la primera vez y se conserva (un byte por celda).
+        """
+        if self._mascara is None:
+            self._mascara = self.mascara()
+        return self.valores, self._mascara
+
+    def columnas(self, indices=slice(None)):
+        """Ratings float64 de algunas columnas, con NaN en faltantes"""
+        return np.where(self.mascara(indices), self.valores[:, indices], np.nan)
+
+    def __getitem__(self, usuario):
+        """Ratings de un usuario como Serie indexada por película (como df[usuario])"""
+        return pd.Series(self.columnas(self.posicion_usuario(usuario)), index=self.peliculas, name=usuario)
+
+    def como_matriz(self):
+        """Devuelve (valores float64 con NaN en faltantes, mascara) como los usa Knn.preparar_matriz"""
+        mascara = self.mascara()
+        valores = np.where(mascara, self.valores, np.nan)
+        return valores, mascara
+
+    def a_dataframe(self):
+        """Materializa el DataFrame (peliculas x usuarios) con NaN en faltantes"""
+        valores, _ = self.como_matriz()
+        return pd.DataFrame(valores, index=self.peliculas, columns=self.usuarios)
+
+def guardar_binario(df, ruta):
+    """
+    Escribe un DataFrame de ratings (peliculas x usuarios) en formato binario.
+
+    :param df: DataFrame con NaN en ratings faltantes
+    :param ruta: directorio de salida (se crea si no existe)
+    """
+    valores = df.to_numpy(dtype=float)
+    mascara = ~np.isnan(valores)
+    validos = valores[mascara]
+
+    enteros = np.all(validos == np.round(validos)) and np.all((validos >= 0) & (validos <= 255))
+    tipo = np.uint8 if enteros else np.float32
+    compactos = np.where(mascara, valores, 0).astype(tipo)
+
+    os.makedirs(ruta, exist_ok=True)
+    np.save(os.path.join(ruta, 'ratings.npy'), compactos)
+    np.save(os.path.join(ruta, 'validez.npy'), np.packbits(mascara, axis=0))
+    np.save(os.path.join(ruta, 'usuarios.npy'), _etiquetas(df.columns))
+    np.save(os.path.join(ruta, 'peliculas.npy'), _etiquetas(df.index))
+    with open(os.path.join(ruta, 'metadatos.json'), 'w', encoding='utf-8') as archivo:
+        json.dump({
+            'version': VERSION_FORMATO,
+            'tipo': np.dtype(tipo).name,
+            'peliculas': int(valores.shape[0]),
+            'usuarios': int(valores.shape[1]),
+        }, archivo)
+
+def convertir_csv_a_binario(ruta_csv, ruta_salida):
+    """Convierte un CSV ancho (películas en filas, usuarios en columnas) al formato binario"""
+    guardar_binario(pd.read_csv(ruta_csv, index_col=0), ruta_salida)
+
+def cargar_binario(ruta):
+    """
+    Abre un directorio binario mapeando en memoria ratings y validez (sin copiar).
+
+    :return: RatingsBinarios
+    """
+    with open(os.path.join(ruta, 'metadatos.json'), encoding='utf-8') as archivo:
+        metadatos = json.load(archivo)
+    if metadatos.get('version') != VERSION_FORMATO:
+        raise ValueError(f"Versión de formato no soportada: {metadatos.get('version')}")
+
+    return RatingsBinarios(
+        np.load(os.path.join(ruta, 'ratings.npy'), mmap_mode='r'),
+        np.load(os.path.join(ruta, 'validez.npy'), mmap_mode='r'),
+        np.load(os.path.join(ruta, 'usuarios.npy')),
+        np.load(os.path.join(ruta, 'peliculas.npy')),
+    )
+
+def cargar_ratings(ruta, mapeado=False):
+    """
+    Carga ratings como DataFrame desde un CSV o desde un directorio binario.
+
+    :param ruta: archivo .csv o directorio generado por guardar_binario
+    :param mapeado: si es True, un directorio binario se devuelve como
+                    RatingsBinarios mapeado en memoria en lugar de DataFrame
+    """
+    if os.path.isdir(ruta):
+        binarios = cargar_binario(ruta)
+        return binarios if mapeado else binarios.a_dataframe()
+    return pd.read_csv(ruta, index_col=0)
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Uso: python formato_binario.py <ratings.csv> <directorio_salida>")
+        sys.exit(1)
+    convertir_csv_a_binario(sys.argv[1], sys.argv[2])
+    print(f"Ratings convertidos a {sys.argv[2]}")
@@ -1,4 +1,7 @@
 import math
+from collections import namedtuple
+
+import numpy as np
 
 def euclidean_distance(a, b):
     """Distancia Euclidiana"""
@@ -86,4 +89,181 @@ def cosine_distance(a, b):
     norm_a = math.sqrt(norm_a)
     norm_b = math.sqrt(norm_b)
     cosine_sim = dot_product / (norm_a * norm_b)
-    return 1 - cosine_sim
\ No newline at end of file
+    return 1 - cosine_sim
+
+
+# ---------------------------------------------------------------------------
+# Versiones vectorizadas (uno contra todos)
+#
+# Reciben la matriz completa de ratings (peliculas x usuarios) y el vector del
+# usuario objetivo (peliculas,) y devuelven la distancia del objetivo a cada
+# columna en una sola pasada enmascarada. Mantienen la misma semántica NaN que
+# las versiones escalares: solo se usan las películas calificadas por ambos.
+# ---------------------------------------------------------------------------
+
+def _pares_comunes(matriz, objetivo, mascara=None, mascara_objetivo=None):
+    """
+    Construye la máscara de películas co-calificadas y los valores de ambos
+    lados con ceros fuera de la máscara.
+
+    Parámetros:
+    matriz -- array (peliculas x usuarios)
+    objetivo -- array (peliculas,) del usuario objetivo
+    mascara -- array booleano de ratings válidos en matriz (opcional, por defecto ~isnan)
+    mascara_objetivo -- array booleano de ratings válidos en objetivo (opcional)
+
+    Retorna:
+    (comunes, a, b, n) donde n es el número de pares válidos por columna
+    """
+    # Sin convertir la matriz completa: el único temporal float64 es b
+    matriz = np.asarray(matriz)
+    objetivo = np.asarray(objetivo, dtype=float)
+    if mascara is None:
+        mascara = ~np.isnan(matriz)
+    if mascara_objetivo is None:
+        mascara_objetivo = ~np.isnan(objetivo)
+
+    comunes = mascara & mascara_objetivo[:, None]
+    a = np.where(comunes, objetivo[:, None], 0.0)
+    b = np.where(comunes, matriz, 0.0).astype(float, copy=False)
+    n = comunes.sum(axis=0)
+    return comunes, a, b, n
+
+def _pearson_desde_sumas(n, sa, sb, saa, sbb, sab):
+    """
+    Distancia Pearson a partir de los estadísticos suficientes de los pares co-calificados.
+
+    Es la única implementación de Pearson para arrays: la usan las versiones
+    vectorizada y por pares y similitud_matriz.distancias_bloque. Todo va
+    multiplicado por n, así que con ratings enteros (o múltiplos de 1/2) las
+    sumas son exactas en cualquier orden y todos los caminos dan la misma
+    distancia bit a bit.
+    """
+    n = np.asarray(n, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covarianza = n * sab - sa * sb
+        var_a = n * saa - sa ** 2
+        var_b = n * sbb - sb ** 2
+        tolerancia = 1e-12 * n * np.maximum(saa, sbb)
+        distancias = 1 - covarianza / np.sqrt(var_a * var_b)
+    invalidos = (n < 2) | (var_a <= tolerancia) | (var_b <= tolerancia)
+    return np.where(invalidos, np.nan, distancias)
+
+def euclidean_distance_batch(matriz, objetivo, mascara=None, mascara_objetivo=None):
+    """Distancia Euclidiana del objetivo a cada columna de la matriz"""
+    _, a, b, n = _pares_comunes(matriz, objetivo, mascara, mascara_objetivo)
+    distancias = np.sqrt(((a - b) ** 2).sum(axis=0))
+    return np.where(n == 0, np.nan, distancias)
+
+def manhattan_distance_batch(matriz, objetivo, mascara=None, mascara_objetivo=None):
+    """Distancia Manhattan del objetivo a cada columna de la matriz"""
+    _, a, b, n = _pares_comunes(matriz, objetivo, mascara, mascara_objetivo)
+    distancias = np.abs(a - b).sum(axis=0)
+    return np.where(n == 0, np.nan, distancias)
+
+def pearson_distance_batch(matriz, objetivo, mascara=None, mascara_objetivo=None):
+    """Distancia Pearson (1 - correlación) del objetivo a cada columna de la matriz"""
+    _, a, b, n = _pares_comunes(matriz, objetivo, mascara, mascara_objetivo)
+    return _pearson_desde_sumas(
+        n, a.sum(axis=0), b.sum(axis=0), (a ** 2).sum(axis=0), (b ** 2).sum(axis=0), (a * b).sum(axis=0)
+    )
+
+def cosine_distance_batch(matriz, objetivo, mascara=None, mascara_objetivo=None):
+    """Distancia Coseno (1 - similitud coseno) del objetivo a cada columna de la matriz"""
+    _, a, b, n = _pares_comunes(matriz, objetivo, mascara, mascara_objetivo)
+
+    producto_punto = (a * b).sum(axis=0)
+    norm_a = (a ** 2).sum(axis=0)
+    norm_b = (b ** 2).sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        similitud = producto_punto / (np.sqrt(norm_a) * np.sqrt(norm_b))
+
+    invalidos = (n == 0) | (norm_a == 0) | (norm_b == 0)
+    return np.where(invalidos, np.nan, 1 - similitud)
+
+
+# ---------------------------------------------------------------------------
+# Versiones por pares (almacenamiento disperso)
+#
+# Reciben solo los pares co-calificados ya emparejados: `columnas` indica a qué
+# usuario pertenece cada par y `a`, `b` son los ratings del objetivo y del
+# usuario. Agregan por usuario con np.bincount.
+# ---------------------------------------------------------------------------
+
+def _conteos(columnas, n_columnas, pesos=None):
+    return np.bincount(columnas, weights=pesos, minlength=n_columnas)[:n_columnas]
+
+def euclidean_distance_pairs(columnas, a, b, n_columnas):
+    """Distancia Euclidiana por usuario a partir de pares co-calificados"""
+    n = _conteos(columnas, n_columnas)
+    distancias = np.sqrt(_conteos(columnas, n_columnas, (a - b) ** 2))
+    return np.where(n == 0, np.nan, distancias)
+
+def manhattan_distance_pairs(columnas, a, b, n_columnas):
+    """Distancia Manhattan por usuario a partir de pares co-calificados"""
+    n = _conteos(columnas, n_columnas)
+    distancias = _conteos(columnas, n_columnas, np.abs(a - b))
+    return np.where(n == 0, np.nan, distancias)
+
+def pearson_distance_pairs(columnas, a, b, n_columnas):
+    """Distancia Pearson (1 - correlación) por usuario a partir de pares co-calificados"""
+    return _pearson_desde_sumas(
+        _conteos(columnas, n_columnas),
+        _conteos(columnas, n_columnas, a), _conteos(columnas, n_columnas, b),
+        _conteos(columnas, n_columnas, a ** 2), _conteos(columnas, n_columnas, b ** 2),
+        _conteos(columnas, n_columnas, a * b),
+    )
+
+def cosine_distance_pairs(columnas, a, b, n_columnas):
+    """Distancia Coseno (1 - similitud coseno) por usuario a partir de pares co-calificados"""
+    n = _conteos(columnas, n_columnas)
+    producto_punto = _conteos(columnas, n_columnas, a * b)
+    norm_a = _conteos(columnas, n_columnas, a ** 2)
+    norm_b = _conteos(columnas, n_columnas, b ** 2)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        similitud = producto_punto / (np.sqrt(norm_a) * np.sqrt(norm_b))
+
+    invalidos = (n == 0) | (norm_a == 0) | (norm_b == 0)
+    return np.where(invalidos, np.nan, 1 - similitud)
+
+
+# ---------------------------------------------------------------------------
+# Registro de métricas
+# ---------------------------------------------------------------------------
+
+Metrica = namedtuple('Metrica', ['nombre', 'escalar', 'vectorizada', 'por_pares'], defaults=(None, None))
+
+METRICAS = {}
+
+def registrar_metrica(nombre, escalar, vectorizada=None, por_pares=None):
+    """
+    Registra una métrica de distancia por nombre.
+
+    Parámetros:
+    nombre -- nombre de la métrica (string)
+    escalar -- función (a, b) -> distancia
+    vectorizada -- función (matriz, objetivo, mascara, mascara_objetivo) -> array de distancias (opcional)
+    por_pares -- función (columnas, a, b, n_columnas) -> array de distancias (opcional)
+    """
+    METRICAS[nombre] = Metrica(nombre, escalar, vectorizada, por_pares)
+    return METRICAS[nombre]
+
+def obtener_metrica(nombre):
+    """Devuelve la métrica registrada con ese nombre"""
+    if nombre not in METRICAS:
+        raise ValueError(f"Métrica no válida. Opciones: {list(METRICAS.keys())}")
+    return METRICAS[nombre]
+
+def buscar_metrica(funcion):
+    """Devuelve la métrica a la que pertenece `funcion` (escalar, vectorizada o por pares), o None"""
+    for metrica in METRICAS.values():
+        if funcion in (metrica.escalar, metrica.vectorizada, metrica.por_pares):
+            return metrica
+    return None
+
+registrar_metrica('euclidean', euclidean_distance, euclidean_distance_batch, euclidean_distance_pairs)
+registrar_metrica('manhattan', manhattan_distance, manhattan_distance_batch, manhattan_distance_pairs)
+registrar_metrica('pearson', pearson_distance, pearson_distance_batch, pearson_distance_pairs)
+registrar_metrica('cosine', cosine_distance, cosine_distance_batch, cosine_distance_pairs)
\ No newline at end of file
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: indice_ann.py
+
+Índice aproximado de vecinos (ANN) por LSH de proyecciones aleatorias para las
+métricas coseno y Pearson.
+
+Las distancias exactas solo usan las películas co-calificadas, así que a baja
+densidad el coseno entre vectores completos con ceros en las no vistas es casi
+0 para cualquier par y los grupos salen al azar. Por eso cada usuario se
+representa con sus ratings centrados en su media sobre las películas que vio
+(ceros en las demás), proyectados sobre las n_componentes direcciones
+principales de esa matriz (SVD truncada) y normalizados: usuarios con gustos
+parecidos quedan cerca aunque hayan calificado películas distintas. El
+centrado es el de Pearson; para coseno también se aplica porque con ratings
+todos positivos la componente común no distingue a nadie. Cada tabla toma
+n_bits hiperplanos aleatorios y agrupa a los usuarios por el signo de sus
+proyecciones. En la consulta solo se evalúan los usuarios que caen en los
+mismos grupos que el objetivo. Luego se re-ordenan exactamente con la versión
+vectorizada de la métrica de formulas.py (con min_comunes, como
+KNNCalcularDistancia).
+
+Perillas de recall/latencia:
+- n_tablas: más tablas -> más candidatos y mejor recall.
+- n_bits: más bits -> grupos más pequeños, menos candidatos.
+- n_sondas: grupos vecinos (un bit invertido) también consultados por tabla.
+- n_componentes: dimensión de la representación; pocas componentes juntan más
+  a usuarios con pocas películas en común.
+
+Clases y funciones principales:
+- IndiceLSH: construcción del índice y get_knn aproximado.
+- reporte_recall: recall@k del índice contra la búsqueda exacta.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+from formulas import obtener_metrica
+from Knn import KNNCalcularDistancia, preparar_matriz, seleccionar_top_k
+
+METRICAS_ANN = ('cosine', 'pearson')
+
+class IndiceLSH:
+    def __init__(self, df_ratings, metrica='cosine', n_tablas=8, n_bits=12, n_componentes=8, min_comunes=None,
+                 semilla=0):
+        """
+        Construye el índice LSH sobre los usuarios (columnas) del DataFrame.
+
+        :param df_ratings: DataFrame de ratings (peliculas x usuarios)
+        :param metrica: 'cosine' o 'pearson'
+        :param n_tablas: número de tablas hash
+        :param n_bits: hiperplanos por tabla
+        :param n_componentes: direcciones principales de la representación (None usa los
+                              ratings centrados sin proyectar)
+        :param min_comunes: mínimo de películas co-calificadas al re-ordenar (opcional)
+        :param semilla: semilla de los hiperplanos aleatorios
+        """
+        if metrica not in METRICAS_ANN:
+            raise ValueError(f"Métrica no válida para ANN. Opciones: {list(METRICAS_ANN)}")
+
+        self.metrica = obtener_metrica(metrica)
+        self.usuarios = df_ratings.columns
+        self.valores, self.mascara = preparar_matriz(df_ratings)
+        self.n_tablas = n_tablas
+        self.n_bits = n_bits
+        self.min_comunes = min_comunes
+
+        centrados = self._centrados(self.valores, self.mascara).T
+        if n_componentes is None:
+            self.componentes = None
+        else:
+            # Direcciones principales (películas) de la matriz usuarios x películas centrada
+            _, _, direcciones = np.linalg.svd(centrados, full_matrices=False)
+            self.componentes = direcciones[:n_componentes]
+
+        vectores = self._normalizados(self._proyectar(centrados))
+        rng = np.random.default_rng(semilla)
+        self.planos = rng.standard_normal((n_tablas, n_bits, vectores.shape[1]))
+        self._pesos_bits = 1 << np.arange(n_bits, dtype=np.int64)
+
+        # Código de cada usuario por tabla, y usuarios ordenados por código
+        codigos = ((self.planos @ vectores.T) > 0).astype(np.int64)
+        codigos = np.einsum('tbu,b->tu', codigos, self._pesos_bits)
+        self._orden = np.argsort(codigos, axis=1, kind='stable')
+        self._codigos_ordenados = np.take_along_axis(codigos, self._orden, axis=1)
+
+    @staticmethod
+    def _centrados(valores, mascara):
+        """Ratings (peliculas x usuarios) menos la media de cada usuario sobre sus películas vistas, 0 en el resto"""
+        x = np.where(mascara, valores, 0.0)
+        conteos = mascara.sum(axis=0)
+        medias = np.divide(x.sum(axis=0), conteos, out=np.zeros(len(conteos)), where=conteos > 0)
+        return np.where(mascara, x - medias, 0.0)
+
+    def _proyectar(self, centrados):
+        """Proyección de vectores (usuarios x películas) sobre las componentes principales"""
+        return centrados if self.componentes is None else centrados @ self.componentes.T
+
+    @staticmethod
+    def _normalizados(vectores):
+        """Vectores de norma 1 (los nulos quedan en cero)"""
+        normas = np.linalg.norm(vectores, axis=-1, keepdims=True)
+        return np.divide(vectores, normas, out=np.zeros_like(vectores), where=normas > 0)
+
+    def candidatos(self, indice_objetivo, n_tablas=None, n_sondas=0):
+        """
+        Usuarios que comparten grupo con el objetivo en alguna tabla.
+
+        :param indice_objetivo: posición del usuario objetivo
+        :param n_tablas: tablas consultadas (por defecto todas)
+        :param n_sondas: bits de menor margen que se invierten para consultar grupos vecinos
+        :return: array ordenado de posiciones de usuario (sin el objetivo)
+        """
+        n_tablas = self.n_tablas if n_tablas is None else min(n_tablas, self.n_tablas)
+        vector = self._vector_objetivo(indice_objetivo)
+        encontrados = []
+
+        for tabla in range(n_tablas):
+            proyeccion = self.planos[tabla] @ vector
+            codigo = int(((proyeccion > 0).astype(np.int64) * self._pesos_bits).sum())
+            sondas = [codigo]
+            for bit in np.argsort(np.abs(proyeccion))[:n_sondas]:
+                sondas.append(codigo ^ int(self._pesos_bits[bit]))
+
+            for sonda in sondas:
+                inicio = np.searchsorted(self._codigos_ordenados[tabla], sonda, side='left')
+                fin = np.searchsorted(self._codigos_ordenados[tabla], sonda, side='right')
+                encontrados.append(self._orden[tabla, inicio:fin])
+
+        candidatos = np.unique(np.concatenate(encontrados)) if encontrados else np.array([], dtype=np.intp)
+        return candidatos[candidatos != indice_objetivo]
+
+    def _vector_objetivo(self, indice_objetivo):
+        """Representación normalizada de un usuario, calculada igual que en la construcción"""
+        columna = slice(indice_objetivo, indice_objetivo + 1)
+        centrado = self._centrados(self.valores[:, columna], self.mascara[:, columna])[:, 0]
+        return self._normalizados(self._proyectar(centrado))
+
+    def get_knn(self, df, target_column, k=5, n_tablas=None, n_sondas=0):
+        """
+        K vecinos aproximados: candidatos LSH re-ordenados con la métrica exacta.
+
+        Acepta la misma firma que KNNCalcularDistancia.get_knn; `df` se ignora
+        porque el índice guarda su propia copia de la matriz.
+        """
+        if target_column not in self.usuarios:
+            raise ValueError(f"La columna '{target_column}' no existe en el DataFrame")
+
+        indice_objetivo = self.usuarios.get_loc(target_column)
+        candidatos = self.candidatos(indice_objetivo, n_tablas, n_sondas)
+        mascara_objetivo = self.mascara[:, indice_objetivo]
+        distancias = self.metrica.vectorizada(
+            self.valores[:, candidatos], self.valores[:, indice_objetivo],
+            self.mascara[:, candidatos], mascara_objetivo,
+        )
+        if self.min_comunes is not None:
+            comunes = (self.mascara[:, candidatos] & mascara_objetivo[:, None]).sum(axis=0)
+            distancias = np.where(comunes >= self.min_comunes, distancias, np.nan)
+        seleccion = seleccionar_top_k(distancias, k)
+        return pd.DataFrame(
+            {'Distancia': distancias[seleccion]}, index=self.usuarios[candidatos[seleccion]]
+        )
+
+def reporte_recall(indice, df_ratings, usuarios=None, k=5, n_tablas=None, n_sondas=0):
+    """
+    Compara el índice con la búsqueda exacta de KNNCalcularDistancia.
+
+    Solo cuentan como vecinos exactos los que tienen distancia definida (no NaN).
+
+    :return: diccionario con recall@k, candidatos promedio y tiempos promedio por consulta
+    """
+    exacto = KNNCalcularDistancia(metrica=indice.metrica.nombre, min_comunes=indice.min_comunes)
+    usuarios = list(df_ratings.columns) if usuarios is None else usuarios
+
+    aciertos, total, n_candidatos = 0, 0, 0
+    tiempo_exacto, tiempo_ann = 0.0, 0.0
+    for usuario in usuarios:
+        inicio = time.perf_counter()
+        vecinos_exactos = exacto.get_knn(df_ratings, usuario, k)
+        tiempo_exacto += time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        vecinos_ann = indice.get_knn(df_ratings, usuario, k, n_tablas, n_sondas)
+        tiempo_ann += time.perf_counter() - inicio
+
+        relevantes = set(vecinos_exactos.index[vecinos_exactos['Distancia'].notna()])
+        aciertos += len(relevantes & set(vecinos_ann.index))
+        total += len(relevantes)
+        n_candidatos += len(indice.candidatos(indice.usuarios.get_loc(usuario), n_tablas, n_sondas))
+
+    return {
+        'metrica': indice.metrica.nombre,
+        'k': k,
+        'recall_at_k': aciertos / total if total else float('nan'),
+        'candidatos_promedio': n_candidatos / len(usuarios) if usuarios else 0.0,
+        'segundos_exacto_promedio': tiempo_exacto / len(usuarios) if usuarios else 0.0,
+        'segundos_ann_promedio': tiempo_ann / len(usuarios) if usuarios else 0.0,
+    }
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: indice_bitset.py
+
+Índice de películas calificadas por usuario empaquetado en bits.
+
+Cada usuario se guarda como un bitset (una fila de palabras uint64, un bit
+por película). El número de películas co-calificadas entre el objetivo y toda
+la población se obtiene en una sola pasada con AND + popcount, sin tocar los
+ratings. Con ese conteo se descartan los usuarios con poco soporte antes de
+calcular cualquier distancia (ver KNNCalcularDistancia(min_comunes=...)).
+
+Clases principales:
+- IndiceBitset: bitsets (usuarios x palabras) con el conteo de películas comunes.
+"""
+import numpy as np
+
+# Popcount por byte para NumPy sin np.bitwise_count (< 2.0)
+_BITS_POR_BYTE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+def _popcount(palabras):
+    """Bits encendidos por fila de un array uint64 (filas x palabras)"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(palabras).sum(axis=1, dtype=np.int64)
+    return _BITS_POR_BYTE[palabras.view(np.uint8)].sum(axis=1, dtype=np.int64)
+
+class IndiceBitset:
+    def __init__(self, bits, n_peliculas):
+        """
+        :param bits: array uint64 (usuarios x palabras) con un bit por película
+        :param n_peliculas: número de películas representadas
+        """
+        self.bits = np.ascontiguousarray(bits, dtype=np.uint64)
+        self.n_peliculas = n_peliculas
+
+    @classmethod
+    def desde_mascara(cls, mascara):
+        """
+        Construye el índice desde la máscara de ratings válidos.
+
+        :param mascara: array booleano (peliculas x usuarios)
+        """
+        mascara = np.asarray(mascara, dtype=bool)
+        n_peliculas, n_usuarios = mascara.shape
+        empaquetado = np.packbits(mascara.T, axis=1)
+        # Se completa a múltiplo de 8 bytes para operar por palabras de 64 bits
+        relleno = -empaquetado.shape[1] % 8
+        if relleno:
+            empaquetado = np.concatenate(
+                [empaquetado, np.zeros((n_usuarios, relleno), dtype=np.uint8)], axis=1
+            )
+        return cls(np.ascontiguousarray(empaquetado).view(np.uint64), n_peliculas)
+
+    @classmethod
+    def desde_dataframe(cls, df):
+        """Construye el índice desde un DataFrame (peliculas x usuarios) con NaN en faltantes"""
+        return cls.desde_mascara(df.notna().to_numpy())
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def conteos(self):
+        """Número de películas calificadas por cada usuario"""
+        return _popcount(self.bits)
+
+    def comunes(self, indice_objetivo, candidatos=None):
+        """
+        Películas co-calificadas entre el objetivo y cada usuario.
+
+        :param indice_objetivo: posición del usuario objetivo
+        :param candidatos: posiciones a evaluar (por defecto todos los usuarios)
+        :return: array int64 con el tamaño de la intersección (incluye al propio objetivo)
+        """
+        bits = self.bits if candidatos is None else self.bits[candidatos]
+        return _popcount(bits & self.bits[indice_objetivo])
+
+    def con_soporte(self, indice_objetivo, min_comunes):
+        """Posiciones de los usuarios con al menos min_comunes películas en común con el objetivo"""
+        return np.flatnonzero(self.comunes(indice_objetivo) >= min_comunes)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: indice_invertido.py
+
+Índice invertido película -> usuarios que la calificaron.
+
+Para un usuario objetivo, la unión de los usuarios que calificaron alguna de
+sus películas (con el conteo de películas en común, acumulado con bincount)
+es el único conjunto con distancia definida: con cero películas en común
+todas las métricas de formulas.py devuelven NaN. Así la búsqueda de vecinos
+cuesta en proporción a los ratings de las películas del objetivo y no al
+total de usuarios.
+
+Clases principales:
+- IndiceInvertido: vistas por película y por usuario de los ratings válidos.
+"""
+import numpy as np
+from ratings_dispersos import _rangos
+
+class IndiceInvertido:
+    def __init__(self, indptr_peliculas, usuarios_de_pelicula, indptr_usuarios, peliculas_de_usuario):
+        """
+        :param indptr_peliculas: inicio de cada película en usuarios_de_pelicula (peliculas + 1,)
+        :param usuarios_de_pelicula: usuarios que calificaron cada película, concatenados
+        :param indptr_usuarios: inicio de cada usuario en peliculas_de_usuario (usuarios + 1,)
+        :param peliculas_de_usuario: películas calificadas por cada usuario, concatenadas
+        """
+        self.indptr_peliculas = indptr_peliculas
+        self.usuarios_de_pelicula = usuarios_de_pelicula
+        self.indptr_usuarios = indptr_usuarios
+        self.peliculas_de_usuario = peliculas_de_usuario
+
+    @classmethod
+    def desde_mascara(cls, mascara):
+        """
+        Construye el índice desde la máscara de ratings válidos.
+
+        :param mascara: array booleano (peliculas x usuarios)
+        """
+        mascara = np.asarray(mascara, dtype=bool)
+        n_peliculas, n_usuarios = mascara.shape
+        # np.nonzero recorre en orden de filas: agrupa por película y luego por usuario
+        peliculas, usuarios = np.nonzero(mascara)
+        indptr_peliculas = np.zeros(n_peliculas + 1, dtype=np.int64)
+        np.cumsum(np.bincount(peliculas, minlength=n_peliculas), out=indptr_peliculas[1:])
+        usuarios_t, peliculas_t = np.nonzero(mascara.T)
+        indptr_usuarios = np.zeros(n_usuarios + 1, dtype=np.int64)
+        np.cumsum(np.bincount(usuarios_t, minlength=n_usuarios), out=indptr_usuarios[1:])
+        return cls(indptr_peliculas, usuarios, indptr_usuarios, peliculas_t)
+
+    @classmethod
+    def desde_dataframe(cls, df):
+        """Construye el índice desde un DataFrame (peliculas x usuarios) con NaN en faltantes"""
+        return cls.desde_mascara(df.notna().to_numpy())
+
+    @property
+    def n_usuarios(self):
+        return len(self.indptr_usuarios) - 1
+
+    def peliculas_usuario(self, indice_usuario):
+        """Películas calificadas por el usuario"""
+        return self.peliculas_de_usuario[self.indptr_usuarios[indice_usuario]:self.indptr_usuarios[indice_usuario + 1]]
+
+    def candidatos(self, indice_objetivo, min_comunes=1):
+        """
+        Usuarios con al menos min_comunes películas en común con el objetivo.
+
+        :return: (posiciones ordenadas sin el objetivo, películas en común de cada una)
+        """
+        posiciones, _ = _rangos(self.indptr_peliculas, self.peliculas_usuario(indice_objetivo))
+        comunes = np.bincount(self.usuarios_de_pelicula[posiciones], minlength=self.n_usuarios)
+        comunes[indice_objetivo] = 0
+        seleccion = np.flatnonzero(comunes >= max(min_comunes, 1))
+        return seleccion, comunes[seleccion]
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: ingesta.py
+
+Ingesta por fragmentos de logs de ratings en formato largo (usuario, película, rating).
+
+El log se lee con pd.read_csv(chunksize=...) y nunca se pivota completo: cada
+fragmento se traduce a índices enteros densos y se acumula como tripletas que
+luego forman un RatingsDispersos. Si un mismo (usuario, película) aparece
+varias veces, gana el último rating del log.
+
+Los mapeos de id a índice asignan índices por orden de primera aparición y se
+pueden guardar y volver a cargar, de modo que los índices se mantienen estables
+entre ejecuciones aunque el log crezca.
+
+Clases y funciones principales:
+- MapeoIds: mapeo estable id (string) <-> índice denso.
+- AcumuladorRatings: tripletas con deduplicación "última escritura gana".
+- ingerir_log: lee el log por fragmentos y devuelve un RatingsDispersos.
+"""
+import numpy as np
+import pandas as pd
+from ratings_dispersos import RatingsDispersos
+
+class MapeoIds:
+    def __init__(self, ids=None):
+        """
+        :param ids: ids ya conocidos, en el orden de sus índices (opcional)
+        """
+        self.ids = []
+        self.indices = {}
+        for id_ in ids or []:
+            self._indice(id_)
+
+    def _indice(self, id_):
+        """Índice de un id, asignándole el siguiente libre si es nuevo"""
+        if id_ not in self.indices:
+            self.indices[id_] = len(self.ids)
+            self.ids.append(id_)
+        return self.indices[id_]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def codificar(self, valores):
+        """
+        Traduce un array de ids a índices, agregando los nuevos al final.
+
+        Solo recorre en Python los ids distintos del fragmento.
+        """
+        codigos, unicos = pd.factorize(np.asarray(valores))
+        indices_unicos = np.array([self._indice(id_) for id_ in unicos], dtype=np.int64)
+        return indices_unicos[codigos]
+
+    def guardar(self, ruta):
+        """Guarda los ids en orden, uno por línea"""
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            for id_ in self.ids:
+                archivo.write(f"{id_}\n")
+
+    @classmethod
+    def cargar(cls, ruta):
+        """Carga un mapeo guardado con guardar()"""
+        with open(ruta, encoding='utf-8') as archivo:
+            return cls(linea.rstrip('\n') for linea in archivo)
+
+class AcumuladorRatings:
+    def __init__(self, umbral_compactacion=1_000_000):
+        """
+        :param umbral_compactacion: tripletas pendientes a partir de las cuales se deduplica
+        """
+        self.umbral_compactacion = umbral_compactacion
+        self._usuarios = []
+        self._peliculas = []
+        self._ratings = []
+        self._pendientes = 0
+
+    def agregar(self, usuarios, peliculas, ratings):
+        """Agrega tripletas en orden de llegada"""
+        self._usuarios.append(np.asarray(usuarios, dtype=np.int64))
+        self._peliculas.append(np.asarray(peliculas, dtype=np.int64))
+        self._ratings.append(np.asarray(ratings, dtype=float))
+        self._pendientes += len(self._ratings[-1])
+        if self._pendientes >= self.umbral_compactacion:
+            self.compactar()
+
+    def compactar(self):
+        """Deja una sola tripleta por (usuario, película): la última agregada"""
+        usuarios = np.concatenate(self._usuarios) if self._usuarios else np.array([], dtype=np.int64)
+        peliculas = np.concatenate(self._peliculas) if self._peliculas else np.array([], dtype=np.int64)
+        ratings = np.concatenate(self._ratings) if self._ratings else np.array([], dtype=float)
+
+        # lexsort es estable: dentro de cada (usuario, película) se conserva el orden de llegada
+        orden = np.lexsort((peliculas, usuarios))
+        usuarios, peliculas, ratings = usuarios[orden], peliculas[orden], ratings[orden]
+        ultimos = np.ones(len(orden), dtype=bool)
+        ultimos[:-1] = (usuarios[1:] != usuarios[:-1]) | (peliculas[1:] != peliculas[:-1])
+
+        self._usuarios = [usuarios[ultimos]]
+        self._peliculas = [peliculas[ultimos]]
+        self._ratings = [ratings[ultimos]]
+        self._pendientes = 0
+        return self._usuarios[0], self._peliculas[0], self._ratings[0]
+
+def ingerir_log(ruta, columna_usuario='usuario', columna_pelicula='pelicula', columna_rating='rating',
+                tamano_fragmento=100_000, mapeo_usuarios=None, mapeo_peliculas=None,
+                umbral_compactacion=1_000_000):
+    """
+    Lee un log CSV (usuario, película, rating) por fragmentos y arma un RatingsDispersos.
+
+    :param ruta: archivo CSV en formato largo
+    :param columna_usuario: nombre de la columna de usuario
+    :param columna_pelicula: nombre de la columna de película
+    :param columna_rating: nombre de la columna de rating
+    :param tamano_fragmento: filas leídas por fragmento
+    :param mapeo_usuarios: MapeoIds previo para mantener índices estables (opcional)
+    :param mapeo_peliculas: MapeoIds previo para mantener índices estables (opcional)
+    :param umbral_compactacion: tripletas pendientes antes de deduplicar
+    :return: RatingsDispersos
+    """
+    mapeo_usuarios = mapeo_usuarios if mapeo_usuarios is not None else MapeoIds()
+    mapeo_peliculas = mapeo_peliculas if mapeo_peliculas is not None else MapeoIds()
+    acumulador = AcumuladorRatings(umbral_compactacion)
+
+    lector = pd.read_csv(
+        ruta,
+        usecols=[columna_usuario, columna_pelicula, columna_rating],
+        dtype={columna_usuario: str, columna_pelicula: str, columna_rating: float},
+        chunksize=tamano_fragmento,
+    )
+    for fragmento in lector:
+        fragmento = fragmento.dropna()
+        acumulador.agregar(
+            mapeo_usuarios.codificar(fragmento[columna_usuario].to_numpy()),
+            mapeo_peliculas.codificar(fragmento[columna_pelicula].to_numpy()),
+            fragmento[columna_rating].to_numpy(),
+        )
+
+    usuarios, peliculas, ratings = acumulador.compactar()
+    return RatingsDispersos(mapeo_usuarios.ids, mapeo_peliculas.ids, usuarios, peliculas, ratings)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: instrumentacion.py
+
+Instrumentación opcional del pipeline de recomendación: temporizadores por
+etapa (spans) y contadores, enviados a un destino intercambiable (sink).
+
+Por defecto KNNCalcularDistancia y RecomendadorKNN usan INSTRUMENTACION_NULA,
+cuyos métodos no hacen nada, de modo que el costo con la instrumentación
+apagada es una llamada vacía por etapa.
+
+Destinos disponibles:
+- SinkMemoria: agrega en memoria (conteo, total y máximo por span; suma por contador).
+- SinkJSONL: escribe un evento JSON por línea en un archivo.
+- SinkPrometheus: agrega en memoria y exporta en formato de texto de Prometheus a un archivo.
+
+Uso:
+    instr = Instrumentacion(SinkMemoria())
+    knn = KNNCalcularDistancia(metrica='pearson', instrumentacion=instr)
+    ...
+    print(instr.sink.resumen())
+"""
+import json
+import re
+import time
+
+class SinkMemoria:
+    def __init__(self):
+        self.spans = {}
+        self.contadores = {}
+
+    def registrar_span(self, nombre, segundos):
+        conteo, total, maximo = self.spans.get(nombre, (0, 0.0, 0.0))
+        self.spans[nombre] = (conteo + 1, total + segundos, max(maximo, segundos))
+
+    def registrar_contador(self, nombre, valor):
+        self.contadores[nombre] = self.contadores.get(nombre, 0) + valor
+
+    def resumen(self):
+        """Diccionario con los spans (conteo, total_s, promedio_s, maximo_s) y los contadores"""
+        return {
+            'spans': {
+                nombre: {'conteo': c, 'total_s': t, 'promedio_s': t / c, 'maximo_s': m}
+                for nombre, (c, t, m) in self.spans.items()
+            },
+            'contadores': dict(self.contadores),
+        }
+
+    def vaciar(self):
+        pass
+
+class SinkJSONL:
+    def __init__(self, ruta):
+        """:param ruta: archivo donde se agregan los eventos, uno por línea"""
+        self.ruta = ruta
+        self._archivo = open(ruta, 'a', encoding='utf-8')
+
+    def _escribir(self, evento):
+        self._archivo.write(json.dumps(evento) + '\n')
+
+    def registrar_span(self, nombre, segundos):
+        self._escribir({'tipo': 'span', 'nombre': nombre, 'segundos': segundos, 'ts': time.time()})
+
+    def registrar_contador(self, nombre, valor):
+        self._escribir({'tipo': 'contador', 'nombre': nombre, 'valor': valor, 'ts': time.time()})
+
+    def vaciar(self):
+        self._archivo.flush()
+
+    def cerrar(self):
+        self._archivo.close()
+
+class SinkPrometheus(SinkMemoria):
+    def __init__(self, ruta, prefijo='recomendador'):
+        """
+        :param ruta: archivo de texto que leerá el exportador de Prometheus (node_exporter textfile)
+        :param prefijo: prefijo de los nombres de métricas
+        """
+        super().__init__()
+        self.ruta = ruta
+        self.prefijo = prefijo
+
+    def _nombre(self, nombre):
+        return re.sub(r'[^a-zA-Z0-9_]', '_', f"{self.prefijo}_{nombre}")
+
+    def vaciar(self):
+        """Reescribe el archivo con el estado agregado actual"""
+        lineas = []
+        nombre_span = self._nombre('span_segundos')
+        lineas.append(f"# TYPE {nombre_span} summary")
+        for nombre, (conteo, total, _) in sorted(self.spans.items()):
+            lineas.append(f'{nombre_span}_sum{{span="{nombre}"}} {total}')
+            lineas.append(f'{nombre_span}_count{{span="{nombre}"}} {conteo}')
+        for nombre, valor in sorted(self.contadores.items()):
+            metrica = self._nombre(f"{nombre}_total")
+            lineas.append(f"# TYPE {metrica} counter")
+            lineas.append(f"{metrica} {valor}")
+        with open(self.ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write('\n'.join(lineas) + '\n')
+
+class _Span:
+    __slots__ = ('_sink', '_nombre', '_inicio')
+
+    def __init__(self, sink, nombre):
+        self._sink = sink
+        self._nombre = nombre
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excepcion):
+        self._sink.registrar_span(self._nombre, time.perf_counter() - self._inicio)
+        return False
+
+class _SpanNulo:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        return False
+
+_SPAN_NULO = _SpanNulo()
+
+class Instrumentacion:
+    activa = True
+
+    def __init__(self, sink=None):
+        """:param sink: destino de los eventos (por defecto SinkMemoria)"""
+        self.sink = sink if sink is not None else SinkMemoria()
+
+    def span(self, nombre):
+        """Temporizador de una etapa, para usar con `with`"""
+        return _Span(self.sink, nombre)
+
+    def contar(self, nombre, valor=1):
+        self.sink.registrar_contador(nombre, valor)
+
+    def vaciar(self):
+        self.sink.vaciar()
+
+class _InstrumentacionNula:
+    activa = False
+
+    def span(self, nombre):
+        return _SPAN_NULO
+
+    def contar(self, nombre, valor=1):
+        pass
+
+    def vaciar(self):
+        pass
+
+INSTRUMENTACION_NULA = _InstrumentacionNula()
@@ -1,5 +1,6 @@
 import numpy as np
 import math
+from similitud_matriz import matriz_distancias
 
 def manhattan_distance(a, b):
     """
@@ -27,14 +28,12 @@ def manhattan_distance(a, b):
 def manhattan_distance_matrix(data):
     """
     Calcula la matriz de distancias Manhattan para todos los registros.
+
+    Usa el cálculo por bloques de similitud_matriz en lugar de comparar cada
+    par de registros con la función escalar.
     """
-    n = len(data)
-    dist_matrix = [[0.0 for _ in range(n)] for _ in range(n)]
-    
-    for i in range(n):
-        for j in range(i+1, n):
-            distance = manhattan_distance(data[i], data[j])
-            dist_matrix[i][j] = distance
-            dist_matrix[j][i] = distance
+    valores = np.array(data, dtype=float).T
+    dist_matrix = matriz_distancias(valores, ~np.isnan(valores), 'manhattan')
+    np.fill_diagonal(dist_matrix, 0.0)
     
-    return dist_matrix
\ No newline at end of file
+    return [[None if math.isnan(d) else d for d in fila] for fila in dist_matrix.tolist()]
\ No newline at end of file
@@ -1,18 +1,19 @@
 import pandas as pd
 import numpy as np
+from formato_binario import cargar_ratings
 
-def similitud_pearson(serie_usuario_a: pd.Series, serie_usuario_b: pd.Series) -> float:
+def similitud_pearson(serie_usuario_a: pd.Series, serie_usuario_b: pd.Series, min_comunes: int = 2) -> float:
     #calificadas por ambos usuarios
     peliculas_comunes = serie_usuario_a.notna() & serie_usuario_b.notna()
+
+    #Con poco soporte se descarta antes de extraer los vectores
+    if peliculas_comunes.sum() < max(min_comunes, 2):
+        return 0.0
     
     #vectores de ratings emparejados
     calificaciones_usuario_a = serie_usuario_a[peliculas_comunes].values
     calificaciones_usuario_b = serie_usuario_b[peliculas_comunes].values
     
-    #Revisar si hay suficientes datos
-    if len(calificaciones_usuario_a) < 2:
-        return 0.0
-    
     #Medias de cada usuario
     media_usuario_a = np.mean(calificaciones_usuario_a)
     media_usuario_b = np.mean(calificaciones_usuario_b)
@@ -37,7 +38,7 @@ def similitud_pearson(serie_usuario_a: pd.Series, serie_usuario_b: pd.Series) ->
 
 if __name__ == "__main__":
     ruta_csv = 'Pelis_short.csv'
-    df_peliculas = pd.read_csv(ruta_csv, index_col=0)
+    df_peliculas = cargar_ratings(ruta_csv)
     
     usuario_a = 'Patrick C'
     usuario_b = 'Heather'
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: procesamiento_paralelo.py
+
+Generación de recomendaciones para toda la población repartida entre procesos.
+
+La matriz de ratings y su máscara se copian una sola vez a memoria compartida
+(multiprocessing.shared_memory); cada proceso se conecta a ella por nombre en
+lugar de recibir la matriz serializada. Con RatingsDispersos se comparten los
+arrays de sus vistas CSR/CSC en lugar de la matriz densa. Los usuarios
+objetivo se reparten en fragmentos y cada proceso ejecuta recomendar_bloque
+(o recomendar_bloque_disperso) sobre su fragmento.
+
+Funciones principales:
+- generar_recomendaciones_multiproceso: mismo resultado que
+  RecomendadorKNN.generar_recomendaciones_batch, usando un pool de procesos.
+"""
+import os
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+import pandas as pd
+from Knn import preparar_matriz
+from formulas import obtener_metrica
+from KNN_Recommender import COLUMNAS_BATCH, recomendar_bloque, recomendar_bloque_disperso
+from ratings_dispersos import VISTAS, RatingsDispersos
+from similitud_matriz import estadisticos_matriz
+
+# Estado de cada proceso trabajador (se llena en _inicializar_trabajador)
+_MEMORIA = {}
+
+def _compartir(array):
+    """Copia un array a un bloque de memoria compartida y devuelve (bloque, descriptor)"""
+    bloque = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=bloque.buf)[...] = array
+    return bloque, (bloque.name, array.shape, array.dtype.str)
+
+def _adjuntar(descriptor):
+    """Abre un bloque de memoria compartida y lo ve como array sin copiar"""
+    nombre, forma, tipo = descriptor
+    bloque = shared_memory.SharedMemory(name=nombre)
+    return bloque, np.ndarray(forma, dtype=np.dtype(tipo), buffer=bloque.buf)
+
+def _inicializar_trabajador(descriptores, forma, k, metrica, umbral, min_comunes):
+    """
+    Conecta el proceso trabajador a los arrays compartidos una sola vez.
+
+    descriptores tiene 'valores', 'mascara' y los estadísticos 'm', 'x', 'x2'
+    de similitud_matriz.estadisticos_matriz, o los arrays de VISTAS si los
+    datos son dispersos; forma es (peliculas, usuarios).
+    """
+    bloques, arrays = [], {}
+    for nombre, descriptor in descriptores.items():
+        bloque, arrays[nombre] = _adjuntar(descriptor)
+        bloques.append(bloque)
+    _MEMORIA.update(bloques=bloques, k=k, metrica=metrica, umbral=umbral, min_comunes=min_comunes, **arrays)
+    if 'valores' not in arrays:
+        # Las etiquetas no viajan: el trabajador devuelve posiciones
+        _MEMORIA['ratings'] = RatingsDispersos.desde_vistas(range(forma[1]), range(forma[0]), arrays)
+
+def _procesar_fragmento(indices):
+    """Ejecuta la lógica de vecinos y candidatas del bloque en el proceso trabajador"""
+    if 'ratings' in _MEMORIA:
+        return recomendar_bloque_disperso(
+            _MEMORIA['ratings'], indices, _MEMORIA['k'], _MEMORIA['metrica'], _MEMORIA['umbral'],
+            _MEMORIA['min_comunes'],
+        )
+    return recomendar_bloque(
+        _MEMORIA['valores'], _MEMORIA['mascara'], indices,
+        _MEMORIA['k'], _MEMORIA['metrica'], _MEMORIA['umbral'],
+        estadisticos=(_MEMORIA['m'], _MEMORIA['x'], _MEMORIA['x2']), min_comunes=_MEMORIA['min_comunes'],
+    )
+
+def generar_recomendaciones_multiproceso(recomendador, df_ratings, usuarios, k=5,
+                                         n_procesos=None, tamano_fragmento=256):
+    """
+    Genera recomendaciones para muchos usuarios repartiéndolos entre procesos.
+
+    Los fragmentos se devuelven en el orden de entrada (Pool.imap), por lo que
+    el resultado es idéntico al de generar_recomendaciones_batch.
+
+    :param recomendador: instancia de RecomendadorKNN cuyo knn tiene una métrica registrada
+    :param df_ratings: DataFrame de ratings (peliculas x usuarios) o RatingsDispersos (se
+                       comparten sus vistas CSR/CSC sin densificarlas)
+    :param usuarios: lista de usuarios objetivo
+    :param k: número de vecinos
+    :param n_procesos: número de procesos (por defecto os.cpu_count())
+    :param tamano_fragmento: usuarios objetivo por fragmento enviado a cada proceso
+    :return: DataFrame largo con columnas COLUMNAS_BATCH
+    """
+    metrica = getattr(recomendador.knn, 'metrica', None)
+    if metrica is None:
+        raise ValueError("El modo multiproceso requiere una métrica registrada en formulas.METRICAS")
+
+    if isinstance(df_ratings, RatingsDispersos) and obtener_metrica(metrica).por_pares is None:
+        df_ratings = df_ratings.a_dataframe()
+    if isinstance(df_ratings, RatingsDispersos):
+        usuarios_df, peliculas_df = df_ratings.usuarios, df_ratings.peliculas
+        arrays = {nombre: getattr(df_ratings, nombre) for nombre in VISTAS}
+    else:
+        usuarios_df, peliculas_df = df_ratings.columns, df_ratings.index
+        arrays = None
+
+    for usuario in usuarios:
+        if usuario not in usuarios_df:
+            raise ValueError(f"La columna '{usuario}' no existe en el DataFrame")
+
+    if arrays is None:
+        valores, mascara = preparar_matriz(df_ratings)
+        arrays = dict(zip(('m', 'x', 'x2'), estadisticos_matriz(valores, mascara)), valores=valores, mascara=mascara)
+    indices = np.array([usuarios_df.get_loc(u) for u in usuarios], dtype=np.intp)
+    fragmentos = [indices[i:i + tamano_fragmento] for i in range(0, len(indices), tamano_fragmento)]
+
+    bloques, descriptores = [], {}
+    partes = []
+    try:
+        for nombre, array in arrays.items():
+            bloque, descriptores[nombre] = _compartir(array)
+            bloques.append(bloque)
+        with Pool(
+            processes=n_procesos or os.cpu_count(),
+            initializer=_inicializar_trabajador,
+            initargs=(
+                descriptores, (len(peliculas_df), len(usuarios_df)), k, metrica, recomendador.umbral,
+                getattr(recomendador.knn, 'min_comunes', None),
+            ),
+        ) as pool:
+            for parte in pool.imap(_procesar_fragmento, fragmentos):
+                partes.append(pd.DataFrame({
+                    'usuario_objetivo': usuarios_df[parte['objetivo']],
+                    'usuario_vecino': usuarios_df[parte['vecino']],
+                    'pelicula': peliculas_df[parte['pelicula']],
+                    'rating_vecino': parte['rating_vecino'],
+                    'veces_recomendada': parte['veces_recomendada'],
+                }))
+    finally:
+        for bloque in bloques:
+            bloque.close()
+            bloque.unlink()
+
+    if not partes:
+        return pd.DataFrame(columns=COLUMNAS_BATCH)
+    return pd.concat(partes, ignore_index=True)
@@ -3,6 +3,11 @@ import math
 from formulas import euclidean_distance, manhattan_distance, pearson_distance, cosine_distance
 from cosine_similarity import cosine_similarity
 from Knn import KNNCalcularDistancia
+from formato_binario import cargar_ratings
+from cache_vecinos import CacheVecinos, KNNConCache
+
+# Vecindarios ya calculados en esta sesión (el bucle "probar con otro usuario" los reutiliza)
+CACHE_VECINOS = CacheVecinos(capacidad=128)
 
 def mostrar_peliculas_vistas(df, usuario):
     """
@@ -59,7 +64,7 @@ def recomendar_peliculas_knn(df, usuario_objetivo, k=5, metrica='euclidean'):
         return
     
     # Crear calculador KNN
-    knn_calculator = KNNCalcularDistancia(funciones_distancia[metrica])
+    knn_calculator = KNNConCache(KNNCalcularDistancia(funciones_distancia[metrica]), CACHE_VECINOS)
     
     # Obtener K vecinos más cercanos
     print(f"\n=== BUSCANDO {k} VECINOS MÁS CERCANOS (métrica: {metrica}) ===")
@@ -126,7 +131,7 @@ def main():
     """
     # Cargar datos
     try:
-        df = pd.read_csv('Pelis_short.csv', index_col=0)
+        df = cargar_ratings('Pelis_short.csv')
         print("Datos cargados exitosamente!")
         print(f"Usuarios disponibles: {list(df.columns)}")
         print(f"Películas en la base de datos: {len(df)}")
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: ratings_compactos.py
+
+Almacenamiento compacto de ratings como códigos enteros uint8.
+
+Cada celda guarda round(rating * escala) y el 0 significa "sin rating", así
+que no hacen falta NaN ni una máscara aparte: la validez es `codigos != 0`.
+Con ratings de 1 a 5 (escala 1) o de media estrella (escala 2) la matriz
+ocupa 1 byte por celda en lugar de los 8 de float64.
+
+Las distancias se calculan por bloques de usuarios: cada bloque se
+decodifica justo antes de llamar a la versión vectorizada de la métrica (con
+la máscara ya calculada a partir de los códigos, sin isnan), de modo que
+nunca se materializa la matriz completa en punto flotante.
+
+Clases principales:
+- RatingsCompactos: contenedor con conversión desde/hacia DataFrame.
+"""
+import numpy as np
+import pandas as pd
+from formulas import obtener_metrica
+from indice_bitset import IndiceBitset
+from indice_invertido import IndiceInvertido
+
+ESCALAS = (1, 2, 4, 10)
+
+class RatingsCompactos:
+    def __init__(self, codigos, usuarios, peliculas, escala=1):
+        """
+        :param codigos: array uint8 (peliculas x usuarios), 0 = sin rating
+        :param usuarios: etiquetas de usuarios
+        :param peliculas: etiquetas de películas
+        :param escala: rating = codigo / escala
+        """
+        self.codigos = np.ascontiguousarray(codigos, dtype=np.uint8)
+        self.usuarios = pd.Index(usuarios)
+        self.peliculas = pd.Index(peliculas)
+        self.escala = escala
+        self._indice_bitset = None
+        self._indice_invertido = None
+
+    @classmethod
+    def desde_dataframe(cls, df, escala=None):
+        """
+        Codifica un DataFrame (peliculas x usuarios) con NaN en faltantes.
+
+        :param escala: factor de codificación; si es None se elige el menor de ESCALAS
+                       que represente todos los ratings exactamente entre 1 y 255
+        """
+        valores = df.to_numpy(dtype=float)
+        mascara = ~np.isnan(valores)
+        validos = valores[mascara]
+
+        for candidata in ([escala] if escala is not None else ESCALAS):
+            escalados = validos * candidata
+            if np.all(escalados == np.round(escalados)) and np.all((escalados >= 1) & (escalados <= 255)):
+                codigos = np.zeros(valores.shape, dtype=np.uint8)
+                codigos[mascara] = np.round(escalados).astype(np.uint8)
+                return cls(codigos, df.columns, df.index, candidata)
+
+        raise ValueError("Los ratings no se pueden codificar en uint8 con las escalas disponibles")
+
+    def a_dataframe(self):
+        """Decodifica a DataFrame float64 con NaN en faltantes"""
+        return pd.DataFrame(self.columnas(), index=self.peliculas, columns=self.usuarios)
+
+    @property
+    def shape(self):
+        return self.codigos.shape
+
+    @property
+    def nbytes(self):
+        return self.codigos.nbytes
+
+    @property
+    def indice_bitset(self):
+        """IndiceBitset de las películas calificadas, construido en el primer uso"""
+        if self._indice_bitset is None:
+            self._indice_bitset = IndiceBitset.desde_mascara(self.codigos != 0)
+        return self._indice_bitset
+
+    @property
+    def indice_invertido(self):
+        """IndiceInvertido película -> usuarios, construido en el primer uso"""
+        if self._indice_invertido is None:
+            self._indice_invertido = IndiceInvertido.desde_mascara(self.codigos != 0)
+        return self._indice_invertido
+
+    def posicion_usuario(self, usuario):
+        """Índice del usuario; ValueError si no existe"""
+        if usuario not in self.usuarios:
+            raise ValueError(f"La columna '{usuario}' no existe en el DataFrame")
+        return self.usuarios.get_loc(usuario)
+
+    def columnas(self, indices=slice(None), dtype=float):
+        """Ratings decodificados de algunas columnas, con NaN en faltantes"""
+        codigos = self.codigos[:, indices]
+        return np.where(codigos != 0, codigos.astype(dtype) / self.escala, np.nan).astype(dtype)
+
+    def como_matriz(self, dtype=float):
+        """
+        (valores, mascara) para los cálculos matriciales de todos contra todos:
+        ceros en faltantes y máscara aparte.
+        """
+        mascara = self.codigos != 0
+        return self.codigos.astype(dtype) / dtype(self.escala), mascara
+
+    def serie_usuario(self, usuario):
+        """Serie con los ratings del usuario indexada por película (solo las vistas)"""
+        columna = self.codigos[:, self.posicion_usuario(usuario)]
+        vistas = np.flatnonzero(columna)
+        return pd.Series(columna[vistas] / self.escala, index=self.peliculas[vistas], name=usuario)
+
+    def distancias_a_todos(self, indice_objetivo, metrica, tamano_bloque=4096, min_comunes=None,
+                           candidatos=None):
+        """
+        Distancia del usuario objetivo a todos los usuarios, decodificando bloque a bloque.
+
+        :param min_comunes: si se indica, solo se decodifican y evalúan los usuarios con
+                            al menos esa cantidad de películas en común (según indice_bitset)
+        :param candidatos: posiciones a evaluar (por ejemplo de indice_invertido); tiene
+                           prioridad sobre min_comunes
+
+        Retorna:
+        Array (usuarios,) con NaN donde no hay pares válidos
+        """
+        info = obtener_metrica(metrica)
+        if info.vectorizada is None:
+            raise ValueError(f"La métrica '{info.nombre}' no tiene versión vectorizada")
+
+        codigos_objetivo = self.codigos[:, indice_objetivo]
+        objetivo = codigos_objetivo / self.escala
+        mascara_objetivo = codigos_objetivo != 0
+
+        n_usuarios = self.codigos.shape[1]
+        if candidatos is None and min_comunes is not None:
+            candidatos = self.indice_bitset.con_soporte(indice_objetivo, min_comunes)
+        if candidatos is not None:
+            n_usuarios = len(candidatos)
+
+        distancias = np.empty(n_usuarios)
+        for inicio in range(0, n_usuarios, tamano_bloque):
+            if candidatos is None:
+                bloque = self.codigos[:, inicio:inicio + tamano_bloque]
+            else:
+                # En orden C, para sumar igual que sin candidatos (ver Knn._columnas)
+                bloque = np.ascontiguousarray(self.codigos[:, candidatos[inicio:inicio + tamano_bloque]])
+            distancias[inicio:inicio + tamano_bloque] = info.vectorizada(
+                bloque / self.escala, objetivo, bloque != 0, mascara_objetivo
+            )
+        if candidatos is None:
+            return distancias
+
+        completas = np.full(self.codigos.shape[1], np.nan)
+        completas[candidatos] = distancias
+        return completas
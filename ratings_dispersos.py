@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: ratings_dispersos.py
+
+Almacenamiento disperso de ratings con arrays de índices de NumPy (formato
+CSR/CSC sin depender de SciPy).
+
+Guarda solo los ratings existentes, con dos vistas:
+- por usuario (CSR): películas calificadas por cada usuario, ordenadas.
+- por película (CSC): usuarios que calificaron cada película, ordenados.
+
+Las intersecciones de películas co-calificadas se obtienen recorriendo la
+vista por película de las películas del usuario objetivo, de modo que el costo
+depende de los ratings involucrados y no del tamaño de la matriz densa.
+
+Clases principales:
+- RatingsDispersos: contenedor con mapas id <-> índice para usuarios y películas.
+"""
+import numpy as np
+import pandas as pd
+from formulas import obtener_metrica
+
+# Arrays de las vistas por usuario (CSR) y por película (CSC)
+VISTAS = (
+    'indptr_usuarios', 'peliculas_de_usuario', 'datos_por_usuario',
+    'indptr_peliculas', 'usuarios_de_pelicula', 'datos_por_pelicula',
+)
+
+def _comprimir(claves, secundarias, valores, n_claves):
+    """Ordena por (clave, secundaria) y construye el puntero de inicio de cada clave"""
+    orden = np.lexsort((secundarias, claves))
+    conteos = np.bincount(claves, minlength=n_claves)
+    indptr = np.zeros(n_claves + 1, dtype=np.int64)
+    np.cumsum(conteos, out=indptr[1:])
+    return indptr, secundarias[orden], valores[orden]
+
+def _rangos(indptr, claves):
+    """Posiciones concatenadas de los segmentos indptr[c]:indptr[c+1] para cada clave"""
+    inicios = indptr[claves]
+    largos = indptr[claves + 1] - inicios
+    desplazamientos = np.repeat(inicios - np.cumsum(largos) + largos, largos)
+    return np.arange(largos.sum()) + desplazamientos, largos
+
+class RatingsDispersos:
+    def __init__(self, usuarios, peliculas, indices_usuario, indices_pelicula, valores):
+        """
+        Construye el contenedor a partir de tripletas (usuario, película, rating).
+
+        :param usuarios: etiquetas de usuarios (posición = índice)
+        :param peliculas: etiquetas de películas (posición = índice)
+        :param indices_usuario: array de índices de usuario de cada rating
+        :param indices_pelicula: array de índices de película de cada rating
+        :param valores: array de ratings
+        """
+        self.usuarios = pd.Index(usuarios)
+        self.peliculas = pd.Index(peliculas)
+        self.indice_usuario = {u: i for i, u in enumerate(self.usuarios)}
+        self.indice_pelicula = {p: i for i, p in enumerate(self.peliculas)}
+
+        indices_usuario = np.asarray(indices_usuario, dtype=np.int64)
+        indices_pelicula = np.asarray(indices_pelicula, dtype=np.int64)
+        valores = np.asarray(valores, dtype=float)
+
+        # Vista por usuario (CSR) y vista por película (CSC)
+        self.indptr_usuarios, self.peliculas_de_usuario, self.datos_por_usuario = _comprimir(
+            indices_usuario, indices_pelicula, valores, len(self.usuarios)
+        )
+        self.indptr_peliculas, self.usuarios_de_pelicula, self.datos_por_pelicula = _comprimir(
+            indices_pelicula, indices_usuario, valores, len(self.peliculas)
+        )
+
+    @classmethod
+    def desde_dataframe(cls, df):
+        """Crea el contenedor desde un DataFrame (peliculas x usuarios) con NaN como faltante"""
+        valores = df.to_numpy(dtype=float)
+        filas, columnas = np.nonzero(~np.isnan(valores))
+        return cls(df.columns, df.index, columnas, filas, valores[filas, columnas])
+
+    @classmethod
+    def desde_vistas(cls, usuarios, peliculas, vistas):
+        """
+        Crea el contenedor sobre vistas CSR/CSC ya construidas, sin copiarlas ni reordenarlas.
+
+        :param vistas: diccionario con los arrays de VISTAS (por ejemplo en memoria compartida)
+        """
+        ratings = cls.__new__(cls)
+        ratings.usuarios = pd.Index(usuarios)
+        ratings.peliculas = pd.Index(peliculas)
+        ratings.indice_usuario = {u: i for i, u in enumerate(ratings.usuarios)}
+        ratings.indice_pelicula = {p: i for i, p in enumerate(ratings.peliculas)}
+        for nombre in VISTAS:
+            setattr(ratings, nombre, vistas[nombre])
+        return ratings
+
+    def columnas(self, indices):
+        """Ratings de algunos usuarios como array denso (peliculas x usuarios) con NaN en faltantes"""
+        indices = np.asarray(indices, dtype=np.int64)
+        posiciones, largos = _rangos(self.indptr_usuarios, indices)
+        valores = np.full((len(self.peliculas), len(indices)), np.nan)
+        valores[self.peliculas_de_usuario[posiciones], np.repeat(np.arange(len(indices)), largos)] = \
+            self.datos_por_usuario[posiciones]
+        return valores
+
+    def a_dataframe(self):
+        """Reconstruye el DataFrame denso (peliculas x usuarios)"""
+        valores = np.full((len(self.peliculas), len(self.usuarios)), np.nan)
+        usuarios = np.repeat(np.arange(len(self.usuarios)), np.diff(self.indptr_usuarios))
+        valores[self.peliculas_de_usuario, usuarios] = self.datos_por_usuario
+        return pd.DataFrame(valores, index=self.peliculas, columns=self.usuarios)
+
+    @property
+    def nnz(self):
+        """Número de ratings almacenados"""
+        return len(self.datos_por_usuario)
+
+    @property
+    def shape(self):
+        """Forma equivalente de la matriz densa (peliculas, usuarios)"""
+        return (len(self.peliculas), len(self.usuarios))
+
+    def posicion_usuario(self, usuario):
+        """Índice del usuario; ValueError si no existe"""
+        if usuario not in self.indice_usuario:
+            raise ValueError(f"La columna '{usuario}' no existe en el DataFrame")
+        return self.indice_usuario[usuario]
+
+    def ratings_usuario(self, indice):
+        """Índices de película (ordenados) y ratings del usuario en la posición `indice`"""
+        inicio, fin = self.indptr_usuarios[indice], self.indptr_usuarios[indice + 1]
+        return self.peliculas_de_usuario[inicio:fin], self.datos_por_usuario[inicio:fin]
+
+    def ratings_pelicula(self, indice):
+        """Índices de usuario (ordenados) y ratings de la película en la posición `indice`"""
+        inicio, fin = self.indptr_peliculas[indice], self.indptr_peliculas[indice + 1]
+        return self.usuarios_de_pelicula[inicio:fin], self.datos_por_pelicula[inicio:fin]
+
+    def serie_usuario(self, usuario):
+        """Serie con los ratings del usuario indexada por película (solo las vistas)"""
+        peliculas, valores = self.ratings_usuario(self.posicion_usuario(usuario))
+        return pd.Series(valores, index=self.peliculas[peliculas], name=usuario)
+
+    def pares_comunes(self, indice_a, indice_b):
+        """Ratings emparejados de dos usuarios sobre sus películas co-calificadas"""
+        peliculas_a, valores_a = self.ratings_usuario(indice_a)
+        peliculas_b, valores_b = self.ratings_usuario(indice_b)
+        _, pos_a, pos_b = np.intersect1d(
+            peliculas_a, peliculas_b, assume_unique=True, return_indices=True
+        )
+        return valores_a[pos_a], valores_b[pos_b]
+
+    def pares_con_objetivo(self, indice_objetivo):
+        """
+        Todos los pares co-calificados entre el objetivo y el resto de usuarios.
+
+        Recorre la vista por película de cada película vista por el objetivo.
+
+        Retorna:
+        (usuarios, a, b) donde a es el rating del objetivo y b el del usuario
+        """
+        peliculas, valores = self.ratings_usuario(indice_objetivo)
+        posiciones, largos = _rangos(self.indptr_peliculas, peliculas)
+        return (
+            self.usuarios_de_pelicula[posiciones],
+            np.repeat(valores, largos),
+            self.datos_por_pelicula[posiciones],
+        )
+
+    def distancias_a_todos(self, indice_objetivo, metrica, min_comunes=None):
+        """
+        Distancia del usuario objetivo a todos los usuarios con la versión por pares de la métrica.
+
+        :param min_comunes: si se indica, los pares de usuarios con menos películas
+                            en común se descartan antes de agregar (quedan en NaN)
+
+        Retorna:
+        Array (usuarios,) con NaN para usuarios sin películas en común
+        """
+        info = obtener_metrica(metrica)
+        if info.por_pares is None:
+            raise ValueError(f"La métrica '{info.nombre}' no tiene versión por pares")
+        usuarios, a, b = self.pares_con_objetivo(indice_objetivo)
+        if min_comunes is not None:
+            con_soporte = np.bincount(usuarios, minlength=len(self.usuarios))[usuarios] >= min_comunes
+            usuarios, a, b = usuarios[con_soporte], a[con_soporte], b[con_soporte]
+        return info.por_pares(usuarios, a, b, len(self.usuarios))
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: recomendador_items.py
+
+Filtrado colaborativo basado en ítems con vecindarios de películas precalculados.
+
+Usa la misma matriz peliculas x usuarios que RecomendadorKNN, pero transpuesta:
+las "columnas" pasan a ser películas y las distancias entre películas se
+calculan con las mismas métricas (distancias_bloque de similitud_matriz). Para
+cada película se guardan sus M películas más cercanas; en la consulta solo se
+puntúan las películas que el usuario objetivo no vio, mirando si en su lista
+de vecinas hay películas que el usuario calificó con rating >= umbral.
+
+La salida comparte con RecomendadorKNN.generar_recomendaciones las columnas
+pelicula y veces_recomendada, con el mismo significado (cuántos vecinos apoyan
+la película). Aquí los vecinos son películas y no usuarios, así que en lugar de
+usuario_vecino y rating_vecino cada fila trae pelicula_origen (la película vista
+que apoya a la candidata) y rating_origen (el rating que le dio el usuario).
+
+Clases principales:
+- RecomendadorItems: ajustar, guardar/cargar y generar_recomendaciones con las
+  columnas COLUMNAS_ITEMS.
+"""
+import numpy as np
+import pandas as pd
+from formato_binario import _etiquetas
+from formulas import obtener_metrica
+from Knn import preparar_matriz, seleccionar_top_k
+from ratings_compactos import RatingsCompactos
+from ratings_dispersos import RatingsDispersos
+from similitud_matriz import distancias_bloque, estadisticos_matriz
+
+COLUMNAS_ITEMS = ['pelicula', 'pelicula_origen', 'rating_origen', 'veces_recomendada']
+
+class RecomendadorItems:
+    def __init__(self, metrica='pearson', m_vecinos=20, umbral_rating=4.0, tamano_bloque=256):
+        """
+        Inicializa el recomendador por ítems.
+        :param metrica: nombre de la métrica entre películas
+        :param m_vecinos: número de películas similares guardadas por película
+        :param umbral_rating: rating mínimo del usuario para que una película vista apoye a sus vecinas
+        :param tamano_bloque: películas por bloque al calcular las distancias
+        """
+        self.metrica = obtener_metrica(metrica).nombre
+        self.m_vecinos = m_vecinos
+        self.umbral = umbral_rating
+        self.tamano_bloque = tamano_bloque
+        self.peliculas = None
+        self.vecinos = None
+        self.distancias = None
+
+    def ajustar(self, df_ratings):
+        """
+        Precalcula las M películas más cercanas de cada película.
+
+        Guarda vecinos (int32, -1 si faltan) y distancias (float32, NaN si faltan);
+        solo se conservan vecinas con distancia definida.
+
+        :param df_ratings: DataFrame de ratings (peliculas x usuarios), RatingsDispersos,
+                           RatingsCompactos o RatingsBinarios
+        """
+        if isinstance(df_ratings, (RatingsDispersos, RatingsCompactos)):
+            df_ratings = df_ratings.a_dataframe()
+
+        # Películas como columnas: se transponen los arrays (sin df.T, que
+        # RatingsBinarios no tiene y que copiaría el DataFrame)
+        valores, mascara = preparar_matriz(df_ratings)
+        valores, mascara = np.ascontiguousarray(valores.T), np.ascontiguousarray(mascara.T)
+        n_peliculas = valores.shape[1]
+        self.peliculas = df_ratings.index
+        self.vecinos = np.full((n_peliculas, self.m_vecinos), -1, dtype=np.int32)
+        self.distancias = np.full((n_peliculas, self.m_vecinos), np.nan, dtype=np.float32)
+
+        todas = np.arange(n_peliculas)
+        estadisticos = estadisticos_matriz(valores, mascara)
+        for inicio in range(0, n_peliculas, self.tamano_bloque):
+            indices = todas[inicio:inicio + self.tamano_bloque]
+            bloque = distancias_bloque(valores, mascara, indices, self.metrica, estadisticos)
+            for fila, indice in zip(bloque, indices):
+                otras = np.delete(todas, indice)
+                seleccion = otras[seleccionar_top_k(fila[otras], self.m_vecinos)]
+                seleccion = seleccion[~np.isnan(fila[seleccion])]
+                self.vecinos[indice, :len(seleccion)] = seleccion
+                self.distancias[indice, :len(seleccion)] = fila[seleccion]
+        return self
+
+    def guardar(self, ruta):
+        """Guarda los vecindarios en un archivo .npz"""
+        np.savez(
+            ruta,
+            vecinos=self.vecinos,
+            distancias=self.distancias,
+            peliculas=_etiquetas(self.peliculas),
+            metrica=self.metrica,
+            umbral=self.umbral,
+        )
+
+    @classmethod
+    def cargar(cls, ruta):
+        """Carga vecindarios guardados con guardar()"""
+        with np.load(ruta) as datos:
+            recomendador = cls(str(datos['metrica']), datos['vecinos'].shape[1], float(datos['umbral']))
+            recomendador.vecinos = datos['vecinos']
+            recomendador.distancias = datos['distancias']
+            recomendador.peliculas = pd.Index(datos['peliculas'])
+        return recomendador
+
+    def generar_recomendaciones(self, df_ratings, usuario_objetivo, k=None):
+        """
+        Genera recomendaciones para un usuario a partir de los vecindarios de películas.
+
+        Cada fila indica una película no vista (`pelicula`) apoyada por una
+        película similar que el usuario sí calificó con rating >= umbral
+        (`pelicula_origen`, con ese rating en `rating_origen`);
+        `veces_recomendada` es cuántas de sus películas similares la apoyan.
+
+        :param df_ratings: DataFrame de ratings (peliculas x usuarios), RatingsDispersos,
+                           RatingsCompactos o RatingsBinarios
+        :param usuario_objetivo: nombre del usuario
+        :param k: número de películas similares consideradas por candidata (por defecto todas las guardadas)
+        :return: DataFrame con columnas COLUMNAS_ITEMS, ordenado por veces_recomendada y rating_origen
+        """
+        if self.vecinos is None:
+            raise ValueError("El recomendador no está ajustado; llamar primero a ajustar()")
+
+        if isinstance(df_ratings, (RatingsDispersos, RatingsCompactos)):
+            serie_objetivo = df_ratings.serie_usuario(usuario_objetivo)
+        elif usuario_objetivo in df_ratings.columns:
+            serie_objetivo = df_ratings[usuario_objetivo]
+        else:
+            raise ValueError(f"La columna '{usuario_objetivo}' no existe en el DataFrame")
+
+        ratings = serie_objetivo.reindex(self.peliculas).to_numpy(dtype=float)
+        vistas = ~np.isnan(ratings)
+        gustadas = vistas & (ratings >= self.umbral)
+
+        vecinos = self.vecinos[:, :k] if k is not None else self.vecinos
+        no_vistas = np.flatnonzero(~vistas)
+        vecinas = vecinos[no_vistas]
+        apoyos = (vecinas >= 0) & gustadas[vecinas]
+
+        fila, columna = np.nonzero(apoyos)
+        pelicula = no_vistas[fila]
+        similar = vecinas[fila, columna]
+        veces = apoyos.sum(axis=1)[fila]
+
+        df_recomendaciones = pd.DataFrame({
+            'pelicula': self.peliculas[pelicula],
+            'pelicula_origen': self.peliculas[similar],
+            'rating_origen': ratings[similar],
+            'veces_recomendada': veces,
+        }, columns=COLUMNAS_ITEMS)
+        return df_recomendaciones.sort_values(
+            by=['veces_recomendada', 'rating_origen'], ascending=False, kind='stable'
+        )
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: recomendar_lote.py
+
+Punto de entrada no interactivo para generar recomendaciones KNN de muchos
+usuarios y escribirlas a disco (a diferencia de prueba_paso_3.main, que pide
+los datos con input() e imprime cada línea).
+
+Los usuarios objetivo se procesan por bloques con recomendar_bloque (el mismo
+núcleo de generar_recomendaciones_batch) y cada bloque se escribe apenas se
+calcula, así que la memoria ocupada por los resultados no crece con el número
+de usuarios. Formatos de salida, según la extensión o --formato:
+- csv: columnas COLUMNAS_BATCH, con encabezado una sola vez.
+- jsonl: un objeto JSON por fila con las mismas claves.
+- npz: por cada bloque, arrays <clave>_<bloque> con las posiciones de
+  objetivo, vecino y película más rating_vecino y veces_recomendada; las
+  etiquetas van en 'usuarios' y 'peliculas'.
+
+numpy, pandas y los módulos del recomendador se importan recién al ejecutar,
+de modo que --help responde sin cargarlos.
+
+Uso:
+    python recomendar_lote.py --datos Movie_Ratings.csv --metrica pearson --k 10 \\
+        --umbral 4 --usuarios all --salida recomendaciones.csv
+"""
+import argparse
+import os
+import sys
+import time
+import zipfile
+
+METRICAS_LOTE = ('euclidean', 'manhattan', 'pearson', 'cosine')
+FORMATOS_LOTE = ('csv', 'jsonl', 'npz')
+CLAVES_ARRAYS = ('objetivo', 'vecino', 'pelicula', 'rating_vecino', 'veces_recomendada')
+
+def _formato(ruta, formato=None):
+    """Formato explícito o deducido de la extensión de la ruta"""
+    formato = formato or os.path.splitext(ruta)[1].lstrip('.').lower()
+    if formato not in FORMATOS_LOTE:
+        raise ValueError(f"Formato de salida no soportado: '{formato}' (opciones: {', '.join(FORMATOS_LOTE)})")
+    return formato
+
+class _EscritorTexto:
+    """Escribe bloques como filas CSV o JSONL sobre un archivo abierto"""
+    def __init__(self, ruta, formato, usuarios, peliculas):
+        self.archivo = open(ruta, 'w', encoding='utf-8', newline='')
+        self.formato = formato
+        self.usuarios = usuarios
+        self.peliculas = peliculas
+        self.encabezado = True
+
+    def escribir(self, bloque):
+        from KNN_Recommender import COLUMNAS_BATCH
+        import pandas as pd
+
+        df = pd.DataFrame({
+            'usuario_objetivo': self.usuarios[bloque['objetivo']],
+            'usuario_vecino': self.usuarios[bloque['vecino']],
+            'pelicula': self.peliculas[bloque['pelicula']],
+            'rating_vecino': bloque['rating_vecino'],
+            'veces_recomendada': bloque['veces_recomendada'],
+        }, columns=COLUMNAS_BATCH)
+        if self.formato == 'csv':
+            df.to_csv(self.archivo, header=self.encabezado, index=False)
+            self.encabezado = False
+        elif not df.empty:
+            df.to_json(self.archivo, orient='records', lines=True, force_ascii=False)
+
+    def cerrar(self):
+        self.archivo.close()
+
+class _EscritorNpz:
+    """Agrega los arrays de cada bloque como miembros .npy de un archivo .npz"""
+    def __init__(self, ruta, usuarios, peliculas):
+        self.archivo = zipfile.ZipFile(ruta, 'w', compression=zipfile.ZIP_STORED, allowZip64=True)
+        self.n_bloques = 0
+        self._agregar('usuarios', usuarios.to_numpy(dtype=str))
+        self._agregar('peliculas', peliculas.to_numpy(dtype=str))
+
+    def _agregar(self, nombre, array):
+        import numpy as np
+
+        with self.archivo.open(f'{nombre}.npy', 'w', force_zip64=True) as miembro:
+            np.lib.format.write_array(miembro, np.asarray(array), allow_pickle=False)
+
+    def escribir(self, bloque):
+        for clave in CLAVES_ARRAYS:
+            self._agregar(f'{clave}_{self.n_bloques:05d}', bloque[clave])
+        self.n_bloques += 1
+
+    def cerrar(self):
+        self._agregar('n_bloques', self.n_bloques)
+        self.archivo.close()
+
+def recomendar_a_archivo(df_ratings, usuarios, salida, metrica='euclidean', k=5, umbral=4.0,
+                         tamano_bloque=256, formato=None, progreso=None):
+    """
+    Genera recomendaciones por bloques de usuarios y las escribe en salida a medida que se calculan.
+
+    :param df_ratings: DataFrame de ratings (peliculas x usuarios) o RatingsBinarios mapeado
+    :param usuarios: lista de usuarios objetivo, o None para todos
+    :param salida: ruta del archivo de salida
+    :param metrica: nombre de la métrica
+    :param k: número de vecinos
+    :param umbral: rating mínimo del vecino
+    :param tamano_bloque: usuarios objetivo por bloque (acota la memoria de los resultados)
+    :param formato: 'csv', 'jsonl' o 'npz'; por defecto según la extensión de salida
+    :param progreso: función opcional progreso(usuarios_hechos, usuarios_totales, filas)
+    :return: número de filas escritas
+    """
+    import numpy as np
+    from Knn import preparar_matriz
+    from KNN_Recommender import recomendar_bloque
+    from similitud_matriz import estadisticos_matriz
+
+    formato = _formato(salida, formato)
+    usuarios_df, peliculas_df = df_ratings.columns, df_ratings.index
+    if usuarios is None:
+        usuarios = list(usuarios_df)
+    for usuario in usuarios:
+        if usuario not in usuarios_df:
+            raise ValueError(f"La columna '{usuario}' no existe en el DataFrame")
+
+    valores, mascara = preparar_matriz(df_ratings)
+    estadisticos = estadisticos_matriz(valores, mascara)
+    indices = np.array([usuarios_df.get_loc(u) for u in usuarios], dtype=np.intp)
+    if formato == 'npz':
+        escritor = _EscritorNpz(salida, usuarios_df, peliculas_df)
+    else:
+        escritor = _EscritorTexto(salida, formato, usuarios_df, peliculas_df)
+
+    filas = 0
+    try:
+        for inicio in range(0, len(indices), tamano_bloque):
+            bloque = recomendar_bloque(
+                valores, mascara, indices[inicio:inicio + tamano_bloque], k, metrica, umbral,
+                estadisticos=estadisticos,
+            )
+            escritor.escribir(bloque)
+            filas += len(bloque['objetivo'])
+            if progreso is not None:
+                progreso(min(inicio + tamano_bloque, len(indices)), len(indices), filas)
+    finally:
+        escritor.cerrar()
+    return filas
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Recomendaciones KNN por lotes escritas a disco")
+    parser.add_argument('--datos', required=True, help="CSV o directorio binario de ratings")
+    parser.add_argument('--metrica', default='euclidean', choices=METRICAS_LOTE)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--umbral', type=float, default=4.0, help="rating mínimo del vecino")
+    parser.add_argument('--usuarios', nargs='+', default=['all'],
+                        help="usuarios objetivo, 'all' para todos o @archivo con un usuario por línea")
+    parser.add_argument('--salida', required=True, help="archivo .csv, .jsonl o .npz")
+    parser.add_argument('--formato', choices=FORMATOS_LOTE, default=None,
+                        help="por defecto según la extensión de --salida")
+    parser.add_argument('--tamano-bloque', type=int, default=256)
+    parser.add_argument('--silencioso', action='store_true', help="no reportar progreso")
+    args = parser.parse_args(argumentos)
+
+    try:
+        _formato(args.salida, args.formato)
+    except ValueError as error:
+        parser.error(str(error))
+
+    usuarios = []
+    for usuario in args.usuarios:
+        if usuario.startswith('@'):
+            with open(usuario[1:], encoding='utf-8') as archivo:
+                usuarios.extend(linea.strip() for linea in archivo if linea.strip())
+        else:
+            usuarios.append(usuario)
+    if usuarios == ['all']:
+        usuarios = None
+
+    from formato_binario import cargar_ratings
+
+    inicio = time.perf_counter()
+    df = cargar_ratings(args.datos, mapeado=True)
+    if not args.silencioso:
+        print(f"Datos cargados: {df.shape[1]} usuarios, {df.shape[0]} películas "
+              f"({time.perf_counter() - inicio:.1f} s)", file=sys.stderr)
+
+    inicio = time.perf_counter()
+    def reportar(hechos, total, filas):
+        transcurrido = time.perf_counter() - inicio
+        print(f"usuarios {hechos}/{total}, {filas} filas, "
+              f"{hechos / max(transcurrido, 1e-9):.1f} usuarios/s", file=sys.stderr)
+
+    try:
+        filas = recomendar_a_archivo(
+            df, usuarios, args.salida, args.metrica, args.k, args.umbral,
+            args.tamano_bloque, args.formato, None if args.silencioso else reportar,
+        )
+    except ValueError as error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 1
+    if not args.silencioso:
+        print(f"{filas} filas escritas en {args.salida} ({time.perf_counter() - inicio:.1f} s)",
+              file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
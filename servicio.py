@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: servicio.py
+
+Servicio HTTP local (asyncio) de vecinos y recomendaciones con datos precargados.
+
+Los ratings (CSV o directorio binario) se cargan y se preparan como arrays
+(preparar_matriz) una sola vez al iniciar y, si se pide, también la matriz de
+distancias precalculada. Los vecinos de ambas rutas salen del mismo cálculo
+(la matriz precalculada o distancias_bloque).
+El cálculo se ejecuta en un pool de hilos para no bloquear el bucle de
+eventos. NumPy libera el GIL en los productos matriciales.
+
+- Peticiones idénticas concurrentes se agrupan: comparten un mismo resultado
+  en vuelo.
+- Las peticiones de recomendaciones que llegan dentro de una ventana corta se
+  juntan en un lote y se resuelven con recomendar_bloque (el núcleo de
+  generar_recomendaciones_batch) sobre los arrays ya preparados.
+
+Rutas (GET, respuesta JSON):
+- /salud
+- /vecinos?usuario=<nombre>&k=<int>
+- /recomendaciones?usuario=<nombre>&k=<int>
+
+Uso:
+    python servicio.py --datos Movie_Ratings.csv --metrica pearson --puerto 8080
+"""
+import argparse
+import asyncio
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+from formato_binario import cargar_ratings
+from formulas import obtener_metrica
+from Knn import preparar_matriz
+from KNN_Recommender import recomendar_bloque, vecinos_desde_distancias
+from similitud_matriz import MatrizSimilitudUsuarios, distancias_bloque, estadisticos_matriz
+
+def _a_json(valor):
+    """Convierte NaN en None para que el JSON sea válido"""
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    return valor
+
+def _registros(df):
+    return [{columna: _a_json(v) for columna, v in fila.items()} for fila in df.to_dict(orient='records')]
+
+class ServicioRecomendaciones:
+    def __init__(self, df_ratings, metrica='pearson', umbral_rating=4.0, n_hilos=4,
+                 precalcular=False, ventana_lote=0.005, max_lote=256):
+        """
+        :param df_ratings: DataFrame de ratings (peliculas x usuarios) o RatingsBinarios ya cargado
+        :param metrica: nombre de la métrica
+        :param umbral_rating: umbral del recomendador
+        :param n_hilos: hilos del pool de cálculo
+        :param precalcular: si es True se construye MatrizSimilitudUsuarios al iniciar
+        :param ventana_lote: segundos que se esperan para juntar recomendaciones en un lote
+        :param max_lote: máximo de usuarios por lote
+        """
+        self.df = df_ratings
+        self.usuarios, self.peliculas = df_ratings.columns, df_ratings.index
+        self.metrica = obtener_metrica(metrica).nombre
+        self.umbral = umbral_rating
+        self.matriz = MatrizSimilitudUsuarios(df_ratings, metrica) if precalcular else None
+        if self.matriz is not None:
+            self.valores, self.mascara = self.matriz.valores, self.matriz.mascara
+        else:
+            self.valores, self.mascara = preparar_matriz(df_ratings)
+        self.estadisticos = estadisticos_matriz(self.valores, self.mascara) if self.matriz is None else None
+        self.ejecutor = ThreadPoolExecutor(max_workers=n_hilos)
+        self.ventana_lote = ventana_lote
+        self.max_lote = max_lote
+        self._en_vuelo = {}
+        self._cola = None
+        self._tarea_lotes = None
+        self.servidor = None
+
+    # -- cálculo ------------------------------------------------------------
+
+    def _distancias(self, indices):
+        """
+        Filas de distancias de los usuarios en indices: de la matriz precalculada o
+        con distancias_bloque. Las dos rutas pasan por aquí, así que reportan los
+        mismos vecinos.
+        """
+        if self.matriz is not None:
+            return self.matriz.distancias[indices]
+        return distancias_bloque(self.valores, self.mascara, indices, self.metrica, self.estadisticos)
+
+    def _calcular_vecinos(self, usuario, k):
+        """Vecinos de un usuario con el mismo cálculo que las recomendaciones"""
+        indice = self.usuarios.get_loc(usuario)
+        vecinos, distancias = vecinos_desde_distancias(self._distancias([indice]), [indice], k)
+        return [{'usuario': u, 'distancia': _a_json(float(d))} for u, d in zip(self.usuarios[vecinos[0]], distancias[0])]
+
+    def _calcular_recomendaciones(self, usuarios, k):
+        """
+        Recomendaciones de un lote de usuarios sobre los arrays preparados al iniciar.
+
+        :return: diccionario usuario -> lista de registros (columnas de COLUMNAS_BATCH sin usuario_objetivo)
+        """
+        indices = np.array([self.usuarios.get_loc(u) for u in usuarios], dtype=np.intp)
+        vecinos, _ = vecinos_desde_distancias(self._distancias(indices), indices, k)
+        resultado = recomendar_bloque(
+            self.valores, self.mascara, indices, k, self.metrica, self.umbral, vecinos=vecinos,
+        )
+        df_lote = pd.DataFrame({
+            'usuario_objetivo': self.usuarios[resultado['objetivo']],
+            'usuario_vecino': self.usuarios[resultado['vecino']],
+            'pelicula': self.peliculas[resultado['pelicula']],
+            'rating_vecino': resultado['rating_vecino'],
+            'veces_recomendada': resultado['veces_recomendada'],
+        })
+        grupos = {u: d.drop(columns='usuario_objetivo') for u, d in df_lote.groupby('usuario_objetivo', sort=False)}
+        return {u: _registros(grupos[u]) if u in grupos else [] for u in usuarios}
+
+    async def _coalescer(self, clave, crear):
+        """Devuelve el resultado en vuelo para `clave` o lanza uno nuevo con crear()"""
+        if clave in self._en_vuelo:
+            return await asyncio.shield(self._en_vuelo[clave])
+        futuro = asyncio.ensure_future(crear())
+        self._en_vuelo[clave] = futuro
+        futuro.add_done_callback(lambda _: self._en_vuelo.pop(clave, None))
+        return await asyncio.shield(futuro)
+
+    async def vecinos(self, usuario, k):
+        async def calcular():
+            bucle = asyncio.get_running_loop()
+            return await bucle.run_in_executor(self.ejecutor, self._calcular_vecinos, usuario, k)
+        return await self._coalescer(('vecinos', usuario, k), calcular)
+
+    async def recomendaciones(self, usuario, k):
+        async def encolar():
+            futuro = asyncio.get_running_loop().create_future()
+            await self._cola.put((usuario, k, futuro))
+            return await futuro
+        return await self._coalescer(('recomendaciones', usuario, k), encolar)
+
+    async def _procesar_lotes(self):
+        """Junta peticiones de recomendaciones durante ventana_lote y las resuelve por lotes"""
+        bucle = asyncio.get_running_loop()
+        while True:
+            pendientes = [await self._cola.get()]
+            limite = bucle.time() + self.ventana_lote
+            while len(pendientes) < self.max_lote:
+                restante = limite - bucle.time()
+                if restante <= 0:
+                    break
+                try:
+                    pendientes.append(await asyncio.wait_for(self._cola.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+
+            por_k = {}
+            for usuario, k, futuro in pendientes:
+                por_k.setdefault(k, []).append((usuario, futuro))
+            for k, grupo in por_k.items():
+                usuarios = list(dict.fromkeys(u for u, _ in grupo))
+                try:
+                    por_usuario = await bucle.run_in_executor(
+                        self.ejecutor, self._calcular_recomendaciones, usuarios, k
+                    )
+                except Exception as error:
+                    for _, futuro in grupo:
+                        if not futuro.done():
+                            futuro.set_exception(error)
+                    continue
+                for usuario, futuro in grupo:
+                    if not futuro.done():
+                        futuro.set_result(por_usuario[usuario])
+
+    # -- HTTP ----------------------------------------------------------------
+
+    async def _responder(self, escritor, estado, cuerpo):
+        datos = json.dumps(cuerpo).encode('utf-8')
+        razones = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+        escritor.write(
+            f"HTTP/1.1 {estado} {razones.get(estado, '')}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(datos)}\r\n"
+            f"Connection: close\r\n\r\n".encode('ascii') + datos
+        )
+        await escritor.drain()
+        escritor.close()
+
+    async def _atender(self, lector, escritor):
+        try:
+            linea = (await lector.readline()).decode('latin-1').split()
+            while (await lector.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            if len(linea) < 2 or linea[0] != 'GET':
+                return await self._responder(escritor, 400, {'error': 'Solo se admite GET'})
+
+            url = urlsplit(linea[1])
+            parametros = {c: v[0] for c, v in parse_qs(url.query).items()}
+            if url.path == '/salud':
+                return await self._responder(escritor, 200, {'estado': 'ok', 'usuarios': len(self.usuarios)})
+            if url.path not in ('/vecinos', '/recomendaciones'):
+                return await self._responder(escritor, 404, {'error': f"Ruta no encontrada: {url.path}"})
+
+            usuario = parametros.get('usuario')
+            if usuario not in self.usuarios:
+                return await self._responder(escritor, 404, {'error': f"{usuario} no está en la base de datos"})
+            try:
+                k = int(parametros.get('k', 5))
+            except ValueError:
+                return await self._responder(escritor, 400, {'error': "k debe ser un entero"})
+            if k <= 0:
+                return await self._responder(escritor, 400, {'error': "k debe ser un entero positivo"})
+
+            if url.path == '/vecinos':
+                resultado = await self.vecinos(usuario, k)
+            else:
+                resultado = await self.recomendaciones(usuario, k)
+            await self._responder(escritor, 200, {'usuario': usuario, 'k': k, 'resultado': resultado})
+        except Exception as error:
+            await self._responder(escritor, 500, {'error': str(error)})
+
+    async def iniciar(self, host='127.0.0.1', puerto=0):
+        """Arranca el servidor; con puerto=0 el sistema elige uno libre (ver self.puerto)"""
+        self._cola = asyncio.Queue()
+        self._tarea_lotes = asyncio.create_task(self._procesar_lotes())
+        self.servidor = await asyncio.start_server(self._atender, host, puerto)
+        return self.servidor
+
+    @property
+    def puerto(self):
+        return self.servidor.sockets[0].getsockname()[1]
+
+    async def detener(self):
+        self.servidor.close()
+        await self.servidor.wait_closed()
+        self._tarea_lotes.cancel()
+        self.ejecutor.shutdown(wait=False)
+
+async def _servir(args):
+    servicio = ServicioRecomendaciones(
+        cargar_ratings(args.datos, mapeado=True), args.metrica, args.umbral, args.hilos, args.precalcular
+    )
+    await servicio.iniciar(args.host, args.puerto)
+    print(f"Servicio escuchando en http://{args.host}:{servicio.puerto}")
+    async with servicio.servidor:
+        await servicio.servidor.serve_forever()
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP de recomendaciones KNN")
+    parser.add_argument('--datos', default='Pelis_short.csv', help="CSV o directorio binario de ratings")
+    parser.add_argument('--metrica', default='pearson', choices=['euclidean', 'manhattan', 'pearson', 'cosine'])
+    parser.add_argument('--umbral', type=float, default=4.0)
+    parser.add_argument('--hilos', type=int, default=4)
+    parser.add_argument('--precalcular', action='store_true', help="precalcular la matriz de distancias")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8080)
+    asyncio.run(_servir(parser.parse_args(argumentos)))
+
+if __name__ == "__main__":
+    main()
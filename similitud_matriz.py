@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo: similitud_matriz.py
+
+Matriz de distancias usuario-usuario precalculada para todas las métricas.
+
+Las distancias se obtienen por bloques de usuarios a partir de estadísticos
+suficientes calculados con productos matriciales enmascarados (conteo de
+co-calificadas, sumas, sumas de cuadrados y productos cruzados), en lugar de
+llamar a la función escalar para cada par.
+
+Funciones principales:
+- estadisticos_matriz: arrays de la matriz compartidos por todos los bloques.
+- distancias_bloque: distancias de un bloque de usuarios contra todos.
+- matriz_distancias: matriz completa (usuarios x usuarios).
+- MatrizSimilitudUsuarios: almacén con get_knn por búsqueda de fila y
+  actualización incremental de un usuario.
+"""
+import numpy as np
+import pandas as pd
+from formulas import _pearson_desde_sumas, obtener_metrica
+from Knn import preparar_matriz, seleccionar_top_k
+
+# Máximo de niveles de rating distintos para calcular Manhattan con productos
+# matriciales; por encima se usa diferencia directa por bloques.
+MAX_NIVELES_MANHATTAN = 64
+
+def estadisticos_matriz(valores, mascara):
+    """
+    Arrays de toda la matriz que usa distancias_bloque en cada bloque.
+
+    Retorna:
+    (m, x, x2): máscara como float, ratings con ceros en faltantes y sus
+    cuadrados. Conviene calcularlos una vez por matriz y pasarlos a cada
+    llamada en lugar de copiar la matriz completa en cada bloque.
+    """
+    m = mascara.astype(float)
+    x = np.where(mascara, valores, 0.0)
+    return m, x, x ** 2
+
+def _manhattan_bloque(valores, mascara, indices, m, x):
+    """Distancia Manhattan del bloque contra todos, sumando sobre co-calificadas"""
+    m_bloque = m[:, indices]
+    niveles = np.unique(valores[mascara])
+
+    if len(niveles) <= MAX_NIVELES_MANHATTAN:
+        # |a - b| = suma sobre niveles v_l de (v_{l+1} - v_l) * [solo uno de a, b supera v_l]
+        suma = np.zeros((len(indices), valores.shape[1]))
+        for nivel, salto in zip(niveles[:-1], np.diff(niveles)):
+            h = (mascara & (valores > nivel)).astype(float)
+            h_bloque = h[:, indices]
+            solo_uno = h_bloque.T @ m + m_bloque.T @ h - 2 * (h_bloque.T @ h)
+            suma += salto * solo_uno
+        return suma
+
+    return np.stack([
+        (np.abs(x[:, [i]] - x) * (m[:, [i]] * m)).sum(axis=0) for i in indices
+    ])
+
+def distancias_bloque(valores, mascara, indices, metrica, estadisticos=None, min_comunes=None):
+    """
+    Calcula las distancias de un bloque de usuarios contra todos los usuarios.
+
+    Parámetros:
+    valores -- array (peliculas x usuarios) de ratings
+    mascara -- array booleano de ratings válidos
+    indices -- posiciones de los usuarios del bloque
+    metrica -- nombre de la métrica ('euclidean', 'manhattan', 'pearson', 'cosine')
+    estadisticos -- resultado de estadisticos_matriz(valores, mascara) (opcional;
+                    si se calculan varios bloques de la misma matriz conviene pasarlo)
+    min_comunes -- mínimo de películas co-calificadas (opcional); los pares con
+                   menos quedan en NaN, como en KNNCalcularDistancia
+
+    Retorna:
+    Array (len(indices) x usuarios) con las distancias; NaN donde no hay pares válidos
+    """
+    metrica = obtener_metrica(metrica).nombre
+    indices = np.asarray(indices)
+    m, x, x2 = estadisticos if estadisticos is not None else estadisticos_matriz(valores, mascara)
+    m_bloque, x_bloque = m[:, indices], x[:, indices]
+
+    # Estadísticos suficientes sobre las películas calificadas por ambos
+    n = m_bloque.T @ m
+    invalidos = n < max(min_comunes or 1, 1)
+    if metrica == 'manhattan':
+        return np.where(invalidos, np.nan, _manhattan_bloque(valores, mascara, indices, m, x))
+
+    saa = x2[:, indices].T @ m
+    sbb = m_bloque.T @ x2
+    sab = x_bloque.T @ x
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if metrica == 'euclidean':
+            distancias = np.sqrt(np.maximum(saa + sbb - 2 * sab, 0.0))
+        elif metrica == 'cosine':
+            distancias = 1 - sab / (np.sqrt(saa) * np.sqrt(sbb))
+            invalidos = invalidos | (saa == 0) | (sbb == 0)
+        elif metrica == 'pearson':
+            # La misma fórmula que pearson_distance_batch y pearson_distance_pairs
+            distancias = _pearson_desde_sumas(n, x_bloque.T @ m, m_bloque.T @ x, saa, sbb, sab)
+        else:
+            raise ValueError(f"La métrica '{metrica}' no tiene cálculo por bloques")
+
+    return np.where(invalidos, np.nan, distancias)
+
+def matriz_distancias(valores, mascara, metrica, tamano_bloque=256):
+    """
+    Calcula la matriz completa de distancias usuario-usuario por bloques.
+
+    Retorna:
+    Array (usuarios x usuarios)
+    """
+    n_usuarios = valores.shape[1]
+    estadisticos = estadisticos_matriz(valores, mascara)
+    resultado = np.empty((n_usuarios, n_usuarios))
+    for inicio in range(0, n_usuarios, tamano_bloque):
+        indices = np.arange(inicio, min(inicio + tamano_bloque, n_usuarios))
+        resultado[indices] = distancias_bloque(valores, mascara, indices, metrica, estadisticos)
+    return resultado
+
+class MatrizSimilitudUsuarios:
+    def __init__(self, df_ratings, metrica='euclidean', tamano_bloque=256):
+        """
+        Construye el almacén de distancias usuario-usuario.
+
+        :param df_ratings: DataFrame de ratings (peliculas x usuarios) o RatingsBinarios
+        :param metrica: nombre de la métrica
+        :param tamano_bloque: usuarios por bloque en los productos matriciales
+        """
+        self.metrica = obtener_metrica(metrica).nombre
+        self.tamano_bloque = tamano_bloque
+        self.usuarios = df_ratings.columns
+        self.peliculas = df_ratings.index
+        self.valores, self.mascara = preparar_matriz(df_ratings)
+        self.distancias = matriz_distancias(self.valores, self.mascara, self.metrica, tamano_bloque)
+
+    def get_knn(self, df, target_column, k=5):
+        """
+        Obtiene los K vecinos más cercanos por búsqueda de fila.
+
+        Acepta la misma firma que KNNCalcularDistancia.get_knn para poder usarse
+        en RecomendadorKNN; `df` se ignora porque las distancias ya están calculadas.
+        """
+        if target_column not in self.usuarios:
+            raise ValueError(f"La columna '{target_column}' no existe en el DataFrame")
+
+        indice_objetivo = self.usuarios.get_loc(target_column)
+        fila = self.distancias[indice_objetivo]
+        otros = np.delete(np.arange(len(self.usuarios)), indice_objetivo)
+        seleccion = otros[seleccionar_top_k(fila[otros], k)]
+        return pd.DataFrame({'Distancia': fila[seleccion]}, index=self.usuarios[seleccion])
+
+    def actualizar_usuario(self, usuario, ratings):
+        """
+        Reemplaza los ratings de un usuario y recalcula solo su fila y columna.
+
+        :param usuario: nombre del usuario (columna existente)
+        :param ratings: Serie indexada por película o array (peliculas,) con NaN para no vistas
+        """
+        if usuario not in self.usuarios:
+            raise ValueError(f"La columna '{usuario}' no existe en el DataFrame")
+
+        if isinstance(ratings, pd.Series):
+            ratings = ratings.reindex(self.peliculas)
+        ratings = np.asarray(ratings, dtype=float)
+
+        indice = self.usuarios.get_loc(usuario)
+        if not self.valores.flags.writeable:
+            # Ratings mapeados de solo lectura: se copian recién en la primera actualización
+            self.valores, self.mascara = self.valores.astype(float), self.mascara.copy()
+        self.valores[:, indice] = ratings
+        self.mascara[:, indice] = ~np.isnan(ratings)
+
+        fila = distancias_bloque(self.valores, self.mascara, [indice], self.metrica)[0]
+        self.distancias[indice, :] = fila
+        self.distancias[:, indice] = fila
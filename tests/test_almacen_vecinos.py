@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+from almacen_vecinos import AlmacenVecinos, precalcular_vecinos
+from instrumentacion import Instrumentacion
+from Knn import KNNCalcularDistancia
+
+def _ratings_ids_enteros():
+    rng = np.random.default_rng(2)
+    valores = rng.integers(1, 6, (40, 30)).astype(float)
+    valores[rng.random(valores.shape) < 0.5] = np.nan
+    return pd.DataFrame(valores, index=np.arange(40) * 10, columns=np.arange(30) + 100)
+
+@pytest.mark.parametrize('min_comunes', [None, 4])
+def test_almacen_responde_con_ids_enteros_igual_que_en_vivo(tmp_path, min_comunes):
+    df = _ratings_ids_enteros()
+    almacen = precalcular_vecinos(df, str(tmp_path / 'vecinos'), ['pearson', 'euclidean'], k=8,
+                                  tamano_bloque=7, min_comunes=min_comunes)
+    # Reabrir y volver a precalcular sobre el mismo directorio reconoce a los usuarios
+    precalcular_vecinos(df, str(tmp_path / 'vecinos'), ['cosine'], k=8, tamano_bloque=7, min_comunes=min_comunes)
+    almacen = AlmacenVecinos(str(tmp_path / 'vecinos'))
+    assert almacen.usuarios.equals(df.columns)
+
+    for metrica in ('pearson', 'euclidean', 'cosine'):
+        instr = Instrumentacion()
+        con_almacen = KNNCalcularDistancia(metrica=metrica, min_comunes=min_comunes, almacen=almacen,
+                                           instrumentacion=instr)
+        en_vivo = KNNCalcularDistancia(metrica=metrica, min_comunes=min_comunes)
+        for usuario in df.columns[:10]:
+            guardado, esperado = con_almacen.get_knn(df, usuario, 5), en_vivo.get_knn(df, usuario, 5)
+            assert list(guardado.index) == list(esperado.index)
+            np.testing.assert_allclose(guardado['Distancia'], esperado['Distancia'], rtol=1e-6)
+        assert instr.sink.contadores == {'consultas_almacen': 10}
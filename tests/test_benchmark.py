@@ -0,0 +1,53 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from benchmark import comparar_con_base, ejecutar_benchmark, generar_ratings_sinteticos, main
+
+CONFIGURACION = ['--usuarios', '60', '--peliculas', '40', '--densidad', '0.3', '--consultas', '3', '--k', '4']
+
+@pytest.mark.parametrize('distribucion', ['uniforme', 'normal', 'sesgada'])
+def test_generador_reproducible(distribucion):
+    df = generar_ratings_sinteticos(200, 100, densidad=0.1, distribucion=distribucion, semilla=3)
+    pd.testing.assert_frame_equal(df, generar_ratings_sinteticos(200, 100, 0.1, distribucion, semilla=3))
+    assert df.shape == (100, 200)
+    assert df.notna().to_numpy().mean() == pytest.approx(0.1, abs=0.01)
+    validos = df.to_numpy()[df.notna().to_numpy()]
+    assert set(np.unique(validos)) <= {1.0, 2.0, 3.0, 4.0, 5.0}
+
+    with pytest.raises(ValueError):
+        generar_ratings_sinteticos(10, 10, distribucion='otra')
+
+def test_resultado_por_etapa_serializable():
+    resultado = ejecutar_benchmark(60, 40, densidad=0.3, n_consultas=3, k=4, metricas=('euclidean', 'pearson'))
+    assert set(resultado['etapas']) == {
+        'carga_csv', 'carga_binaria', 'distancias_euclidean', 'distancias_pearson', 'get_knn', 'agregacion',
+    }
+    for medida in resultado['etapas'].values():
+        assert set(medida) == {'n', 'p50_ms', 'p99_ms', 'ops_por_segundo', 'pico_memoria_mb'}
+        assert 0 < medida['p50_ms'] <= medida['p99_ms']
+    assert resultado['etapas']['get_knn']['n'] == 3
+    assert json.loads(json.dumps(resultado)) == resultado
+
+def test_comparar_con_base():
+    resultado = {'configuracion': {'usuarios': 10}, 'etapas': {'get_knn': {'p50_ms': 2.0}, 'nueva': {'p50_ms': 9.0}}}
+    assert comparar_con_base(resultado, {'configuracion': {'usuarios': 10}, 'etapas': {'get_knn': {'p50_ms': 1.8}}}) == []
+    regresiones = comparar_con_base(resultado, {'configuracion': {'usuarios': 10}, 'etapas': {'get_knn': {'p50_ms': 1.0}}})
+    assert len(regresiones) == 1 and regresiones[0].startswith('get_knn')
+    assert comparar_con_base(resultado, {'configuracion': {'usuarios': 20}, 'etapas': {}}) != []
+
+def test_main_falla_con_regresion(tmp_path):
+    salida = tmp_path / 'resultado.json'
+    assert main(CONFIGURACION + ['--salida', str(salida)]) == 0
+    resultado = json.loads(salida.read_text(encoding='utf-8'))
+
+    # Una base con todas las etapas mucho más rápidas obliga a fallar
+    base = dict(resultado, etapas={e: dict(m, p50_ms=m['p50_ms'] * 1e-6) for e, m in resultado['etapas'].items()})
+    ruta_base = tmp_path / 'base.json'
+    ruta_base.write_text(json.dumps(base), encoding='utf-8')
+    assert main(CONFIGURACION + ['--salida', str(tmp_path / 'otra.json'), '--base', str(ruta_base)]) == 1
+
+    holgada = dict(resultado, etapas={e: dict(m, p50_ms=m['p50_ms'] * 1e6) for e, m in resultado['etapas'].items()})
+    ruta_base.write_text(json.dumps(holgada), encoding='utf-8')
+    assert main(CONFIGURACION + ['--salida', str(tmp_path / 'otra.json'), '--base', str(ruta_base)]) == 0
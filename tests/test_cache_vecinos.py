@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from cache_vecinos import CacheVecinos, KNNConCache
+from Knn import KNNCalcularDistancia
+
+def _ratings(semilla=0, peliculas=60, usuarios=30):
+    rng = np.random.default_rng(semilla)
+    valores = rng.integers(1, 6, (peliculas, usuarios)).astype(float)
+    valores[rng.random(valores.shape) < 0.5] = np.nan
+    return pd.DataFrame(valores, columns=[f'u{i}' for i in range(usuarios)])
+
+def test_entradas_vigentes_tras_cambios_coinciden_con_calculo_en_vivo():
+    rng = np.random.default_rng(1)
+    for metrica in ('euclidean', 'manhattan', 'pearson', 'cosine'):
+        df = _ratings()
+        knn = KNNCalcularDistancia(metrica=metrica)
+        con_cache = KNNConCache(knn, CacheVecinos())
+        for usuario in df.columns:
+            con_cache.get_knn(df, usuario, 4)
+
+        for usuario in rng.choice(df.columns, 5, replace=False):
+            ratings = df[usuario].copy()
+            ratings[rng.random(len(ratings)) < 0.3] = 5.0
+            con_cache.actualizar_ratings(df, usuario, ratings)
+
+        assert con_cache.cache.invalidaciones > 0
+        for usuario in df.columns:
+            pd.testing.assert_frame_equal(con_cache.get_knn(df, usuario, 4), knn.get_knn(df, usuario, 4))
+
+def test_recomendador_con_cache_no_modifica_el_recomendador_y_busca_una_vez():
+    from cache_vecinos import RecomendadorConCache
+    from KNN_Recommender import RecomendadorKNN
+
+    df = _ratings()
+    knn = KNNCalcularDistancia(metrica='pearson')
+    recomendador = RecomendadorKNN(knn, umbral_rating=4.0)
+    con_cache = RecomendadorConCache(recomendador)
+    assert recomendador.knn is knn
+
+    usuario = df.columns[0]
+    esperado = recomendador.generar_recomendaciones(df, usuario, 5)
+    pd.testing.assert_frame_equal(con_cache.generar_recomendaciones(df, usuario, 5), esperado)
+    # Fallo de la recomendación y de sus vecinos, sin búsquedas repetidas
+    assert (con_cache.cache.aciertos, con_cache.cache.fallos) == (0, 2)
+    pd.testing.assert_frame_equal(con_cache.generar_recomendaciones(df, usuario, 5), esperado)
+    assert (con_cache.cache.aciertos, con_cache.cache.fallos) == (1, 2)
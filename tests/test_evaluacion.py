@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+from evaluacion import COLUMNAS_EVALUACION, dividir_holdout, evaluar_configuraciones
+from Knn import KNNCalcularDistancia
+from KNN_Recommender import RecomendadorKNN
+
+def _ratings(peliculas=50, usuarios=40, densidad=0.4, semilla=2):
+    rng = np.random.default_rng(semilla)
+    valores = rng.integers(1, 6, (peliculas, usuarios)).astype(float)
+    valores[rng.random(valores.shape) > densidad] = np.nan
+    return pd.DataFrame(valores, index=[f'p{i}' for i in range(peliculas)],
+                        columns=[f'u{i}' for i in range(usuarios)])
+
+def test_holdout_reproducible_y_particion_completa():
+    df = _ratings()
+    entrenamiento, prueba = dividir_holdout(df, fraccion=0.5, semilla=7)
+    otra_vez, prueba_otra_vez = dividir_holdout(df, fraccion=0.5, semilla=7)
+    pd.testing.assert_frame_equal(entrenamiento, otra_vez)
+    pd.testing.assert_frame_equal(prueba, prueba_otra_vez)
+
+    assert entrenamiento.notna().sum().min() >= 1
+    assert entrenamiento.notna().sum().sum() + len(prueba) == df.notna().sum().sum()
+    reconstruido = entrenamiento.copy()
+    for usuario, pelicula, rating in prueba.itertuples(index=False):
+        assert np.isnan(reconstruido.loc[pelicula, usuario])
+        reconstruido.loc[pelicula, usuario] = rating
+    pd.testing.assert_frame_equal(reconstruido, df)
+
+def _referencia(df, metrica, k, umbral, n, fraccion, semilla):
+    # Mismas métricas calculadas usuario por usuario con get_knn y generar_recomendaciones
+    entrenamiento, prueba = dividir_holdout(df, fraccion, semilla)
+    recomendador = RecomendadorKNN(KNNCalcularDistancia(metrica=metrica), umbral_rating=umbral)
+    errores, pares, precisiones, recalls, recomendadas = [], 0, [], [], set()
+    for usuario, filas in prueba.groupby('usuario', sort=False):
+        vecinos = recomendador.knn.get_knn(entrenamiento, usuario, k)
+        pesos = np.nan_to_num(1.0 / (1.0 + vecinos['Distancia'].to_numpy(dtype=float)), nan=0.0)
+        for pelicula, rating in zip(filas['pelicula'], filas['rating']):
+            ratings = entrenamiento.loc[pelicula, vecinos.index].to_numpy(dtype=float)
+            validos = ~np.isnan(ratings) & (pesos > 0)
+            pares += 1
+            if validos.any():
+                errores.append(np.average(ratings[validos], weights=pesos[validos]) - rating)
+
+        top = recomendador.generar_recomendaciones(entrenamiento, usuario, k)['pelicula'].drop_duplicates()[:n]
+        recomendadas.update(top)
+        relevantes = set(filas.loc[filas['rating'] >= umbral, 'pelicula'])
+        if relevantes:
+            aciertos = len(relevantes & set(top))
+            precisiones.append(aciertos / n)
+            recalls.append(aciertos / len(relevantes))
+    errores = np.array(errores)
+    return {
+        'rmse': np.sqrt((errores ** 2).mean()), 'mae': np.abs(errores).mean(),
+        'cobertura_prediccion': len(errores) / pares, 'precision': np.mean(precisiones),
+        'recall': np.mean(recalls), 'cobertura': len(recomendadas) / len(df.index),
+        'usuarios_evaluados': len(precisiones),
+    }
+
+@pytest.mark.parametrize('metrica', ['euclidean', 'pearson'])
+def test_grilla_igual_a_evaluacion_por_usuario(metrica):
+    df = _ratings()
+    tabla = evaluar_configuraciones(df, metricas=[metrica], ks=(3, 6), umbrales=(3.0, 4.0), n_recomendaciones=5,
+                                    fraccion_prueba=0.3, semilla=1, n_procesos=1, tamano_bloque=7)
+    assert list(tabla.columns) == COLUMNAS_EVALUACION
+    assert len(tabla) == 4
+    for fila in tabla.itertuples(index=False):
+        esperado = _referencia(df, metrica, fila.k, fila.umbral, 5, 0.3, 1)
+        for campo, valor in esperado.items():
+            assert getattr(fila, campo) == pytest.approx(valor, rel=1e-12), campo
+
+def test_procesos_dan_la_misma_tabla():
+    df = _ratings()
+    argumentos = dict(ks=(2, 5), umbrales=(4.0,), fraccion_prueba=0.3, semilla=3, tamano_bloque=9)
+    pd.testing.assert_frame_equal(
+        evaluar_configuraciones(df, n_procesos=2, **argumentos),
+        evaluar_configuraciones(df, n_procesos=1, **argumentos),
+    )
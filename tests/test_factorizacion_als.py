@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+from factorizacion_als import RecomendadorALS
+
+def _ratings_enteros():
+    rng = np.random.default_rng(0)
+    valores = rng.integers(1, 6, (30, 20)).astype(float)
+    valores[rng.random(valores.shape) < 0.4] = np.nan
+    return pd.DataFrame(valores, index=np.arange(30) * 10, columns=np.arange(20) + 100)
+
+def test_guardar_cargar_conserva_ids_enteros(tmp_path):
+    df = _ratings_enteros()
+    modelo = RecomendadorALS(n_factores=4, iteraciones=3).ajustar(df)
+    ruta = str(tmp_path / 'modelo.npz')
+    modelo.guardar(ruta)
+    cargado = RecomendadorALS.cargar(ruta)
+
+    np.testing.assert_allclose(cargado.predecir(105), modelo.predecir(105))
+    pd.testing.assert_frame_equal(
+        cargado.generar_recomendaciones(df, 105, 5), modelo.generar_recomendaciones(df, 105, 5)
+    )
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pandas as pd
+from formato_binario import RatingsBinarios, cargar_ratings, guardar_binario
+from Knn import KNNCalcularDistancia, preparar_matriz
+from KNN_Recommender import RecomendadorKNN
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _ratings(tmp_path):
+    df = cargar_ratings(os.path.join(RAIZ, 'Movie_Ratings.csv'))
+    guardar_binario(df, str(tmp_path / 'binario'))
+    return df, cargar_ratings(str(tmp_path / 'binario'), mapeado=True)
+
+def test_preparar_matriz_no_copia_los_ratings_mapeados(tmp_path):
+    _, binarios = _ratings(tmp_path)
+    assert isinstance(binarios, RatingsBinarios)
+    valores, mascara = preparar_matriz(binarios)
+    assert valores is binarios.valores
+    assert isinstance(valores, np.memmap)
+    assert mascara.dtype == bool
+
+def test_mapeado_igual_que_dataframe(tmp_path):
+    df, binarios = _ratings(tmp_path)
+    for metrica in ('euclidean', 'manhattan', 'pearson', 'cosine'):
+        knn = KNNCalcularDistancia(metrica=metrica)
+        usuario = df.columns[0]
+        pd.testing.assert_frame_equal(knn.get_knn(df, usuario, 5), knn.get_knn(binarios, usuario, 5))
+        recomendador = RecomendadorKNN(knn)
+        pd.testing.assert_frame_equal(
+            recomendador.generar_recomendaciones_batch(df, list(df.columns), 5),
+            recomendador.generar_recomendaciones_batch(binarios, list(df.columns), 5),
+        )
+
+def test_guardar_cargar_conserva_ids_enteros(tmp_path):
+    rng = np.random.default_rng(0)
+    valores = rng.integers(1, 6, (15, 10)).astype(float)
+    valores[rng.random(valores.shape) < 0.3] = np.nan
+    df = pd.DataFrame(valores, index=np.arange(15) * 10, columns=np.arange(10))
+    guardar_binario(df, str(tmp_path / 'binario'))
+
+    binarios = cargar_ratings(str(tmp_path / 'binario'), mapeado=True)
+    assert 0 in binarios.usuarios
+    assert binarios.posicion_usuario(3) == 3
+    pd.testing.assert_frame_equal(binarios.a_dataframe(), df)
+    knn = KNNCalcularDistancia(metrica='pearson')
+    pd.testing.assert_frame_equal(knn.get_knn(binarios, 3, 4), knn.get_knn(df, 3, 4))
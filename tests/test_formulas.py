@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from formulas import obtener_metrica
+
+METRICAS = ('euclidean', 'manhattan', 'pearson', 'cosine')
+
+def _matriz_con_casos_borde(semilla=0):
+    rng = np.random.default_rng(semilla)
+    valores = rng.integers(1, 6, (30, 14)).astype(float) + rng.choice([0.0, 0.5], (30, 14))
+    valores[rng.random(valores.shape) < 0.4] = np.nan
+    valores[:, 0] = np.nan          # sin ningún rating
+    valores[:15, 1] = np.nan        # sin películas en común con la columna 2
+    valores[15:, 2] = np.nan
+    valores[:15, 2] = 3.0           # constante: Pearson indefinido
+    valores[:, 3] = np.where(np.isnan(valores[:, 3]), np.nan, 0.0)  # norma cero: coseno indefinido
+    valores[:, 4] = np.nan
+    valores[7, 4] = 4.0             # un solo rating: Pearson indefinido
+    return valores
+
+def _esperado(metrica, valores, objetivo):
+    escalar = obtener_metrica(metrica).escalar
+    return np.array([escalar(valores[:, objetivo], valores[:, j]) for j in range(valores.shape[1])])
+
+@pytest.mark.parametrize('metrica', METRICAS)
+def test_version_vectorizada_igual_a_escalar(metrica):
+    valores = _matriz_con_casos_borde()
+    mascara = ~np.isnan(valores)
+    vectorizada = obtener_metrica(metrica).vectorizada
+    for objetivo in range(valores.shape[1]):
+        esperado = _esperado(metrica, valores, objetivo)
+        # Con máscaras explícitas (ceros en faltantes) y con las deducidas de los NaN
+        con_ceros = np.where(mascara, valores, 0.0)
+        np.testing.assert_allclose(
+            vectorizada(con_ceros, con_ceros[:, objetivo], mascara, mascara[:, objetivo]), esperado,
+            rtol=1e-12, atol=1e-12,
+        )
+        np.testing.assert_allclose(vectorizada(valores, valores[:, objetivo]), esperado, rtol=1e-12, atol=1e-12)
+
+@pytest.mark.parametrize('metrica', METRICAS)
+def test_version_por_pares_igual_a_escalar(metrica):
+    valores = _matriz_con_casos_borde(semilla=1)
+    mascara = ~np.isnan(valores)
+    por_pares = obtener_metrica(metrica).por_pares
+    for objetivo in range(valores.shape[1]):
+        peliculas, columnas = np.nonzero(mascara & mascara[:, [objetivo]])
+        obtenido = por_pares(columnas, valores[peliculas, objetivo], valores[peliculas, columnas], valores.shape[1])
+        np.testing.assert_allclose(obtenido, _esperado(metrica, valores, objetivo), rtol=1e-12, atol=1e-12)
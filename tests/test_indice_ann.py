@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+from indice_ann import IndiceLSH, reporte_recall
+from Knn import KNNCalcularDistancia
+
+def _ratings_por_grupos(peliculas=400, usuarios=300, grupos=6, densidad=0.08, semilla=1):
+    # Usuarios de un mismo grupo comparten gustos pero casi no ven las mismas películas
+    rng = np.random.default_rng(semilla)
+    perfiles = rng.integers(1, 6, (grupos, peliculas)).astype(float)
+    valores = perfiles[rng.integers(0, grupos, usuarios)].T + rng.normal(0, 0.5, (peliculas, usuarios))
+    valores = np.clip(np.round(valores), 1, 5)
+    valores[rng.random(valores.shape) > densidad] = np.nan
+    return pd.DataFrame(valores, index=[f'p{i}' for i in range(peliculas)],
+                        columns=[f'u{i}' for i in range(usuarios)])
+
+@pytest.mark.parametrize('metrica', ['cosine', 'pearson'])
+def test_recall_supera_la_fraccion_de_candidatos_con_datos_dispersos(metrica):
+    df = _ratings_por_grupos()
+    indice = IndiceLSH(df, metrica, n_tablas=4, n_bits=6, min_comunes=4)
+    reporte = reporte_recall(indice, df, list(df.columns[:80]), k=5)
+    fraccion = reporte['candidatos_promedio'] / df.shape[1]
+    assert reporte['recall_at_k'] > 2 * fraccion
+
+@pytest.mark.parametrize('metrica', ['cosine', 'pearson'])
+def test_vecinos_re_ordenados_con_la_distancia_exacta(metrica):
+    df = _ratings_por_grupos(peliculas=80, usuarios=60, densidad=0.3)
+    indice = IndiceLSH(df, metrica, n_tablas=2, n_bits=2, min_comunes=3)
+    exacto = KNNCalcularDistancia(metrica=metrica, min_comunes=3)
+    for usuario in df.columns[:10]:
+        vecinos = indice.get_knn(df, usuario, k=5)
+        todas = exacto.get_knn(df, usuario, k=df.shape[1] - 1)['Distancia']
+        np.testing.assert_array_equal(vecinos['Distancia'].to_numpy(), todas[vecinos.index].to_numpy())
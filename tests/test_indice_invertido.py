@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+from indice_invertido import IndiceInvertido
+from Knn import KNNCalcularDistancia
+from ratings_compactos import RatingsCompactos
+
+METRICAS = ('euclidean', 'manhattan', 'pearson', 'cosine')
+
+def _ratings_decimales(peliculas=200, usuarios=400, semilla=0):
+    # Pasos de 0.1 y matriz muy dispersa: muchos empates y candidatos pocos
+    rng = np.random.default_rng(semilla)
+    valores = np.round(rng.uniform(0.5, 5, (peliculas, usuarios)), 1)
+    valores[rng.random(valores.shape) < 0.95] = np.nan
+    return pd.DataFrame(valores, columns=[f'u{i}' for i in range(usuarios)])
+
+def test_con_indice_invertido_resultado_identico_bit_a_bit():
+    df = _ratings_decimales()
+    compactos = RatingsCompactos.desde_dataframe(df)
+    for metrica in METRICAS:
+        sin_indice = KNNCalcularDistancia(metrica=metrica)
+        con_indice = KNNCalcularDistancia(metrica=metrica, indice_invertido=True)
+        en_hilos = KNNCalcularDistancia(metrica=metrica, indice_invertido=True, n_hilos=3)
+        for usuario in df.columns[:60]:
+            esperado = sin_indice.get_knn(df, usuario, 10)
+            pd.testing.assert_frame_equal(con_indice.get_knn(df, usuario, 10), esperado, check_exact=True)
+            pd.testing.assert_frame_equal(en_hilos.get_knn(df, usuario, 10), esperado, check_exact=True)
+            pd.testing.assert_frame_equal(
+                con_indice.get_knn(compactos, usuario, 10), sin_indice.get_knn(compactos, usuario, 10),
+                check_exact=True,
+            )
+
+def test_indice_se_construye_una_vez_por_mascara(monkeypatch):
+    df = _ratings_decimales()
+    construcciones = []
+    original = IndiceInvertido.desde_mascara.__func__
+
+    def contar(cls, mascara):
+        construcciones.append(1)
+        return original(cls, mascara)
+
+    monkeypatch.setattr(IndiceInvertido, 'desde_mascara', classmethod(contar))
+    knn = KNNCalcularDistancia(metrica='euclidean', indice_invertido=True)
+    for usuario in df.columns[:20]:
+        knn.get_knn(df, usuario, 5)
+    assert len(construcciones) == 1
+
+    # Un cambio en el lugar de la máscara obliga a reconstruirlo
+    df.iloc[0, 0] = 3.0 if np.isnan(df.iloc[0, 0]) else np.nan
+    knn.get_knn(df, df.columns[1], 5)
+    assert len(construcciones) == 2
+
+def test_cerrar_libera_los_hilos():
+    import threading
+
+    def hilos_knn():
+        return [h for h in threading.enumerate() if h.name.startswith('knn')]
+
+    df = _ratings_decimales()
+    with KNNCalcularDistancia(metrica='cosine', n_hilos=3) as knn:
+        esperado = knn.get_knn(df, 'u0', 5)
+        assert hilos_knn()
+    assert not hilos_knn()
+
+    # Se puede seguir consultando: el pool se vuelve a crear
+    pd.testing.assert_frame_equal(knn.get_knn(df, 'u0', 5), esperado)
+    knn.cerrar()
+    assert not hilos_knn()
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from ingesta import MapeoIds, ingerir_log
+
+def _log(filas=500, usuarios=30, peliculas=40, semilla=6):
+    # Muchos (usuario, película) repetidos para ejercitar "última escritura gana"
+    rng = np.random.default_rng(semilla)
+    return pd.DataFrame({
+        'usuario': [f'u{i}' for i in rng.integers(0, usuarios, filas)],
+        'pelicula': [f'p{i}' for i in rng.integers(0, peliculas, filas)],
+        'rating': rng.integers(1, 6, filas).astype(float),
+    })
+
+def _pivote(log):
+    ultimos = log.drop_duplicates(['usuario', 'pelicula'], keep='last')
+    return ultimos.pivot(index='pelicula', columns='usuario', values='rating').reindex(
+        index=pd.unique(log['pelicula']), columns=pd.unique(log['usuario'])
+    )
+
+@pytest.mark.parametrize('tamano_fragmento,umbral_compactacion', [(7, 20), (64, 1_000_000), (10_000, 1)])
+def test_ingesta_igual_al_pivote_con_ultima_escritura(tmp_path, tamano_fragmento, umbral_compactacion):
+    log = _log()
+    ruta = tmp_path / 'log.csv'
+    log.to_csv(ruta, index=False)
+    ratings = ingerir_log(str(ruta), tamano_fragmento=tamano_fragmento, umbral_compactacion=umbral_compactacion)
+
+    esperado = _pivote(log)
+    obtenido = ratings.a_dataframe()
+    assert list(obtenido.columns) == list(esperado.columns)
+    assert list(obtenido.index) == list(esperado.index)
+    np.testing.assert_array_equal(obtenido.to_numpy(), esperado.to_numpy(dtype=float))
+
+def test_mapeo_estable_entre_ejecuciones(tmp_path):
+    log = _log()
+    primera, ampliado = log.iloc[:200], log
+    primera.to_csv(tmp_path / 'primera.csv', index=False)
+    ampliado.to_csv(tmp_path / 'ampliado.csv', index=False)
+
+    mapeo_usuarios, mapeo_peliculas = MapeoIds(), MapeoIds()
+    ingerir_log(str(tmp_path / 'primera.csv'), mapeo_usuarios=mapeo_usuarios, mapeo_peliculas=mapeo_peliculas)
+    mapeo_usuarios.guardar(str(tmp_path / 'usuarios.txt'))
+    mapeo_peliculas.guardar(str(tmp_path / 'peliculas.txt'))
+    usuarios_antes, peliculas_antes = list(mapeo_usuarios.ids), list(mapeo_peliculas.ids)
+
+    ratings = ingerir_log(
+        str(tmp_path / 'ampliado.csv'),
+        mapeo_usuarios=MapeoIds.cargar(str(tmp_path / 'usuarios.txt')),
+        mapeo_peliculas=MapeoIds.cargar(str(tmp_path / 'peliculas.txt')),
+        tamano_fragmento=50,
+    )
+    assert list(ratings.usuarios[:len(usuarios_antes)]) == usuarios_antes
+    assert list(ratings.peliculas[:len(peliculas_antes)]) == peliculas_antes
+    esperado = _pivote(ampliado).reindex(index=ratings.peliculas, columns=ratings.usuarios)
+    np.testing.assert_array_equal(ratings.a_dataframe().to_numpy(), esperado.to_numpy(dtype=float))
@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+import pandas as pd
+from instrumentacion import INSTRUMENTACION_NULA, Instrumentacion, SinkJSONL, SinkMemoria, SinkPrometheus
+from Knn import KNNCalcularDistancia
+from KNN_Recommender import RecomendadorKNN
+
+def _ratings(peliculas=30, usuarios=20, densidad=0.5, semilla=8):
+    rng = np.random.default_rng(semilla)
+    valores = rng.integers(1, 6, (peliculas, usuarios)).astype(float)
+    valores[rng.random(valores.shape) > densidad] = np.nan
+    return pd.DataFrame(valores, index=[f'p{i}' for i in range(peliculas)],
+                        columns=[f'u{i}' for i in range(usuarios)])
+
+def test_contadores_y_spans_del_pipeline():
+    df = _ratings()
+    instr = Instrumentacion(SinkMemoria())
+    recomendador = RecomendadorKNN(KNNCalcularDistancia(metrica='pearson', instrumentacion=instr), umbral_rating=4.0)
+    recomendaciones = recomendador.generar_recomendaciones(df, 'u3', k=5)
+
+    resumen = instr.sink.resumen()
+    assert {'knn.preparar_matriz', 'knn.distancias', 'knn.top_k',
+            'recomendador.vecinos', 'recomendador.candidatas', 'recomendador.matriz_vecinos'} <= set(resumen['spans'])
+    for span in resumen['spans'].values():
+        assert span['conteo'] >= 1 and span['total_s'] >= 0
+
+    mascara = df.notna().to_numpy()
+    comunes = (mascara & mascara[:, [3]]).sum() - mascara[:, 3].sum()
+    contadores = resumen['contadores']
+    assert contadores['evaluaciones_distancia'] == df.shape[1] - 1
+    assert contadores['pares_cocalificados'] == comunes
+    assert contadores['candidatas_generadas'] == len(recomendaciones)
+    assert contadores['peliculas_candidatas'] == recomendaciones['pelicula'].nunique()
+
+def test_resultados_iguales_con_y_sin_instrumentacion():
+    df = _ratings()
+    apagado = RecomendadorKNN(KNNCalcularDistancia(metrica='cosine'))
+    encendido = RecomendadorKNN(KNNCalcularDistancia(metrica='cosine', instrumentacion=Instrumentacion()))
+    assert apagado.instr is INSTRUMENTACION_NULA and not apagado.instr.activa
+    assert apagado.instr.span('x') is INSTRUMENTACION_NULA.span('y')
+    for usuario in df.columns[:5]:
+        pd.testing.assert_frame_equal(encendido.generar_recomendaciones(df, usuario, 4),
+                                      apagado.generar_recomendaciones(df, usuario, 4))
+
+def test_sinks_jsonl_y_prometheus(tmp_path):
+    ruta_jsonl = tmp_path / 'eventos.jsonl'
+    sink = SinkJSONL(str(ruta_jsonl))
+    instr = Instrumentacion(sink)
+    with instr.span('knn.distancias'):
+        pass
+    instr.contar('evaluaciones_distancia', 7)
+    instr.vaciar()
+    sink.cerrar()
+    eventos = [json.loads(linea) for linea in ruta_jsonl.read_text(encoding='utf-8').splitlines()]
+    assert [(e['tipo'], e['nombre']) for e in eventos] == [('span', 'knn.distancias'),
+                                                            ('contador', 'evaluaciones_distancia')]
+    assert eventos[1]['valor'] == 7
+
+    ruta_prometheus = tmp_path / 'metricas.prom'
+    instr = Instrumentacion(SinkPrometheus(str(ruta_prometheus)))
+    for _ in range(3):
+        with instr.span('knn.distancias'):
+            pass
+    instr.contar('evaluaciones_distancia', 5)
+    instr.contar('evaluaciones_distancia', 2)
+    instr.vaciar()
+    texto = ruta_prometheus.read_text(encoding='utf-8')
+    assert 'recomendador_span_segundos_count{span="knn.distancias"} 3' in texto
+    assert 'recomendador_evaluaciones_distancia_total 7' in texto
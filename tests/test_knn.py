@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from formulas import obtener_metrica
+from Knn import KNNCalcularDistancia, preparar_matriz
+
+METRICAS = ('euclidean', 'manhattan', 'pearson', 'cosine')
+
+def _matriz_con_casos_borde(semilla=0):
+    rng = np.random.default_rng(semilla)
+    valores = rng.integers(1, 6, (30, 14)).astype(float) + rng.choice([0.0, 0.5], (30, 14))
+    valores[rng.random(valores.shape) < 0.4] = np.nan
+    valores[:, 0] = np.nan          # sin ningún rating
+    valores[:15, 1] = np.nan        # sin películas en común con la columna 2
+    valores[15:, 2] = np.nan
+    valores[:15, 2] = 3.0           # constante: Pearson indefinido
+    valores[:, 3] = np.where(np.isnan(valores[:, 3]), np.nan, 0.0)  # norma cero: coseno indefinido
+    valores[:, 4] = np.nan
+    valores[7, 4] = 4.0             # un solo rating: Pearson indefinido
+    return valores
+
+def _esperado(metrica, valores, objetivo):
+    escalar = obtener_metrica(metrica).escalar
+    return np.array([escalar(valores[:, objetivo], valores[:, j]) for j in range(valores.shape[1])])
+
+@pytest.mark.parametrize('metrica', METRICAS)
+@pytest.mark.parametrize('min_comunes', [None, 3])
+def test_distancias_a_todos_igual_a_escalar(metrica, min_comunes):
+    valores = _matriz_con_casos_borde(semilla=2)
+    calculador = KNNCalcularDistancia(metrica=metrica, min_comunes=min_comunes)
+    arrays = preparar_matriz(pd.DataFrame(valores))
+    comunes = (~np.isnan(valores)).astype(int).T @ (~np.isnan(valores)).astype(int)
+    for objetivo in range(valores.shape[1]):
+        esperado = _esperado(metrica, valores, objetivo)
+        if min_comunes is not None:
+            esperado = np.where(comunes[objetivo] >= min_comunes, esperado, np.nan)
+        obtenido = calculador.distancias_a_todos(*arrays, objetivo)
+        np.testing.assert_allclose(np.delete(obtenido, objetivo), np.delete(esperado, objetivo),
+                                   rtol=1e-12, atol=1e-12)
+
+@pytest.mark.parametrize('metrica', METRICAS)
+def test_get_knn_vectorizado_igual_a_funcion_sin_registrar(metrica):
+    valores = _matriz_con_casos_borde(semilla=3)
+    df = pd.DataFrame(valores, columns=[f'u{i}' for i in range(valores.shape[1])])
+    escalar = obtener_metrica(metrica).escalar
+    vectorizado = KNNCalcularDistancia(metrica=metrica)
+    por_columna = KNNCalcularDistancia(lambda a, b: escalar(a, b))
+    assert vectorizado.distance_batch is not None and por_columna.distance_batch is None
+    for usuario in df.columns:
+        esperado = por_columna.get_knn(df, usuario, k=5)
+        obtenido = vectorizado.get_knn(df, usuario, k=5)
+        np.testing.assert_allclose(obtenido['Distancia'], esperado['Distancia'], rtol=1e-12, atol=1e-12)
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from indice_bitset import IndiceBitset
+from instrumentacion import Instrumentacion
+from Knn import KNNCalcularDistancia
+from KNN_Recommender import RecomendadorKNN
+from procesamiento_paralelo import generar_recomendaciones_multiproceso
+from ratings_compactos import RatingsCompactos
+from ratings_dispersos import RatingsDispersos
+
+def _ratings(peliculas=150, usuarios=300, semilla=1):
+    rng = np.random.default_rng(semilla)
+    valores = rng.integers(1, 6, (peliculas, usuarios)).astype(float)
+    valores[rng.random(valores.shape) < 0.9] = np.nan
+    return pd.DataFrame(valores, columns=[f'u{i}' for i in range(usuarios)])
+
+def _evaluaciones(knn, datos, usuario):
+    knn.get_knn(datos, usuario, 5)
+    return knn.instr.sink.contadores.pop('evaluaciones_distancia')
+
+def test_evaluaciones_cuentan_solo_usuarios_con_soporte():
+    df = _ratings()
+    mascara = df.notna().to_numpy()
+    comunes = mascara.T.astype(int) @ mascara.astype(int)
+    datos = (df, RatingsCompactos.desde_dataframe(df), RatingsDispersos.desde_dataframe(df))
+    for min_comunes in (None, 2, 4):
+        for i, usuario in enumerate(df.columns[:15]):
+            if min_comunes is None:
+                esperado = len(df.columns) - 1
+            else:
+                esperado = int((comunes[i] >= min_comunes).sum()) - 1
+            for n_hilos in (None, 3):
+                knn = KNNCalcularDistancia(metrica='euclidean', min_comunes=min_comunes, n_hilos=n_hilos,
+                                           instrumentacion=Instrumentacion())
+                assert _evaluaciones(knn, df, usuario) == esperado
+            knn = KNNCalcularDistancia(metrica='euclidean', min_comunes=min_comunes,
+                                       instrumentacion=Instrumentacion())
+            for ratings in datos[1:]:
+                assert _evaluaciones(knn, ratings, usuario) == esperado
+
+def test_bitset_se_construye_una_vez_por_mascara(monkeypatch):
+    df = _ratings()
+    construcciones = []
+    original = IndiceBitset.desde_mascara.__func__
+
+    def contar(cls, mascara):
+        construcciones.append(1)
+        return original(cls, mascara)
+
+    monkeypatch.setattr(IndiceBitset, 'desde_mascara', classmethod(contar))
+    knn = KNNCalcularDistancia(metrica='pearson', min_comunes=3)
+    for usuario in df.columns[:20]:
+        knn.get_knn(df, usuario, 5)
+    assert len(construcciones) == 1
+
+@pytest.mark.parametrize('metrica', ['euclidean', 'manhattan', 'pearson', 'cosine'])
+def test_batch_respeta_min_comunes(metrica):
+    df = _ratings(peliculas=60, usuarios=120, semilla=4)
+    df.index = [f'p{i}' for i in range(len(df.index))]
+    recomendador = RecomendadorKNN(KNNCalcularDistancia(metrica=metrica, min_comunes=3), umbral_rating=4.0)
+    usuarios = list(df.columns)
+    lote = recomendador.generar_recomendaciones_batch(df, usuarios, 5, tamano_bloque=16)
+
+    pd.testing.assert_frame_equal(
+        recomendador.generar_recomendaciones_batch(RatingsDispersos.desde_dataframe(df), usuarios, 5), lote,
+    )
+    pd.testing.assert_frame_equal(
+        generar_recomendaciones_multiproceso(recomendador, df, usuarios, 5, n_procesos=2, tamano_fragmento=16),
+        lote,
+    )
+    for usuario in usuarios:
+        esperado = recomendador.generar_recomendaciones(df, usuario, 5).reset_index(drop=True)
+        obtenido = lote[lote['usuario_objetivo'] == usuario].reset_index(drop=True)[esperado.columns]
+        pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False)
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from Knn import KNNCalcularDistancia
+from KNN_Recommender import RecomendadorKNN
+from ratings_compactos import RatingsCompactos
+from ratings_dispersos import RatingsDispersos
+
+def _ratings(peliculas=400, usuarios=40, densidad=0.4, semilla=5):
+    rng = np.random.default_rng(semilla)
+    valores = rng.integers(1, 6, (peliculas, usuarios)).astype(float)
+    valores[rng.random(valores.shape) > densidad] = np.nan
+    return pd.DataFrame(valores, index=[f'p{i}' for i in range(peliculas)],
+                        columns=[f'u{i}' for i in range(usuarios)])
+
+def _fuerza_bruta(recomendador, df, usuario, k, n):
+    # Todas las películas no vistas con algún vecino, ordenadas por predicción y posición
+    vecinos = recomendador.knn.get_knn(df, usuario, k)
+    pesos = np.nan_to_num(1.0 / (1.0 + vecinos['Distancia'].to_numpy(dtype=float)), nan=0.0)
+    ratings = df[vecinos.index].to_numpy(dtype=float)
+    validos = ~np.isnan(ratings) & (pesos > 0)
+    filas = np.flatnonzero(validos.any(axis=1) & df[usuario].isna().to_numpy())
+    pesos_filas = np.where(validos[filas], pesos, 0.0)
+    predicciones = (np.nan_to_num(ratings[filas]) * pesos_filas).sum(axis=1) / pesos_filas.sum(axis=1)
+    predicciones = np.minimum(predicciones, np.where(validos[filas], ratings[filas], -np.inf).max(axis=1))
+    orden = np.lexsort((filas, -predicciones))[:n]
+    return pd.DataFrame({
+        'pelicula': df.index[filas[orden]],
+        'rating_predicho': predicciones[orden],
+        'vecinos_con_rating': validos[filas[orden]].sum(axis=1).astype(np.int64),
+    })
+
+@pytest.mark.parametrize('metrica', ['euclidean', 'pearson'])
+@pytest.mark.parametrize('n', [1, 5, 20, 1000])
+def test_top_n_igual_a_fuerza_bruta(metrica, n):
+    df = _ratings()
+    recomendador = RecomendadorKNN(KNNCalcularDistancia(metrica=metrica))
+    for usuario in df.columns[:10]:
+        esperado = _fuerza_bruta(recomendador, df, usuario, 7, n)
+        for ratings in (df, RatingsDispersos.desde_dataframe(df), RatingsCompactos.desde_dataframe(df)):
+            for tamano_lote in (None, 3):
+                obtenido = recomendador.predecir_top_n(ratings, usuario, k=7, n=n, tamano_lote=tamano_lote)
+                pd.testing.assert_frame_equal(obtenido, esperado)
+
+def test_puntuadas_dependen_de_n_y_no_del_catalogo():
+    df = _ratings(peliculas=4000)
+    recomendador = RecomendadorKNN(KNNCalcularDistancia(metrica='euclidean'))
+    candidatas = len(_fuerza_bruta(recomendador, df, 'u0', 7, None))
+    puntuadas = recomendador.predecir_top_n(df, 'u0', k=7, n=5).attrs['peliculas_puntuadas']
+    assert puntuadas < candidatas / 4
+
+def test_n_cero_devuelve_vacio_y_negativo_falla():
+    df = _ratings()
+    recomendador = RecomendadorKNN(KNNCalcularDistancia(metrica='euclidean'))
+    vacio = recomendador.predecir_top_n(df, 'u0', k=5, n=0)
+    assert vacio.empty
+    assert list(vacio.columns) == ['pelicula', 'rating_predicho', 'vecinos_con_rating']
+    with pytest.raises(ValueError):
+        recomendador.predecir_top_n(df, 'u0', k=5, n=-1)
@@ -0,0 +1,46 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from formato_binario import cargar_ratings
+from Knn import KNNCalcularDistancia
+from KNN_Recommender import RecomendadorKNN
+from procesamiento_paralelo import generar_recomendaciones_multiproceso
+from ratings_dispersos import RatingsDispersos
+
+RUTA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Movie_Ratings.csv')
+
+@pytest.mark.parametrize('metrica', ['euclidean', 'pearson'])
+def test_multiproceso_disperso_sin_densificar(metrica, monkeypatch):
+    df = cargar_ratings(RUTA)
+    recomendador = RecomendadorKNN(KNNCalcularDistancia(metrica=metrica), umbral_rating=4.0)
+    esperado = recomendador.generar_recomendaciones_batch(df, list(df.columns), 5)
+
+    dispersos = RatingsDispersos.desde_dataframe(df)
+    monkeypatch.setattr(RatingsDispersos, 'a_dataframe', lambda self: pytest.fail("se densificó la matriz"))
+    obtenido = generar_recomendaciones_multiproceso(
+        recomendador, dispersos, list(df.columns), 5, n_procesos=2, tamano_fragmento=7,
+    )
+    pd.testing.assert_frame_equal(obtenido, esperado)
+    pd.testing.assert_frame_equal(
+        generar_recomendaciones_multiproceso(recomendador, df, list(df.columns), 5, n_procesos=2), esperado,
+    )
+
+@pytest.mark.parametrize('metrica', ['euclidean', 'manhattan', 'pearson', 'cosine'])
+def test_multiproceso_igual_a_por_usuario_con_empates(metrica):
+    rng = np.random.default_rng(7)
+    valores = rng.integers(1, 6, (60, 120)).astype(float)
+    valores[rng.random(valores.shape) > 0.3] = np.nan
+    df = pd.DataFrame(valores, index=[f'p{i}' for i in range(60)], columns=[f'u{i}' for i in range(120)])
+    recomendador = RecomendadorKNN(KNNCalcularDistancia(metrica=metrica), umbral_rating=4.0)
+    usuarios = list(df.columns)
+
+    denso = generar_recomendaciones_multiproceso(recomendador, df, usuarios, 5, n_procesos=2, tamano_fragmento=16)
+    disperso = generar_recomendaciones_multiproceso(
+        recomendador, RatingsDispersos.desde_dataframe(df), usuarios, 5, n_procesos=2, tamano_fragmento=16,
+    )
+    pd.testing.assert_frame_equal(disperso, denso)
+    for usuario in usuarios:
+        esperado = recomendador.generar_recomendaciones(df, usuario, 5).reset_index(drop=True)
+        obtenido = denso[denso['usuario_objetivo'] == usuario].reset_index(drop=True)[esperado.columns]
+        pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False)
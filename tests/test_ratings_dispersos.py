@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from formulas import obtener_metrica
+from Knn import KNNCalcularDistancia
+from KNN_Recommender import RecomendadorKNN
+from ratings_dispersos import RatingsDispersos
+
+def _ratings(peliculas=40, usuarios=25, densidad=0.2, semilla=4):
+    rng = np.random.default_rng(semilla)
+    valores = rng.integers(1, 6, (peliculas, usuarios)) / 2 + 2
+    valores[rng.random(valores.shape) > densidad] = np.nan
+    valores[:, 0] = np.nan  # usuario sin ratings
+    return pd.DataFrame(valores, index=np.arange(peliculas) * 3, columns=[f'u{i}' for i in range(usuarios)])
+
+def test_vistas_csr_csc_y_conversion():
+    df = _ratings()
+    ratings = RatingsDispersos.desde_dataframe(df)
+    assert ratings.nnz == df.notna().sum().sum()
+    assert ratings.shape == df.shape
+    pd.testing.assert_frame_equal(ratings.a_dataframe(), df)
+
+    for j, usuario in enumerate(df.columns):
+        peliculas, valores = ratings.ratings_usuario(j)
+        esperadas = np.flatnonzero(df[usuario].notna())
+        np.testing.assert_array_equal(peliculas, esperadas)
+        np.testing.assert_array_equal(valores, df[usuario].to_numpy()[esperadas])
+    for i in range(len(df.index)):
+        usuarios, valores = ratings.ratings_pelicula(i)
+        esperados = np.flatnonzero(df.iloc[i].notna())
+        np.testing.assert_array_equal(usuarios, esperados)
+        np.testing.assert_array_equal(valores, df.iloc[i].to_numpy()[esperados])
+
+    with pytest.raises(ValueError):
+        ratings.posicion_usuario('desconocido')
+
+def test_pares_comunes_y_distancias_igual_a_escalar():
+    df = _ratings()
+    ratings = RatingsDispersos.desde_dataframe(df)
+    valores = df.to_numpy()
+    for objetivo in range(1, 6):
+        for otro in range(df.shape[1]):
+            comunes = ~np.isnan(valores[:, objetivo]) & ~np.isnan(valores[:, otro])
+            a, b = ratings.pares_comunes(objetivo, otro)
+            np.testing.assert_array_equal(a, valores[comunes, objetivo])
+            np.testing.assert_array_equal(b, valores[comunes, otro])
+        for metrica in ('euclidean', 'manhattan', 'pearson', 'cosine'):
+            escalar = obtener_metrica(metrica).escalar
+            esperado = [escalar(valores[:, objetivo], valores[:, j]) for j in range(df.shape[1])]
+            np.testing.assert_allclose(ratings.distancias_a_todos(objetivo, metrica), esperado,
+                                       rtol=1e-12, atol=1e-12)
+
+@pytest.mark.parametrize('metrica', ['euclidean', 'manhattan', 'pearson', 'cosine'])
+def test_knn_y_recomendaciones_igual_que_con_dataframe(metrica):
+    df = _ratings(densidad=0.4)
+    ratings = RatingsDispersos.desde_dataframe(df)
+    recomendador = RecomendadorKNN(KNNCalcularDistancia(metrica=metrica), umbral_rating=3.5)
+    for usuario in df.columns:
+        pd.testing.assert_frame_equal(recomendador.knn.get_knn(ratings, usuario, 4),
+                                      recomendador.knn.get_knn(df, usuario, 4))
+        pd.testing.assert_frame_equal(recomendador.generar_recomendaciones(ratings, usuario, 4),
+                                      recomendador.generar_recomendaciones(df, usuario, 4))
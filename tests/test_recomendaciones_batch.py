@@ -0,0 +1,78 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from almacen_ratings import AlmacenRatings
+from formato_binario import cargar_ratings
+from Knn import KNNCalcularDistancia
+from KNN_Recommender import RecomendadorKNN, recomendar_bloque_compacto
+from ratings_compactos import RatingsCompactos
+from ratings_dispersos import RatingsDispersos
+
+RUTA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Movie_Ratings.csv')
+
+@pytest.mark.parametrize('metrica', ['euclidean', 'manhattan', 'pearson', 'cosine'])
+@pytest.mark.parametrize('k', [3, 5, 10])
+def test_batch_igual_a_por_usuario_incluido_el_orden(metrica, k):
+    df = cargar_ratings(RUTA)
+    recomendador = RecomendadorKNN(KNNCalcularDistancia(metrica=metrica), umbral_rating=4.0)
+    lote = recomendador.generar_recomendaciones_batch(df, list(df.columns), k)
+    for usuario in df.columns:
+        esperado = recomendador.generar_recomendaciones(df, usuario, k).reset_index(drop=True)
+        obtenido = lote[lote['usuario_objetivo'] == usuario].reset_index(drop=True)[esperado.columns]
+        pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False)
+
+@pytest.mark.parametrize('metrica', ['euclidean', 'manhattan', 'pearson', 'cosine'])
+def test_batch_disperso_y_almacen_sin_densificar(metrica, monkeypatch):
+    df = cargar_ratings(RUTA)
+    recomendador = RecomendadorKNN(KNNCalcularDistancia(metrica=metrica), umbral_rating=4.0)
+    esperado = recomendador.generar_recomendaciones_batch(df, list(df.columns), 5)
+
+    dispersos, almacen = RatingsDispersos.desde_dataframe(df), AlmacenRatings(df)
+    for clase in (RatingsDispersos, AlmacenRatings):
+        monkeypatch.setattr(clase, 'a_dataframe', lambda self: pytest.fail("se densificó la matriz"))
+    for ratings in (dispersos, almacen):
+        obtenido = recomendador.generar_recomendaciones_batch(ratings, list(df.columns), 5, tamano_bloque=7)
+        pd.testing.assert_frame_equal(obtenido, esperado)
+
+def _ratings_enteros(peliculas=60, usuarios=120, densidad=0.3, semilla=3):
+    # Ratings enteros con pocas co-calificadas: muchas distancias empatadas
+    rng = np.random.default_rng(semilla)
+    valores = rng.integers(1, 6, (peliculas, usuarios)).astype(float)
+    valores[rng.random(valores.shape) > densidad] = np.nan
+    return pd.DataFrame(valores, index=[f'p{i}' for i in range(peliculas)],
+                        columns=[f'u{i}' for i in range(usuarios)])
+
+@pytest.mark.parametrize('metrica', ['euclidean', 'manhattan', 'pearson', 'cosine'])
+def test_batch_igual_a_por_usuario_con_empates(metrica):
+    df = _ratings_enteros()
+    recomendador = RecomendadorKNN(KNNCalcularDistancia(metrica=metrica), umbral_rating=4.0)
+    lote = recomendador.generar_recomendaciones_batch(df, list(df.columns), 5, tamano_bloque=16)
+    lote_disperso = recomendador.generar_recomendaciones_batch(
+        RatingsDispersos.desde_dataframe(df), list(df.columns), 5, tamano_bloque=16,
+    )
+    pd.testing.assert_frame_equal(lote_disperso, lote)
+    for usuario in df.columns:
+        esperado = recomendador.generar_recomendaciones(df, usuario, 5).reset_index(drop=True)
+        obtenido = lote[lote['usuario_objetivo'] == usuario].reset_index(drop=True)[esperado.columns]
+        pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False)
+
+@pytest.mark.parametrize('metrica', ['euclidean', 'manhattan', 'pearson', 'cosine'])
+@pytest.mark.parametrize('min_comunes', [None, 3])
+def test_batch_compacto_por_bloques_sin_decodificar(metrica, min_comunes, monkeypatch):
+    df = _ratings_enteros()
+    recomendador = RecomendadorKNN(KNNCalcularDistancia(metrica=metrica, min_comunes=min_comunes), umbral_rating=4.0)
+    esperado = recomendador.generar_recomendaciones_batch(df, list(df.columns), 5, tamano_bloque=16)
+
+    compactos = RatingsCompactos.desde_dataframe(df)
+    for nombre in ('como_matriz', 'a_dataframe'):
+        monkeypatch.setattr(RatingsCompactos, nombre, lambda self: pytest.fail("se decodificó la matriz"))
+    obtenido = recomendador.generar_recomendaciones_batch(compactos, list(df.columns), 5, tamano_bloque=16)
+    pd.testing.assert_frame_equal(obtenido, esperado)
+
+    # Tramos de columnas más chicos que la matriz
+    arrays = recomendador.generar_recomendaciones_batch(df, list(df.columns), 5, como_arrays=True)
+    tramos = recomendar_bloque_compacto(compactos, np.arange(df.shape[1]), 5, metrica, 4.0, min_comunes,
+                                        tamano_columnas=7)
+    for clave, valor in arrays.items():
+        np.testing.assert_array_equal(tramos[clave], valor)
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from formato_binario import cargar_ratings, guardar_binario
+from ratings_compactos import RatingsCompactos
+from ratings_dispersos import RatingsDispersos
+from recomendador_items import COLUMNAS_ITEMS, RecomendadorItems
+
+def _ratings_enteros():
+    rng = np.random.default_rng(0)
+    valores = rng.integers(1, 6, (30, 20)).astype(float)
+    valores[rng.random(valores.shape) < 0.4] = np.nan
+    return pd.DataFrame(valores, index=np.arange(30) * 10, columns=np.arange(20) + 100)
+
+def test_guardar_cargar_conserva_ids_enteros(tmp_path):
+    df = _ratings_enteros()
+    modelo = RecomendadorItems(metrica='cosine', m_vecinos=5).ajustar(df)
+    ruta = str(tmp_path / 'vecindarios.npz')
+    modelo.guardar(ruta)
+    cargado = RecomendadorItems.cargar(ruta)
+
+    assert cargado.peliculas.equals(modelo.peliculas)
+    esperado = modelo.generar_recomendaciones(df, 105)
+    assert not esperado.empty
+    pd.testing.assert_frame_equal(cargado.generar_recomendaciones(df, 105), esperado)
+
+def test_filas_indican_pelicula_origen_vista_por_el_usuario():
+    df = _ratings_enteros()
+    modelo = RecomendadorItems(metrica='cosine', m_vecinos=5, umbral_rating=4.0).ajustar(df)
+    recomendaciones = modelo.generar_recomendaciones(df, 105)
+
+    assert list(recomendaciones.columns) == COLUMNAS_ITEMS
+    assert not recomendaciones.empty
+    ratings = df[105]
+    assert ratings[recomendaciones['pelicula']].isna().all()
+    np.testing.assert_array_equal(recomendaciones['rating_origen'], ratings[recomendaciones['pelicula_origen']])
+    assert (recomendaciones['rating_origen'] >= 4.0).all()
+    for pelicula, origen in zip(recomendaciones['pelicula'], recomendaciones['pelicula_origen']):
+        assert modelo.peliculas.get_loc(origen) in modelo.vecinos[modelo.peliculas.get_loc(pelicula)]
+
+@pytest.mark.parametrize('metrica', ['pearson', 'manhattan'])
+def test_ajustar_igual_con_todos_los_almacenamientos(metrica, tmp_path):
+    df = _ratings_enteros()
+    guardar_binario(df, str(tmp_path / 'binario'))
+    esperado = RecomendadorItems(metrica=metrica, m_vecinos=5).ajustar(df)
+    for ratings in (RatingsDispersos.desde_dataframe(df), RatingsCompactos.desde_dataframe(df),
+                    cargar_ratings(str(tmp_path / 'binario'), mapeado=True)):
+        modelo = RecomendadorItems(metrica=metrica, m_vecinos=5).ajustar(ratings)
+        np.testing.assert_array_equal(modelo.vecinos, esperado.vecinos)
+        np.testing.assert_array_equal(modelo.distancias, esperado.distancias)
+        pd.testing.assert_frame_equal(modelo.generar_recomendaciones(ratings, 105),
+                                      esperado.generar_recomendaciones(df, 105))
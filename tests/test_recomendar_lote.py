@@ -0,0 +1,28 @@
+import json
+import os
+
+import pandas as pd
+from formato_binario import cargar_ratings
+from recomendar_lote import recomendar_a_archivo
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_jsonl_varios_bloques_una_fila_por_linea(tmp_path):
+    df = cargar_ratings(os.path.join(RAIZ, 'Movie_Ratings.csv'))
+    salida = tmp_path / 'recomendaciones.jsonl'
+    filas = recomendar_a_archivo(df, None, str(salida), 'euclidean', k=5, umbral=4.0, tamano_bloque=4)
+
+    assert df.shape[1] > 4
+    lineas = salida.read_text(encoding='utf-8').splitlines()
+    assert len(lineas) == filas
+    registros = [json.loads(linea) for linea in lineas]
+    assert set(registros[0]) == {'usuario_objetivo', 'usuario_vecino', 'pelicula', 'rating_vecino',
+                                 'veces_recomendada'}
+
+def test_csv_igual_a_jsonl(tmp_path):
+    df = cargar_ratings(os.path.join(RAIZ, 'Movie_Ratings.csv'))
+    recomendar_a_archivo(df, None, str(tmp_path / 'r.csv'), 'pearson', k=3, tamano_bloque=7)
+    recomendar_a_archivo(df, None, str(tmp_path / 'r.jsonl'), 'pearson', k=3, tamano_bloque=7)
+    csv = pd.read_csv(tmp_path / 'r.csv')
+    jsonl = pd.read_json(tmp_path / 'r.jsonl', lines=True)
+    pd.testing.assert_frame_equal(csv, jsonl, check_dtype=False)
@@ -0,0 +1,77 @@
+import asyncio
+import json
+import os
+from urllib.parse import quote
+
+from formato_binario import cargar_ratings
+from Knn import KNNCalcularDistancia
+from KNN_Recommender import RecomendadorKNN
+from servicio import ServicioRecomendaciones
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+async def _pedir(puerto, ruta):
+    lector, escritor = await asyncio.open_connection('127.0.0.1', puerto)
+    escritor.write(f'GET {ruta} HTTP/1.1\r\nHost: local\r\n\r\n'.encode('ascii'))
+    await escritor.drain()
+    respuesta = await lector.read()
+    escritor.close()
+    cabecera, cuerpo = respuesta.split(b'\r\n\r\n', 1)
+    return int(cabecera.split()[1]), json.loads(cuerpo)
+
+def _consultar(df, precalcular, rutas):
+    async def correr():
+        servicio = ServicioRecomendaciones(df, 'pearson', 4.0, n_hilos=2, precalcular=precalcular)
+        await servicio.iniciar()
+        try:
+            return await asyncio.gather(*[_pedir(servicio.puerto, ruta) for ruta in rutas])
+        finally:
+            await servicio.detener()
+    return asyncio.run(correr())
+
+def test_recomendaciones_igual_que_batch_y_k_invalido():
+    df = cargar_ratings(os.path.join(RAIZ, 'Movie_Ratings.csv'))
+    usuarios = list(df.columns[:6])
+    esperado = RecomendadorKNN(KNNCalcularDistancia(metrica='pearson'), 4.0).generar_recomendaciones_batch(df, usuarios, 4)
+
+    for precalcular in (False, True):
+        respuestas = _consultar(
+            df, precalcular,
+            [f'/recomendaciones?usuario={quote(u)}&k=4' for u in usuarios]
+            + [f'/recomendaciones?usuario={quote(usuarios[0])}&k=0', f'/vecinos?usuario={quote(usuarios[0])}&k=-2'],
+        )
+        for usuario, (estado, cuerpo) in zip(usuarios, respuestas):
+            assert estado == 200
+            filas = esperado[esperado['usuario_objetivo'] == usuario]
+            assert [(r['usuario_vecino'], r['pelicula']) for r in cuerpo['resultado']] == list(
+                zip(filas['usuario_vecino'], filas['pelicula'])
+            )
+        assert [estado for estado, _ in respuestas[-2:]] == [400, 400]
+
+def test_vecinos_y_recomendaciones_usan_los_mismos_vecinos():
+    import numpy as np
+    import pandas as pd
+
+    # Ratings enteros dispersos: muchas distancias Pearson empatadas
+    rng = np.random.default_rng(5)
+    valores = rng.integers(1, 6, (60, 80)).astype(float)
+    valores[rng.random(valores.shape) > 0.3] = np.nan
+    df = pd.DataFrame(valores, index=[f'p{i}' for i in range(60)], columns=[f'u{i}' for i in range(80)])
+    usuarios = list(df.columns[:20])
+    recomendador = RecomendadorKNN(KNNCalcularDistancia(metrica='pearson'), 4.0)
+    esperado = recomendador.generar_recomendaciones_batch(df, usuarios, 5)
+
+    for precalcular in (False, True):
+        respuestas = _consultar(
+            df, precalcular,
+            [f'/vecinos?usuario={u}&k=5' for u in usuarios] + [f'/recomendaciones?usuario={u}&k=5' for u in usuarios],
+        )
+        for usuario, (estado, cuerpo) in zip(usuarios, respuestas[:len(usuarios)]):
+            assert estado == 200
+            vecinos = [fila['usuario'] for fila in cuerpo['resultado']]
+            assert vecinos == list(recomendador.knn.get_knn(df, usuario, 5).index)
+        for usuario, (estado, cuerpo) in zip(usuarios, respuestas[len(usuarios):]):
+            filas = esperado[esperado['usuario_objetivo'] == usuario]
+            assert [(r['usuario_vecino'], r['pelicula']) for r in cuerpo['resultado']] == list(
+                zip(filas['usuario_vecino'], filas['pelicula'])
+            )
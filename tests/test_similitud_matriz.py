@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from formulas import obtener_metrica
+from similitud_matriz import distancias_bloque, estadisticos_matriz, matriz_distancias
+
+METRICAS = ('euclidean', 'manhattan', 'pearson', 'cosine')
+
+def _matriz_con_casos_borde(semilla=0):
+    rng = np.random.default_rng(semilla)
+    valores = rng.integers(1, 6, (25, 12)).astype(float)
+    valores[rng.random(valores.shape) < 0.4] = np.nan
+    valores[:, 0] = np.nan          # sin ningún rating: sin pares con nadie
+    valores[:12, 1] = np.nan        # sin películas en común con la columna 2
+    valores[12:, 2] = np.nan
+    valores[:12, 2] = 3.0           # constante: Pearson indefinido
+    valores[:, 3] = np.where(np.isnan(valores[:, 3]), np.nan, 0.0)  # norma cero: coseno indefinido
+    valores[:, 4] = np.nan
+    valores[5, 4] = 4.0             # un solo rating: Pearson indefinido
+    return valores
+
+@pytest.mark.parametrize('metrica', METRICAS)
+def test_distancias_bloque_igual_a_funcion_escalar(metrica):
+    valores = _matriz_con_casos_borde()
+    mascara = ~np.isnan(valores)
+    escalar = obtener_metrica(metrica).escalar
+    esperado = np.array([
+        [escalar(valores[:, i], valores[:, j]) for j in range(valores.shape[1])]
+        for i in range(valores.shape[1])
+    ])
+    np.testing.assert_allclose(matriz_distancias(valores, mascara, metrica, tamano_bloque=5), esperado,
+                               rtol=1e-12, atol=1e-12)
+
+@pytest.mark.parametrize('metrica', METRICAS)
+def test_estadisticos_precalculados_dan_el_mismo_resultado(metrica):
+    valores = _matriz_con_casos_borde(semilla=1)
+    mascara = ~np.isnan(valores)
+    estadisticos = estadisticos_matriz(valores, mascara)
+    for indices in ([0, 1, 2], [5, 11]):
+        np.testing.assert_array_equal(
+            distancias_bloque(valores, mascara, indices, metrica, estadisticos),
+            distancias_bloque(valores, mascara, indices, metrica),
+        )